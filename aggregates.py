@@ -0,0 +1,100 @@
+import numpy as np
+from ingest import rating_codes
+
+
+class PortfolioAggregates:
+    """
+    Running dashboard totals for the building portfolio.
+
+    update() folds in a batch of appended rows, so the totals never need a
+    full rescan while data only grows, and replace() swaps rewritten rows'
+    old values for their new ones. Row positions are those of the building
+    store, which has a RangeIndex, so argmin doubles as the idxmin label.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.emissions_count = 0
+        self.emissions_sum = 0.0
+        self.emissions_min = np.inf
+        self.emissions_argmin = None
+        # Index 0 counts ratings outside 1-5 (or missing); 1-5 count each rating
+        self.rating_counts = np.zeros(6, dtype=np.int64)
+        self.credits_total = 0
+
+    @classmethod
+    def from_frame(cls, buildings_data):
+        aggregates = cls()
+        aggregates.update(buildings_data, 0)
+        return aggregates
+
+    def update(self, data, start=None):
+        """
+        Fold appended rows into the totals.
+
+        Args:
+            data (pd.DataFrame): The new rows
+            start (int): Row position of the first new row (defaults to the current count)
+        """
+        start = self.count if start is None else start
+        if len(data) == 0:
+            return
+        self._fold(data, 1)
+        self._lower_min(np.arange(start, start + len(data)), data)
+        self.count = max(self.count, start + len(data))
+
+    def replace(self, positions, old, new):
+        """
+        Swap rewritten rows' old values for their new ones.
+
+        Args:
+            positions (np.ndarray): Row positions of the rewritten rows
+            old (pd.DataFrame): Their values before the rewrite, aligned with positions
+            new (pd.DataFrame): Their values after it
+
+        Returns:
+            bool: False if the totals could not be kept exact and must be rebuilt; that
+                happens when the row holding the minimum got worse, so the new minimum is unknown
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        if len(np.unique(positions)) < len(positions):
+            return False
+        if self.emissions_argmin is not None:
+            hit = np.flatnonzero(positions == self.emissions_argmin)
+            if len(hit) and not new['annual_emissions'].to_numpy(dtype=float)[hit[0]] <= self.emissions_min:
+                return False
+        self._fold(old, -1)
+        self._fold(new, 1)
+        self._lower_min(positions, new)
+        return True
+
+    def _fold(self, data, sign):
+        """Add (sign 1) or remove (sign -1) rows from the counts and sums."""
+        emissions = data['annual_emissions'].to_numpy(dtype=float)
+        finite = np.isfinite(emissions)
+        self.emissions_count += sign * int(finite.sum())
+        self.emissions_sum += sign * float(emissions[finite].sum())
+
+        self.rating_counts += sign * np.bincount(rating_codes(data['rating']), minlength=6)
+
+        self.credits_total += sign * data['credits_available'].sum()
+
+    def _lower_min(self, positions, data):
+        """Move the minimum to one of these rows if it holds a lower value, or the same at an earlier row."""
+        emissions = data['annual_emissions'].to_numpy(dtype=float)
+        emissions = np.where(np.isfinite(emissions), emissions, np.inf)
+        if not np.isfinite(emissions).any():
+            return
+        lowest = emissions.min()
+        position = int(positions[emissions == lowest].min())
+        if lowest < self.emissions_min or (lowest == self.emissions_min and position < self.emissions_argmin):
+            self.emissions_min = float(lowest)
+            self.emissions_argmin = position
+
+    @property
+    def mean_emissions(self):
+        return self.emissions_sum / self.emissions_count if self.emissions_count else 0.0
+
+    def rating_histogram(self):
+        """Building counts for ratings 1-5 as a {rating: count} dict."""
+        return {rating: int(self.rating_counts[rating]) for rating in range(1, 6)}
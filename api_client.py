@@ -0,0 +1,343 @@
+import json
+import math
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+API_BASE_URL = "http://127.0.0.1:8000/api"
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (2, 10)
+ORDER_BOOK_TTL = 1.0
+# The server sends a heartbeat every 15 s, so a stream silent for longer is dead
+STREAM_READ_TIMEOUT = 45
+MAX_RECONNECT_DELAY = 5.0
+
+
+def _json(response):
+    """Decoded JSON body of a response, or an error result when it has none."""
+    try:
+        body = response.json()
+    except ValueError:
+        # A proxy or crashed worker answering with an HTML or plain-text error page
+        return {"error": f"Trading API returned HTTP {response.status_code} without a JSON body"}
+    return body if isinstance(body, dict) else {"error": f"Trading API returned HTTP {response.status_code} with an unexpected body"}
+
+
+class MarketClient:
+    """
+    Keep-alive HTTP client for the trading API.
+
+    One pooled session is reused across Streamlit reruns. Reads are retried
+    on connection errors and timeouts; order submissions are only retried on
+    connect timeouts, before anything reached the server, so an order is
+    never sent twice. The order book is served from a short-lived cache and
+    refreshed with a conditional request.
+    """
+
+    def __init__(self, base_url=API_BASE_URL, timeout=DEFAULT_TIMEOUT, book_ttl=ORDER_BOOK_TTL, pool_size=10):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.book_ttl = book_ttl
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._book_lock = threading.Lock()
+        self._book_cache = {}  # levels -> (fetched_at, etag, body)
+
+    @retry(
+        retry=retry_if_exception_type((requests.ConnectionError, requests.Timeout)),
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=0.1, max=1),
+        reraise=True,
+    )
+    def _get(self, path, **kwargs):
+        return self.session.get(f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+
+    @retry(
+        retry=retry_if_exception_type(requests.exceptions.ConnectTimeout),
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=0.1, max=1),
+        reraise=True,
+    )
+    def _connect_and_post(self, path, payload):
+        return self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+
+    def _post(self, path, payload):
+        try:
+            response = self._connect_and_post(path, payload)
+        except requests.RequestException as e:
+            return {"error": f"Trading API unavailable: {e}"}
+        # Any accepted order changes the book
+        self.invalidate_order_book()
+        return _json(response)
+
+    def get_order_book(self, levels=None):
+        """Return the order book, reusing a cached copy while it is fresh."""
+        now = time.monotonic()
+        with self._book_lock:
+            cached = self._book_cache.get(levels)
+        if cached and now - cached[0] < self.book_ttl:
+            return cached[2]
+
+        headers = {"If-None-Match": cached[1]} if cached and cached[1] else {}
+        params = {"levels": levels} if levels is not None else None
+        try:
+            response = self._get("/order-book", headers=headers, params=params)
+        except requests.RequestException as e:
+            return {"error": f"Trading API unavailable: {e}"}
+
+        if response.status_code == 304 and cached:
+            body = cached[2]
+        elif response.ok:
+            body = _json(response)
+            if "error" in body:
+                return body
+        else:
+            # Never cached, so the next refresh asks again
+            body = _json(response)
+            return body if "error" in body else {"error": f"Trading API returned HTTP {response.status_code}"}
+        with self._book_lock:
+            self._book_cache[levels] = (now, response.headers.get("ETag"), body)
+        return body
+
+    def invalidate_order_book(self):
+        with self._book_lock:
+            # Keep the ETags so the next fetch can still be a cheap 304
+            self._book_cache = {
+                levels: (float("-inf"), etag, body)
+                for levels, (_, etag, body) in self._book_cache.items()
+            }
+
+    def get_trades(self, limit=50):
+        """Return the newest fills, newest first, plus a 24-hour summary."""
+        try:
+            return _json(self._get("/trades", params={"limit": limit}))
+        except requests.RequestException as e:
+            return {"error": f"Trading API unavailable: {e}"}
+
+    def get_bars(self, interval="1m", limit=120):
+        """Return the newest OHLC/volume bars of one interval ("1m", "1h" or "1d"), oldest first."""
+        try:
+            return _json(self._get("/trades/bars", params={"interval": interval, "limit": limit}))
+        except requests.RequestException as e:
+            return {"error": f"Trading API unavailable: {e}"}
+
+    def place_buy_order(self, quantity, price):
+        return self._post("/market/buy", {"quantity": quantity, "price": price})
+
+    def place_sell_order(self, quantity, price):
+        return self._post("/market/sell", {"quantity": quantity, "price": price})
+
+    def place_orders(self, orders):
+        """
+        Submit many orders in a single request.
+
+        Args:
+            orders (list): Dicts with side ("buy"/"sell"), quantity and price
+
+        Returns:
+            dict: {"results": [...]} in submission order, or {"error": ...}
+        """
+        return self._post("/market/batch", {"orders": list(orders)})
+
+    def close(self):
+        self.session.close()
+
+
+def parse_events(lines):
+    """Yield (event, data) pairs from the lines of a text/event-stream response."""
+    event, data = "message", []
+    for line in lines:
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = "message", []
+        elif line.startswith(":"):
+            continue
+        else:
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "event":
+                event = value
+            elif field == "data":
+                data.append(value)
+
+
+class OrderBookReplica:
+    """
+    Local copy of the order book, kept current by the server's push feed.
+
+    A daemon thread holds one streaming request to /order-book/stream. The
+    first message is a snapshot stamped with the book's sequence number;
+    every later one is a delta carrying the new aggregate of each changed
+    price level and the next sequence number. If a delta arrives out of
+    order the replica reconnects from the last sequence it applied: the
+    server replays the missed deltas when it still holds them and sends a
+    fresh snapshot otherwise. Reads never touch the network.
+    """
+
+    def __init__(self, base_url=API_BASE_URL, timeout=DEFAULT_TIMEOUT):
+        self.url = f"{base_url}/order-book/stream"
+        self.connect_timeout = timeout[0] if isinstance(timeout, tuple) else timeout
+        self.session = requests.Session()
+        self.sequence = None
+        self.connected = False
+        self.updated_at = None
+        self.stats = {"connections": 0, "snapshots": 0, "deltas": 0, "gaps": 0}
+        self._levels = {"buy": {}, "sell": {}}  # price -> (quantity, orders)
+        self._lock = threading.Lock()
+        self._synced = threading.Event()
+        self._gave_up_at = None  # monotonic time of the last wait that timed out
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="order-book-replica", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        delay = 0.1
+        while not self._stop.is_set():
+            try:
+                self._consume()
+                delay = 0.1
+            except (requests.RequestException, ValueError):
+                self.connected = False
+                self._stop.wait(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def _consume(self):
+        params = {"since": self.sequence} if self.sequence is not None else None
+        with self.session.get(self.url, params=params, stream=True,
+                              timeout=(self.connect_timeout, STREAM_READ_TIMEOUT)) as response:
+            response.raise_for_status()
+            response.encoding = "utf-8"
+            self.connected = True
+            self.stats["connections"] += 1
+            for event, data in parse_events(response.iter_lines(decode_unicode=True)):
+                if self._stop.is_set() or not self._handle(event, json.loads(data)):
+                    return
+        self.connected = False
+
+    def _handle(self, event, message):
+        """Apply one message; returns False when a gap means the stream must be resumed."""
+        with self._lock:
+            if event == "snapshot":
+                self._levels = {
+                    side: {level["price"]: (level["quantity"], level["orders"]) for level in levels}
+                    for side, levels in message["order_book"].items()
+                }
+                self.sequence = message["sequence"]
+                self.stats["snapshots"] += 1
+            elif event == "delta":
+                if self.sequence is None or message["sequence"] <= self.sequence:
+                    return True
+                if message["sequence"] != self.sequence + 1:
+                    self.stats["gaps"] += 1
+                    return False
+                for change in message["changes"]:
+                    levels = self._levels[change["side"]]
+                    if change["quantity"] > 0:
+                        levels[change["price"]] = (change["quantity"], change["orders"])
+                    else:
+                        levels.pop(change["price"], None)
+                self.sequence = message["sequence"]
+                self.stats["deltas"] += 1
+            else:
+                return True
+            self.updated_at = time.time()
+        self._synced.set()
+        return True
+
+    def wait_until_synced(self, timeout=None, retry_after=None):
+        """
+        Block until the first snapshot has been applied; False on timeout.
+
+        With retry_after, a call within that many seconds of a wait that
+        timed out returns False at once, so callers polling a feed that is
+        down don't block every time.
+        """
+        if self._synced.is_set():
+            return True
+        gave_up_at = self._gave_up_at
+        if retry_after is not None and gave_up_at is not None and time.monotonic() - gave_up_at < retry_after:
+            return False
+        if self._synced.wait(timeout):
+            return True
+        self._gave_up_at = time.monotonic()
+        return False
+
+    @property
+    def synced(self):
+        return self._synced.is_set()
+
+    def depth(self, side, levels=None, tick=None):
+        """
+        Aggregated price levels for one side, best price first.
+
+        Args:
+            side (str): "buy" or "sell"
+            levels (int): Keep only this many levels after aggregation
+            tick (float): Merge prices into buckets this wide; bids round
+                down and asks round up, so a bucket never looks better than
+                the orders in it
+
+        Returns:
+            list: Dicts with price, quantity and orders
+        """
+        with self._lock:
+            book = list(self._levels[side].items())
+        if tick:
+            bucket = math.floor if side == "buy" else math.ceil
+            merged = {}
+            for price, (quantity, orders) in book:
+                # Nudge off exact multiples so float error does not move them a bucket
+                key = round(bucket(price / tick + (1e-9 if side == "buy" else -1e-9)) * tick, 10)
+                total, count = merged.get(key, (0, 0))
+                merged[key] = (total + quantity, count + orders)
+            book = list(merged.items())
+        book.sort(reverse=(side == "buy"))
+        if levels is not None:
+            book = book[:levels]
+        return [{"price": price, "quantity": quantity, "orders": orders} for price, (quantity, orders) in book]
+
+    def snapshot(self, levels=None, tick=None):
+        """Both sides of the replica in the shape returned by MarketClient.get_order_book()."""
+        return {"buy": self.depth("buy", levels, tick), "sell": self.depth("sell", levels, tick)}
+
+    def close(self):
+        """Stop the feed thread; it exits at the next message or heartbeat."""
+        self._stop.set()
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+_replica = None
+
+
+def get_client():
+    """Return the process-wide client so every rerun shares one connection pool."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MarketClient()
+    return _client
+
+
+def get_order_book_replica():
+    """Return the process-wide order book replica, starting its feed on first use."""
+    global _replica
+    if _replica is None:
+        with _client_lock:
+            if _replica is None:
+                _replica = OrderBookReplica().start()
+    return _replica
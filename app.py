@@ -1,12 +1,56 @@
+import importlib
+import os
+import time
 import streamlit as st
 from config import init_config
-from home import display_home
-from emissions_trading import display_emissions_trading
-from energy_consultation import display_energy_consultation
+from instrumentation import registry, span, start_metrics_server
+
+# Page modules (and their Plotly, folium and Gemini dependencies) are only
+# imported the first time a page is opened
+PAGES = {
+    "Home": ("home", "display_home"),
+    "Emissions Trading": ("emissions_trading", "display_emissions_trading"),
+    "Energy Consultation": ("energy_consultation", "display_energy_consultation"),
+}
+
+
+def load_page(name):
+    module_name, function_name = PAGES[name]
+    with span(f"import.{module_name}"):
+        module = importlib.import_module(module_name)
+    return getattr(module, function_name)
+
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_exporter():
+    """Serve Prometheus metrics once per process when METRICS_PORT is set."""
+    port = os.environ.get('METRICS_PORT')
+    return start_metrics_server(int(port)) if port else None
+
+
+def display_debug_panel(rerun_start):
+    """Latency histograms per instrumented function and the spans of this rerun."""
+    import pandas as pd
+
+    with st.sidebar.expander("⏱️ Performance", expanded=True):
+        snapshot = registry.snapshot()
+        if not snapshot:
+            st.caption("No spans recorded yet.")
+            return
+        st.dataframe(pd.DataFrame.from_dict(snapshot, orient='index')[
+            ['count', 'errors', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+        ].round(1))
+        spans = [s for s in registry.recent() if s['time'] >= rerun_start]
+        if spans:
+            st.caption("This rerun")
+            st.dataframe(pd.DataFrame(spans)[['name', 'parent', 'ms', 'error']].round(1),
+                         hide_index=True)
 
 
 # Initialize app configurations
 init_config()
+start_metrics_exporter()
+rerun_start = time.time()
 
 # Create the layout
 nav_col, content_col = st.columns([1, 8])
@@ -17,15 +61,17 @@ with nav_col:
     selected_page = st.radio(
         
         "Navigation",
-        ["Home", "Emissions Trading", "Energy Consultation"],
+        list(PAGES),
         label_visibility="collapsed"
     )
 
 with content_col:
-    if selected_page == "Home":
-        display_home()
-    elif selected_page == "Emissions Trading":
-        display_emissions_trading()
-    elif selected_page == "Energy Consultation":
-        display_energy_consultation()
+    display_page = load_page(selected_page)
+    with span(f"page.{selected_page}"):
+        display_page()
+
+if os.environ.get('METRICS_LOG'):
+    registry.write_json(os.environ['METRICS_LOG'])
+if os.environ.get('DEBUG_PANEL') or st.query_params.get('debug') == '1':
+    display_debug_panel(rerun_start)
     
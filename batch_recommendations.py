@@ -0,0 +1,187 @@
+"""
+Generate energy recommendations for a whole portfolio.
+
+Runs get_energy_recommendations for every building through a bounded
+thread pool, throttled client-side and retried with backoff, checkpointing
+each finished building so an interrupted run resumes where it stopped.
+
+    python batch_recommendations.py --stub --limit 500
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+from tenacity import retry, stop_after_attempt, wait_random_exponential
+from utils import get_energy_recommendations
+from llm_cache import StubModel, cache_key
+
+MODEL_NAME = 'gemini-pro'
+DEFAULT_WORKERS = 8
+DEFAULT_RATE = 5.0  # requests per second
+DEFAULT_USAGE = "Commercial building in normal operation."
+
+
+class RateLimiter:
+    """Token bucket shared by all worker threads."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(rate, 1.0))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def load_checkpoint(path):
+    """Names already completed successfully in an earlier run, with their results."""
+    done = {}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A run killed mid-write leaves a partial last line
+                    continue
+                if record.get('error') is None:
+                    done[record['name']] = record
+    return done
+
+
+def generate_portfolio_recommendations(buildings_data, model, names=None, index=None,
+                                       usage_description=DEFAULT_USAGE, workers=DEFAULT_WORKERS,
+                                       rate=DEFAULT_RATE, max_attempts=4, checkpoint_path=None,
+                                       report_path=None, cache=None, progress=None):
+    """
+    Create recommendations for many buildings concurrently.
+
+    Args:
+        buildings_data (pd.DataFrame): Building table
+        model: Object with generate_content(prompt) -> response.text
+        names (list): Buildings to process (default: all)
+        index (BuildingIndex): Name index over buildings_data
+        workers (int): Maximum concurrent requests
+        rate (float): Maximum requests per second across all workers
+        max_attempts (int): Attempts per building before it is recorded as failed
+        checkpoint_path (str): JSONL file of finished buildings; completed names are skipped
+        report_path (str): Where to write the report (.csv, .csv.gz, ...); optional
+        cache (ResponseCache): Optional response cache shared with the chat page
+        progress (callable): Called as progress(done, total, failed) after each building
+
+    Returns:
+        pd.DataFrame: One row per building with name, recommendation and error
+    """
+    if names is None:
+        names = buildings_data['name'].drop_duplicates().tolist()
+    # A checkpoint can hold buildings outside this run (e.g. after a --limit run); they
+    # neither count towards progress nor belong in the report
+    wanted = set(names)
+    done = {name: record for name, record in load_checkpoint(checkpoint_path).items() if name in wanted}
+    pending = [name for name in names if name not in done]
+    limiter = RateLimiter(rate)
+
+    @retry(stop=stop_after_attempt(max_attempts), wait=wait_random_exponential(multiplier=0.5, max=30),
+           reraise=True)
+    def call_model(prompt):
+        limiter.acquire()
+        return model.generate_content(prompt).text
+
+    def recommend(name):
+        try:
+            # Inside the try: a row the prompt cannot be built from fails only its own building
+            messages = get_energy_recommendations(name, buildings_data, usage_description, index)
+            prompt = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
+            if cache is not None:
+                text = cache.get_or_generate(cache_key(MODEL_NAME, prompt), lambda: call_model(prompt))
+            else:
+                text = call_model(prompt)
+            return {'name': name, 'recommendation': text, 'error': None}
+        except Exception as e:
+            return {'name': name, 'recommendation': None, 'error': f"{type(e).__name__}: {e}"}
+
+    results = list(done.values())
+    failed = 0
+    write_lock = threading.Lock()
+    checkpoint = open(checkpoint_path, 'a') if checkpoint_path else None
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(recommend, name) for name in pending]
+            for future in as_completed(futures):
+                record = future.result()
+                results.append(record)
+                failed += record['error'] is not None
+                if checkpoint is not None:
+                    with write_lock:
+                        checkpoint.write(json.dumps(record) + "\n")
+                        checkpoint.flush()
+                if progress is not None:
+                    progress(len(results), len(names), failed)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+
+    report = pd.DataFrame(results, columns=['name', 'recommendation', 'error'])
+    if report_path:
+        report.to_csv(report_path, index=False)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--limit', type=int, help='Only process the first N buildings')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='Requests per second')
+    parser.add_argument('--checkpoint', default='data/recommendations.checkpoint.jsonl')
+    parser.add_argument('--report', default='data/recommendations.csv.gz')
+    parser.add_argument('--stub', action='store_true', help='Use the offline stub model')
+    parser.add_argument('--stub-latency', type=float, default=0.05)
+    parser.add_argument('--stub-error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    from building_store import BuildingStore
+    store = BuildingStore()
+    buildings_data = store.frame()
+    names = buildings_data['name'].drop_duplicates().tolist()[:args.limit]
+
+    if args.stub:
+        model = StubModel(MODEL_NAME, latency=args.stub_latency, error_rate=args.stub_error_rate)
+    else:
+        import google.generativeai as genai
+        genai.configure(api_key=os.environ['GOOGLE_API_KEY'])
+        model = genai.GenerativeModel(MODEL_NAME)
+
+    for path in (args.checkpoint, args.report):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    start = time.perf_counter()
+
+    def report_progress(done, total, failed):
+        if done % 100 == 0 or done == total:
+            elapsed = time.perf_counter() - start
+            print(f"{done:,}/{total:,} buildings, {failed:,} failed, {elapsed:.1f}s")
+
+    report = generate_portfolio_recommendations(
+        buildings_data, model, names=names, index=store.index, workers=args.workers,
+        rate=args.rate, checkpoint_path=args.checkpoint, report_path=args.report,
+        progress=report_progress,
+    )
+    print(f"Wrote {len(report):,} recommendations to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+import numpy as np
+from ingest import rating_codes
+
+# Intensities ranked against peers; lower is better for both
+METRICS = {
+    'emissions_intensity': ('annual_emissions', 'kg CO2e/sq ft'),
+    'energy_intensity': ('energy_usage', 'kWh/sq ft'),
+}
+GROUPINGS = ('size_band', 'location', 'rating')
+# Floor area band edges in sq ft
+SIZE_BAND_EDGES = np.array([0, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000, 500_000, np.inf])
+# Location peer groups are cells of this many degrees (about 25 km)
+LOCATION_CELL_DEG = 0.25
+LOCATION_COLUMNS = int(np.ceil(360 / LOCATION_CELL_DEG))
+TOP_K = 10
+
+
+def intensity(data, metric):
+    """Metric per sq ft for each row; NaN where the area or the numerator is missing or not positive."""
+    column, _ = METRICS[metric]
+    numerator = data[column].to_numpy(dtype=float)
+    area = data['area_sqft'].to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = numerator / area
+    return np.where(np.isfinite(values) & (area > 0) & (numerator >= 0), values, np.nan)
+
+
+def group_codes(data, grouping):
+    """Integer peer group of each row for one grouping; -1 where it cannot be assigned."""
+    if grouping == 'size_band':
+        area = data['area_sqft'].to_numpy(dtype=float)
+        codes = np.searchsorted(SIZE_BAND_EDGES, area, side='right') - 1
+        return np.where(np.isfinite(area) & (area > 0), codes, -1).astype(np.int64)
+    if grouping == 'location':
+        lat = data['latitude'].to_numpy(dtype=float)
+        lon = data['longitude'].to_numpy(dtype=float)
+        valid = np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+        with np.errstate(invalid='ignore'):
+            row = np.floor((np.nan_to_num(lat) + 90) / LOCATION_CELL_DEG).astype(np.int64)
+            col = np.floor((np.nan_to_num(lon) + 180) / LOCATION_CELL_DEG).astype(np.int64)
+        return np.where(valid, row * LOCATION_COLUMNS + np.minimum(col, LOCATION_COLUMNS - 1), -1)
+    if grouping == 'rating':
+        codes = rating_codes(data['rating'])
+        return np.where(codes > 0, codes, -1)
+    raise ValueError(f"Unknown grouping: {grouping}")
+
+
+def group_label(grouping, code):
+    """Human-readable name of one peer group."""
+    if code < 0:
+        return None
+    if grouping == 'size_band':
+        low, high = SIZE_BAND_EDGES[code], SIZE_BAND_EDGES[code + 1]
+        return f"{low:,.0f}+ sq ft" if np.isinf(high) else f"{low:,.0f}-{high:,.0f} sq ft"
+    if grouping == 'location':
+        row, col = divmod(int(code), LOCATION_COLUMNS)
+        lat = -90 + (row + 0.5) * LOCATION_CELL_DEG
+        lon = -180 + (col + 0.5) * LOCATION_CELL_DEG
+        return f"within {LOCATION_CELL_DEG}° cell around ({lat:.2f}, {lon:.2f})"
+    return f"rated {code}/5"
+
+
+def dense_codes(codes):
+    """Order-preserving renumbering of group codes to 0..groups-1, so they sort as small integers."""
+    if codes.max(initial=0) < np.iinfo(np.int16).max:
+        return codes
+    return np.unique(codes, return_inverse=True)[1].reshape(codes.shape)
+
+
+def sorted_order(dense, value_order, keep):
+    """
+    Rows where keep is set, ordered by (group, value): the value order,
+    shared by every grouping, stably re-sorted by group.
+    """
+    order = value_order[keep[value_order]]
+    keys = dense[order]
+    if keys.max(initial=0) < np.iinfo(np.int16).max:
+        # Stable sorts of 16-bit integers are radix sorts
+        keys = keys.astype(np.int16)
+    return order[np.argsort(keys, kind='stable')]
+
+
+def _insert_positions(codes, values, new_codes, new_values):
+    """
+    Where (code, value) pairs go in arrays sorted by (code, value), after
+    any equal pairs: a batched binary search within each code's segment.
+    """
+    low = np.searchsorted(codes, new_codes, side='left')
+    high = np.searchsorted(codes, new_codes, side='right')
+    if len(values) == 0:
+        return low
+    while True:
+        active = low < high
+        if not active.any():
+            return low
+        middle = (low + high) // 2
+        right = active & (values[np.minimum(middle, len(values) - 1)] <= new_values)
+        low = np.where(right, middle + 1, low)
+        high = np.where(active & ~right, middle, high)
+
+
+class PeerRanking:
+    """Rows with a value and a peer group, kept sorted by (group, value)."""
+
+    def __init__(self):
+        self.codes = np.zeros(0, dtype=np.int64)
+        self.values = np.zeros(0)
+        self.positions = np.zeros(0, dtype=np.int64)
+
+    def add(self, codes, values, positions, order):
+        """
+        Merge new rows in: O(k log n + n) to insert k rows into n.
+
+        Args:
+            codes, values, positions (np.ndarray): The new rows
+            order (np.ndarray): Indices of the rows to rank, sorted by (code, value); see sorted_order
+        """
+        if len(order) == 0:
+            return
+        codes, values, positions = codes[order], values[order], positions[order]
+        if len(self.codes) == 0:
+            self.codes, self.values, self.positions = codes, values, positions
+            return
+        at = _insert_positions(self.codes, self.values, codes, values)
+        self.codes = np.insert(self.codes, at, codes)
+        self.values = np.insert(self.values, at, values)
+        self.positions = np.insert(self.positions, at, positions)
+
+    def percentiles(self, rows):
+        """
+        Share of each row's peers with a higher (worse) value, in percent, with
+        ties counted as half; NaN for rows without a group or with no peers.
+
+        Returns:
+            tuple: (percentiles, peer group sizes), both aligned with row positions 0..rows-1
+        """
+        percentiles = np.full(rows, np.nan)
+        sizes = np.zeros(rows, dtype=np.int64)
+        n = len(self.codes)
+        if n == 0:
+            return percentiles, sizes
+        new_group = np.concatenate([[True], self.codes[1:] != self.codes[:-1]])
+        new_run = new_group | np.concatenate([[True], self.values[1:] != self.values[:-1]])
+        # Everything below is per run of equal values within a group
+        run_starts = np.flatnonzero(new_run)
+        run_lengths = np.diff(np.append(run_starts, n))
+        group_starts = np.flatnonzero(new_group)
+        group_ends = np.append(group_starts[1:], n)
+        group = np.cumsum(new_group[run_starts]) - 1
+        size = (group_ends - group_starts)[group]
+        greater = group_ends[group] - run_starts - run_lengths
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ranked = (greater + 0.5 * (run_lengths - 1)) / (size - 1) * 100
+        ranked[size < 2] = np.nan
+        if len(run_starts) < n:
+            ranked, size = np.repeat(ranked, run_lengths), np.repeat(size, run_lengths)
+        percentiles[self.positions] = ranked
+        sizes[self.positions] = size
+        return percentiles, sizes
+
+    def segment(self, code):
+        """Sorted values and row positions of one peer group."""
+        start = np.searchsorted(self.codes, code, side='left')
+        end = np.searchsorted(self.codes, code, side='right')
+        return self.values[start:end], self.positions[start:end]
+
+    def rank(self, code, value):
+        """Percentile and peer count of one value within group `code`, by binary search."""
+        values, _ = self.segment(code)
+        below = np.searchsorted(values, value, side='left')
+        above = np.searchsorted(values, value, side='right')
+        size = len(values)
+        if size < 2 or above == below:
+            return np.nan, size
+        return (size - above + 0.5 * (above - below - 1)) / (size - 1) * 100, size
+
+
+class PeerBenchmarks:
+    """
+    Intensity percentiles of every building within its peer groups.
+
+    Each metric (see METRICS) is ranked within floor-area bands, location
+    grid cells and ratings. Rankings are kept as arrays sorted by (group,
+    value), so update() merges new rows in with a binary search instead of
+    re-sorting the portfolio, and percentiles for all rows come from one
+    linear pass over run boundaries. Like PortfolioAggregates, row positions
+    are those of the building store, and update() only handles appends.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._values = {metric: np.zeros(0) for metric in METRICS}
+        self._codes = {grouping: np.zeros(0, dtype=np.int64) for grouping in GROUPINGS}
+        self._rankings = {(metric, grouping): PeerRanking() for metric in METRICS for grouping in GROUPINGS}
+        self._percentiles = {}
+
+    @classmethod
+    def from_frame(cls, buildings_data):
+        benchmarks = cls()
+        benchmarks.update(buildings_data, 0)
+        return benchmarks
+
+    def update(self, data, start=None):
+        """
+        Fold appended rows into the rankings.
+
+        Args:
+            data (pd.DataFrame): The new rows
+            start (int): Row position of the first new row (defaults to the current count)
+        """
+        start = self.count if start is None else start
+        if len(data) == 0:
+            return
+        positions = np.arange(start, start + len(data))
+        codes = {grouping: group_codes(data, grouping) for grouping in GROUPINGS}
+        dense = {grouping: dense_codes(codes[grouping]) for grouping in GROUPINGS}
+        for metric in METRICS:
+            values = intensity(data, metric)
+            self._values[metric] = np.concatenate([self._values[metric][:start], values])
+            value_order = np.argsort(values)
+            for grouping in GROUPINGS:
+                keep = (codes[grouping] >= 0) & np.isfinite(values)
+                self._rankings[metric, grouping].add(codes[grouping], values, positions,
+                                                     sorted_order(dense[grouping], value_order, keep))
+        for grouping in GROUPINGS:
+            self._codes[grouping] = np.concatenate([self._codes[grouping][:start], codes[grouping]])
+        self.count = max(self.count, start + len(data))
+        self._percentiles = {}
+
+    def values(self, metric):
+        return self._values[metric]
+
+    def codes(self, grouping):
+        return self._codes[grouping]
+
+    def percentiles(self, metric, grouping):
+        """
+        Percentile of every building within its peer group: the share of
+        peers it beats, in percent, so 100 is the best in its group.
+
+        Returns:
+            tuple: (percentiles, peer group sizes), aligned with store positions
+        """
+        key = (metric, grouping)
+        if key not in self._percentiles:
+            self._percentiles[key] = self._rankings[key].percentiles(self.count)
+        return self._percentiles[key]
+
+    def top_k(self, metric, k=TOP_K, best=True, grouping=None, code=None):
+        """
+        Positions of the k lowest (best) or highest intensities, best or worst first.
+
+        Without a grouping the whole portfolio is searched with argpartition;
+        with one, the ranking of group `code` is already sorted and sliced.
+        """
+        if grouping is not None:
+            values, positions = self._rankings[metric, grouping].segment(code)
+            return positions[:k] if best else positions[::-1][:k]
+        values = self._values[metric]
+        candidates = np.flatnonzero(np.isfinite(values))
+        k = min(k, len(candidates))
+        if k == 0:
+            return candidates
+        keys = values[candidates] if best else -values[candidates]
+        chosen = np.argpartition(keys, k - 1)[:k]
+        return candidates[chosen[np.argsort(keys[chosen], kind='stable')]]
+
+    def building_summary(self, position):
+        """
+        Benchmarks of one building for display or a prompt.
+
+        Returns:
+            dict: metric -> {value, unit, groups: [{grouping, label, peers, percentile, median}]}
+        """
+        summary = {}
+        for metric, (_, unit) in METRICS.items():
+            groups = []
+            value = self._values[metric][position]
+            for grouping in GROUPINGS:
+                code = int(self._codes[grouping][position])
+                if code < 0 or not np.isfinite(value):
+                    continue
+                ranking = self._rankings[metric, grouping]
+                percentile, peers = ranking.rank(code, value)
+                if not np.isfinite(percentile):
+                    continue
+                values, _ = ranking.segment(code)
+                groups.append({
+                    'grouping': grouping,
+                    'label': group_label(grouping, code),
+                    'peers': int(peers),
+                    'percentile': float(percentile),
+                    # Segments are sorted, so the median is a lookup
+                    'median': float(np.median(values[[(peers - 1) // 2, peers // 2]])),
+                })
+            summary[metric] = {'value': float(value), 'unit': unit, 'groups': groups}
+        return summary
+
+
+def describe(summary):
+    """One line per metric and peer group of a building_summary, for prompts and captions."""
+    lines = []
+    for metric, entry in summary.items():
+        name = metric.replace('_', ' ')
+        for group in entry['groups']:
+            lines.append(
+                f"{name.capitalize()} {entry['value']:.3g} {entry['unit']}: percentile {group['percentile']:.0f} "
+                f"of {group['peers']:,} peers {group['label']} (peer median {group['median']:.3g})"
+            )
+    return lines
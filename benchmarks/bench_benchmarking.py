@@ -0,0 +1,59 @@
+"""
+Peer benchmarks: full build, percentiles and incremental appends.
+
+An append merges into the sorted rankings by binary search, so it should
+cost a small fraction of a rebuild; the rebuild is also the pandas
+groupby-rank it replaces, for comparison.
+
+Run from the project root:
+    python -m benchmarks.bench_benchmarking
+    python -m benchmarks.bench_benchmarking --buildings 1000000 --append 1000
+"""
+import argparse
+import time
+from benchmarks.generate_buildings import generate_buildings
+from benchmarking import GROUPINGS, METRICS, PeerBenchmarks, group_codes, intensity
+
+
+def timed(label, function):
+    start = time.perf_counter()
+    result = function()
+    print(f"{label:>36} {time.perf_counter() - start:>8.3f}s")
+    return result
+
+
+def pandas_ranks(buildings):
+    """Every metric ranked within every grouping with groupby().rank()."""
+    frame = buildings[[]].copy()
+    for grouping in GROUPINGS:
+        frame[grouping] = group_codes(buildings, grouping)
+    for metric in METRICS:
+        frame[metric] = intensity(buildings, metric)
+        for grouping in GROUPINGS:
+            frame.loc[frame[grouping] >= 0].groupby(grouping)[metric].rank(method='average', ascending=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--buildings', type=int, default=1_000_000)
+    parser.add_argument('--append', type=int, default=1_000)
+    args = parser.parse_args()
+
+    buildings = generate_buildings(args.buildings + args.append)
+    base, tail = buildings.iloc[:args.buildings], buildings.iloc[args.buildings:]
+    rankings = len(METRICS) * len(GROUPINGS)
+    print(f"{args.buildings:,} buildings, {rankings} rankings")
+
+    timed("pandas groupby rank", lambda: pandas_ranks(base))
+    benchmarks = timed("build", lambda: PeerBenchmarks.from_frame(base))
+    timed("all percentiles", lambda: [benchmarks.percentiles(metric, grouping)
+                                      for metric in METRICS for grouping in GROUPINGS])
+    timed(f"append {args.append:,} rows", lambda: benchmarks.update(tail))
+    timed("all percentiles after append", lambda: [benchmarks.percentiles(metric, grouping)
+                                                   for metric in METRICS for grouping in GROUPINGS])
+    timed("top 10 of the portfolio", lambda: benchmarks.top_k('emissions_intensity'))
+    timed("one building's summary", lambda: benchmarks.building_summary(args.buildings // 2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Purchase planner: batch plans against a per-buyer greedy loop.
+
+Run from the project root:
+    python -m benchmarks.bench_credit_planner
+    python -m benchmarks.bench_credit_planner --sellers 1000000 --buyers 10000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from credit_planner import credit_supply, plan_purchases
+
+
+def greedy_loop(supply, required):
+    """Each buyer in turn walks the price-sorted sellers, as a hand-written planner would."""
+    capacity = supply['available'].to_numpy().copy()
+    price = supply['price'].to_numpy()
+    seller, cost = 0, 0.0
+    for need in required:
+        while need and seller < len(capacity):
+            take = min(need, capacity[seller])
+            need -= take
+            capacity[seller] -= take
+            cost += take * price[seller]
+            if capacity[seller] == 0:
+                seller += 1
+    return cost
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sellers', type=int, default=1_000_000)
+    parser.add_argument('--buyers', type=int, default=10_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    sellers = pd.DataFrame({
+        'name': pd.Series(np.arange(args.sellers)).astype(str).radd('Building_'),
+        'price_per_credit': np.round(rng.uniform(150.0, 300.0, args.sellers), 2),
+        'credits_available': rng.poisson(15, args.sellers),
+    })
+    offsets = pd.DataFrame({
+        'name': [f'Project_{i}' for i in range(50)],
+        'credits_available': rng.integers(1_000, 100_000, 50),
+        'price_per_credit': np.round(rng.uniform(100.0, 400.0, 50), 2),
+        'verification': rng.choice(['Gold Standard', 'Verra VCS', None], 50),
+    })
+    required = rng.integers(100, 2_000, args.buyers)
+    buyers = [f'Buyer_{i}' for i in range(args.buyers)]
+    print(f"{args.sellers:,} sellers, {args.buyers:,} buyers needing {required.sum():,} credits")
+
+    start = time.perf_counter()
+    supply = credit_supply(sellers, offsets, exclude=buyers)
+    print(f"{'sort supply':>20} {time.perf_counter() - start:>8.3f}s")
+    start = time.perf_counter()
+    plan = plan_purchases(buyers, required, supply)
+    print(f"{'batch plan':>20} {time.perf_counter() - start:>8.3f}s  {len(plan.legs):,} trades, "
+          f"shortfall {plan.shortfall.sum():,}")
+    start = time.perf_counter()
+    cost = greedy_loop(supply, required)
+    print(f"{'per-buyer loop':>20} {time.perf_counter() - start:>8.3f}s  same cost: "
+          f"{np.isclose(cost, plan.total_cost)}")
+
+
+if __name__ == "__main__":
+    main()
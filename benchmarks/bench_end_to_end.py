@@ -0,0 +1,257 @@
+"""
+End-to-end benchmark of the dashboard's data paths on synthetic portfolios.
+
+Times ingestion, the home page metrics, forecasting, chart and map
+construction, name lookups and the trading page's seller queries outside
+Streamlit, with the peak memory of each stage. Results are written as JSON
+so runs can be compared between versions.
+
+Run from the project root:
+    python -m benchmarks.bench_end_to_end --rows 1k 100k 1M
+    python -m benchmarks.bench_end_to_end --rows 1k 100k --compare data/benchmarks/previous.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from benchmarks.generate_buildings import dataset_path, ensure_dataset, parse_size
+from ingest import read_buildings_csv
+from building_store import BuildingStore
+from timeseries_store import TimeSeriesStore
+from building_index import building_row
+from aggregates import PortfolioAggregates
+from benchmarking import PeerBenchmarks
+from forecasting import fit_trends, forecast, portfolio_forecast
+from map_layer import build_building_map, cell_layer, viewport_bbox
+from emissions_trading import nearby_sellers
+from emissions_charts import chart_modes, emissions_figure
+import home
+
+FORECAST_YEARS = 5
+NUM_LOOKUPS = 10_000
+NUM_SELLER_QUERIES = 20
+SELLER_RADIUS_KM = 25
+REGRESSION_THRESHOLD = 1.2
+
+
+def max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if platform.system() == 'Darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+
+
+class Stages:
+    """
+    Collects wall time and peak traced allocations per stage.
+
+    tracemalloc sees NumPy and pandas buffers but slows down code that
+    allocates many small Python objects, so trace_memory=False gives clean
+    timings for those stages.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.results = {}
+
+    def run(self, name, fn, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        value = fn(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        result = {'seconds': seconds, 'max_rss_mb': max_rss_mb()}
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            result['peak_mb'] = (peak - before) / 1e6
+        self.results[name] = result
+        return value
+
+
+def forecast_stage(buildings_data, timeseries):
+    matrix, x = home.building_history(buildings_data, 1, timeseries=timeseries)
+    fit = fit_trends(matrix, x)
+    future_x = x[-1] + np.arange(1, FORECAST_YEARS + 1)
+    forecast(fit, future_x)
+    predictions, lower, upper = portfolio_forecast(fit, future_x)
+    return x, np.nansum(matrix, axis=0), future_x, predictions, lower, upper
+
+
+def chart_stage(buildings_data, forecast_result):
+    x, historical_totals, future_x, predictions, lower, upper = forecast_result
+    target = buildings_data['annual_emissions'].sum() * 0.95 ** np.arange(FORECAST_YEARS + 1)
+    # to_json is what st.plotly_chart ships to the browser
+    home.forecast_figure(x, historical_totals, future_x, predictions, lower, upper, target, 5.0).to_json()
+    for mode in chart_modes(len(buildings_data)):
+        emissions_figure(buildings_data, mode).to_json()
+
+
+def map_stage(store, buildings_data):
+    m, needs_cells = build_building_map(buildings_data)
+    if needs_cells:
+        # A city-sized viewport around the first located building, as after a zoom in
+        located = buildings_data[['latitude', 'longitude']].dropna()
+        lat, lon = located.iloc[0]
+        zoom = 11
+        bounds = {'_southWest': {'lat': lat - 0.2, 'lng': lon - 0.3},
+                  '_northEast': {'lat': lat + 0.2, 'lng': lon + 0.3}}
+        positions = store.spatial_index.bbox(*viewport_bbox(bounds, zoom))
+        cell_layer(buildings_data, zoom, positions)
+    return m
+
+
+def lookup_stage(store, buildings_data, names):
+    index = store.index
+    for name in names:
+        building_row(buildings_data, name, index)
+
+
+def trading_stage(store, buildings_data, buyers):
+    sellers = buildings_data[buildings_data['credits_available'] > 0][['name', 'credits_available',
+                                                                        'price_per_credit']]
+    for name in buyers:
+        buyer = building_row(buildings_data, name, store.index)
+        if np.isfinite(buyer['latitude']):
+            nearby_sellers(sellers, buyer, SELLER_RADIUS_KM, store.spatial_index)
+
+
+def run(rows, data_dir, seed, trace_memory=True):
+    # Generated once per size and reused by later runs; not part of the timings
+    if not os.path.exists(dataset_path(data_dir, rows, seed)):
+        print(f"Generating {rows:,} buildings...")
+    path = ensure_dataset(data_dir, rows, seed)
+    stages = Stages(trace_memory)
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        return run_stages(stages, path, rows, seed)
+    finally:
+        tracemalloc.stop()
+
+
+def run_stages(stages, path, rows, seed):
+    buildings_data, _ = stages.run('ingest', read_buildings_csv, path, total_bytes=os.path.getsize(path))
+
+    store_dir = tempfile.mkdtemp(prefix='bench-store-')
+    try:
+        store = BuildingStore(store_dir)
+        stages.run('store_append', store.append, buildings_data)
+        del buildings_data
+        frame = stages.run('store_frame', store.frame)
+
+        def metrics():
+            aggregates = PortfolioAggregates.from_frame(frame)
+            # Best Performer: lowest emissions per sq ft
+            best = PeerBenchmarks.from_frame(frame).top_k('emissions_intensity', 1)
+            if len(best):
+                frame.iloc[best[0]]
+            return aggregates
+        stages.run('metrics', metrics)
+
+        # An empty metered store, so the results do not depend on data already on this machine
+        timeseries = TimeSeriesStore(os.path.join(store_dir, 'timeseries'))
+        forecast_result = stages.run('forecast', forecast_stage, frame, timeseries)
+        stages.run('charts', chart_stage, frame, forecast_result)
+
+        stages.run('spatial_index', lambda: store.spatial_index)
+        stages.run('map', map_stage, store, frame)
+
+        rng = np.random.default_rng(seed)
+        names = frame['name'].to_numpy()[rng.integers(0, rows, NUM_LOOKUPS)]
+        stages.run('name_index', lambda: store.index)
+        stages.run('lookups', lookup_stage, store, frame, names)
+        stages.run('trading', trading_stage, store, frame, names[:NUM_SELLER_QUERIES])
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+    return stages.results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def print_results(rows, results):
+    print(f"\n{rows:,} buildings")
+    print(f"{'stage':>14} {'seconds':>9} {'peak MB':>9} {'max RSS MB':>11}")
+    for stage, result in results.items():
+        peak = f"{result['peak_mb']:>9.1f}" if 'peak_mb' in result else f"{'-':>9}"
+        print(f"{stage:>14} {result['seconds']:>9.3f} {peak} {result['max_rss_mb']:>11.1f}")
+
+
+def compare(current, previous_path, threshold):
+    """Print per-stage time ratios against an earlier run; returns the regressions."""
+    with open(previous_path) as f:
+        previous = json.load(f)
+    regressions = []
+    print(f"\nCompared with {previous_path} (commit {previous['environment'].get('commit')})")
+    if previous['environment'].get('trace_memory') != current['environment'].get('trace_memory'):
+        print("Warning: only one of the runs traced memory, which skews timings")
+    for size, stages in current['results'].items():
+        for stage, result in stages.items():
+            before = previous['results'].get(size, {}).get(stage)
+            if not before or 'seconds' not in before or 'seconds' not in result :
+                continue
+            ratio = result['seconds'] / max(before['seconds'], 1e-9)
+            flag = '  REGRESSION' if ratio > threshold else ''
+            print(f"{int(size):>12,} {stage:>14} {ratio:>6.2f}x{flag}")
+            if flag:
+                regressions.append((size, stage, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', nargs='+', default=['1k', '100k'], help='Sizes, e.g. 1k 100k 1M 10M')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default='data/synthetic', help='Where generated CSVs are kept')
+    parser.add_argument('--output', help='Results JSON (default: data/benchmarks/end_to_end-<time>.json)')
+    parser.add_argument('--compare', help='Earlier results JSON to compare against')
+    parser.add_argument('--no-trace-memory', dest='trace_memory', action='store_false',
+                        help='Skip tracemalloc for cleaner timings (RSS is still reported)')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='Slowdown ratio reported as a regression')
+    args = parser.parse_args()
+
+    report = {'environment': {**environment(), 'trace_memory': args.trace_memory}, 'results': {}}
+    for size in args.rows:
+        rows = parse_size(size)
+        results = run(rows, args.data_dir, args.seed, args.trace_memory)
+        report['results'][str(rows)] = results
+        print_results(rows, results)
+
+    output = args.output or os.path.join('data', 'benchmarks',
+                                         f"end_to_end-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        regressions = compare(report, args.compare, args.threshold)
+        if regressions:
+            raise SystemExit(f"{len(regressions)} stage(s) slower than {args.threshold:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Credit ledger purchase throughput: group commit vs one commit per trade.
+
+Run from the project root:
+    python -m benchmarks.bench_ledger
+"""
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.generate_buildings import generate_buildings
+from building_store import BuildingStore
+from credit_ledger import CreditLedger, BATCH_WINDOW_SECONDS, MAX_BATCH
+
+NUM_BUILDINGS = 10_000
+NUM_PURCHASES = 5_000
+CLIENTS = 32
+
+
+def run(store, path, batch_window, max_batch, names):
+    ledger = CreditLedger(store, path, batch_window=batch_window, max_batch=max_batch)
+    pairs = [(names[i], names[i + 1]) for i in range(NUM_PURCHASES)]
+
+    def purchase(pair):
+        try:
+            ledger.transfer(*pair, 1)
+        except ValueError:
+            pass
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CLIENTS) as pool:
+        list(pool.map(purchase, pairs))
+    elapsed = time.perf_counter() - start
+    stats = dict(ledger.stats)
+    ledger.close()
+    return NUM_PURCHASES / elapsed, stats
+
+
+def main():
+    directory = tempfile.mkdtemp(prefix='bench-ledger-')
+    try:
+        store = BuildingStore(os.path.join(directory, 'store'))
+        buildings = generate_buildings(NUM_BUILDINGS)
+        store.append(buildings)
+        names = buildings['name'].sample(NUM_PURCHASES + 1, replace=True, random_state=0).tolist()
+
+        print(f"{CLIENTS} concurrent clients, {NUM_PURCHASES:,} purchases")
+        print(f"{'mode':>14} {'purchases/s':>12} {'commits':>8}")
+        for label, window, batch in (('per trade', 0.0, 1), ('group commit', BATCH_WINDOW_SECONDS, MAX_BATCH)):
+            rate, stats = run(store, os.path.join(directory, f'{label}.sqlite3'), window, batch, names)
+            print(f"{label:>14} {rate:>12,.0f} {stats['commits']:>8,}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Microbenchmark for the order book matching engine.
+
+Run from the project root:
+    python -m benchmarks.bench_order_book
+"""
+import random
+import time
+from order_book import OrderBook, BUY, SELL
+
+
+def prefill(book, depth, rng):
+    """Rest `depth` non-crossing orders on each side of a 100.00 mid price."""
+    for _ in range(depth):
+        book.submit(BUY, rng.randint(1, 50), round(rng.uniform(50, 99.99), 2))
+        book.submit(SELL, rng.randint(1, 50), round(rng.uniform(100, 150), 2))
+
+
+def run(depth, num_orders, seed=42):
+    rng = random.Random(seed)
+    book = OrderBook()
+    prefill(book, depth, rng)
+
+    # Burst of mixed orders around the spread: some rest, some cross
+    orders = [
+        (BUY if rng.random() < 0.5 else SELL, rng.randint(1, 100), round(rng.gauss(100, 10), 2))
+        for _ in range(num_orders)
+    ]
+
+    fills = 0
+    start = time.perf_counter()
+    for side, quantity, price in orders:
+        _, transactions, _ = book.submit(side, quantity, max(price, 0.01))
+        fills += len(transactions)
+    elapsed = time.perf_counter() - start
+    return num_orders / elapsed, fills
+
+
+def main():
+    num_orders = 100_000
+    print(f"{'resting depth':>14} {'orders/sec':>12} {'fills':>10}")
+    for depth in (1_000, 10_000, 100_000):
+        rate, fills = run(depth, num_orders)
+        print(f"{depth:>14,} {rate:>12,.0f} {fills:>10,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Monte Carlo scenario engine: serial vs process pool, and rerun costs.
+
+Run from the project root:
+    python -m benchmarks.bench_scenarios
+    python -m benchmarks.bench_scenarios --buildings 200000 --scenarios 1000
+"""
+import argparse
+import os
+import time
+import numpy as np
+from benchmarks.generate_buildings import generate_buildings
+from forecasting import fit_trends
+from scenarios import ScenarioEngine, retrofit_plan
+
+
+def timed_run(engine, *args, **kwargs):
+    start = time.perf_counter()
+    result = engine.run(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--buildings', type=int, default=50_000)
+    parser.add_argument('--scenarios', type=int, default=1000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    buildings = generate_buildings(args.buildings)
+    current = buildings['annual_emissions'].to_numpy(dtype=float)
+    rng = np.random.default_rng(0)
+    history = np.column_stack([current[:, None] * (1 + rng.uniform(-0.1, 0.1, (len(current), 2))), current])
+    fit = fit_trends(history, np.arange(3))
+    elements = args.buildings * args.scenarios * args.years
+    print(f"{args.buildings:,} buildings x {args.scenarios:,} scenarios x {args.years} years "
+          f"= {elements / 1e6:,.0f}M values")
+
+    serial, baseline = timed_run(ScenarioEngine(fit, current), args.years, args.scenarios, workers=1)
+    print(f"{'serial':>28} {serial:>8.2f}s")
+    engine = ScenarioEngine(fit, current)
+    pooled, result = timed_run(engine, args.years, args.scenarios, workers=args.workers)
+    print(f"{f'{args.workers} processes':>28} {pooled:>8.2f}s  same result: "
+          f"{np.allclose(result.totals, baseline.totals)}")
+    cached, _ = timed_run(engine, args.years, args.scenarios, workers=args.workers)
+    print(f"{'rerun, nothing changed':>28} {cached:>8.3f}s")
+    start, reduction = retrofit_plan(np.arange(args.buildings) < 100, 2, 0.3)
+    partial, _ = timed_run(engine, args.years, args.scenarios, retrofit_start=start,
+                           retrofit_reduction=reduction, workers=args.workers)
+    print(f"{'rerun, 100 retrofits added':>28} {partial:>8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Spatial index vs brute-force scans for bbox, radius and k-nearest queries.
+
+Run from the project root:
+    python -m benchmarks.bench_spatial_index
+"""
+import time
+import numpy as np
+from spatial_index import SpatialIndex, haversine_km
+
+NUM_QUERIES = 200
+RADIUS_KM = 5.0
+K = 10
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    for query in queries:
+        fn(*query)
+    return (time.perf_counter() - start) / len(queries) * 1e3
+
+
+def brute_bbox(lat, lon, min_lat, min_lon, max_lat, max_lon):
+    return np.flatnonzero((lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon))
+
+
+def brute_radius(lat, lon, qlat, qlon, radius_km):
+    distances = haversine_km(qlat, qlon, lat, lon)
+    return np.flatnonzero(distances <= radius_km)
+
+
+def brute_nearest(lat, lon, qlat, qlon, k):
+    distances = haversine_km(qlat, qlon, lat, lon)
+    nearest = np.argpartition(distances, k - 1)[:k]
+    return nearest[np.argsort(distances[nearest])]
+
+
+def run(n, rng):
+    # Buildings spread over a metro-sized region, as in a municipal registry
+    lat = rng.uniform(40.0, 42.0, n)
+    lon = rng.uniform(-75.0, -72.0, n)
+    qlat = rng.uniform(40.0, 42.0, NUM_QUERIES)
+    qlon = rng.uniform(-75.0, -72.0, NUM_QUERIES)
+
+    start = time.perf_counter()
+    index = SpatialIndex(lat, lon)
+    build_ms = (time.perf_counter() - start) * 1e3
+
+    boxes = [(a, b, a + 0.05, b + 0.05) for a, b in zip(qlat, qlon)]
+    circles = [(a, b, RADIUS_KM) for a, b in zip(qlat, qlon)]
+    points = [(a, b, K) for a, b in zip(qlat, qlon)]
+
+    # Sanity check: both paths must agree
+    assert set(index.radius(*circles[0])[0]) == set(brute_radius(lat, lon, *circles[0]))
+
+    return {
+        'build_ms': build_ms,
+        'bbox': (timed(index.bbox, boxes), timed(lambda *q: brute_bbox(lat, lon, *q), boxes)),
+        'radius': (timed(index.radius, circles), timed(lambda *q: brute_radius(lat, lon, *q), circles)),
+        'nearest': (timed(index.nearest, points), timed(lambda *q: brute_nearest(lat, lon, *q), points)),
+    }
+
+
+def main():
+    rng = np.random.default_rng(42)
+    print(f"{'points':>10} {'build ms':>9} {'query':>8} {'index ms':>9} {'brute ms':>9} {'speedup':>8}")
+    for n in (10_000, 100_000, 1_000_000):
+        results = run(n, rng)
+        for query in ('bbox', 'radius', 'nearest'):
+            indexed, brute = results[query]
+            print(f"{n:>10,} {results['build_ms']:>9.1f} {query:>8} {indexed:>9.3f} {brute:>9.3f} {brute / indexed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Cold-start import cost of the app and of each page.
+
+Each measurement runs in a fresh interpreter. "startup" executes app.py's
+top-level imports, the work every new Streamlit worker does before the
+first page is chosen. Each page row adds that page's module on top. The
+run fails if any of HEAVY_MODULES is loaded at startup, or if startup
+exceeds --max-startup-seconds.
+
+Run from the project root:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 5 --output data/benchmarks/startup.json
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+# Libraries that should only load once a page that needs them is opened.
+# Streamlit itself imports plotly.graph_objects, so only plotly.express counts
+HEAVY_MODULES = ['google.generativeai', 'plotly.express', 'folium', 'streamlit_folium', 'sklearn']
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{imports}
+startup = time.perf_counter() - start
+page = None
+if {page!r}:
+    start = time.perf_counter()
+    __import__({page!r})
+    page = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{'startup': startup, 'page': page, 'heavy': heavy, 'modules': len(sys.modules)}}))
+"""
+
+
+def app_imports(path=APP_PATH):
+    """Source of app.py's top-level import statements, and its PAGES registry."""
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    imports = [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    pages = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, 'id', None) == 'PAGES' for t in node.targets):
+            pages = ast.literal_eval(node.value)
+    return "\n".join(imports), pages
+
+
+def probe(imports, page=None):
+    code = PROBE.format(imports=imports, page=page, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            cwd=os.path.dirname(APP_PATH), check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(repeat):
+    imports, pages = app_imports()
+    results = {}
+    for label, module in [('startup', None)] + [(name, module) for name, (module, _) in pages.items()]:
+        samples = [probe(imports, module) for _ in range(repeat)]
+        key = 'startup' if module is None else 'page'
+        results[label] = {
+            'module': module,
+            'seconds': statistics.median(sample[key] for sample in samples),
+            'heavy_modules': samples[-1]['heavy'],
+            'modules_loaded': samples[-1]['modules'],
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=3, help='Fresh interpreters per measurement')
+    parser.add_argument('--max-startup-seconds', type=float, help='Fail if startup is slower')
+    parser.add_argument('--output', help='Write results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    print(f"{'':>20} {'seconds':>8} {'modules':>8}  heavy modules loaded")
+    for label, result in results.items():
+        print(f"{label:>20} {result['seconds']:>8.2f} {result['modules_loaded']:>8,}  "
+              f"{', '.join(result['heavy_modules']) or '-'}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    failures = []
+    if results['startup']['heavy_modules']:
+        failures.append(f"startup imports {', '.join(results['startup']['heavy_modules'])}")
+    if args.max_startup_seconds and results['startup']['seconds'] > args.max_startup_seconds:
+        failures.append(f"startup took {results['startup']['seconds']:.2f}s "
+                        f"(limit {args.max_startup_seconds:.2f}s)")
+    if failures:
+        raise SystemExit("Startup regression: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
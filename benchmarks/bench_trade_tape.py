@@ -0,0 +1,48 @@
+"""
+Trade tape append and query cost as fills accumulate.
+
+Both should stay flat: appends write one fill and one row per bar
+interval, and queries read a bounded number of bars.
+
+Run from the project root:
+    python -m benchmarks.bench_trade_tape
+"""
+import time
+import numpy as np
+from trade_tape import TradeTape
+
+CHECKPOINTS = (100_000, 1_000_000, 3_000_000)
+QUERIES = 1_000
+BAR_LIMIT = 120
+
+
+def main():
+    rng = np.random.default_rng(0)
+    tape = TradeTape()
+    # Roughly one fill every 0.2 s, so three million fills span about a week
+    clock = 1.7e9
+    recorded = 0
+    print(f"{'fills':>10} {'appends/s':>10} {'1m bars ms':>11} {'1d bars ms':>11} {'recent ms':>10}")
+    for checkpoint in CHECKPOINTS:
+        count = checkpoint - recorded
+        times = clock + np.cumsum(rng.exponential(0.2, count))
+        prices = np.round(10 + np.cumsum(rng.normal(0, 0.01, count)), 2)
+        quantities = rng.integers(1, 100, count)
+        start = time.perf_counter()
+        for timestamp, price, quantity in zip(times.tolist(), prices.tolist(), quantities.tolist()):
+            tape.record(price, quantity, timestamp)
+        append_rate = count / (time.perf_counter() - start)
+        clock, recorded = times[-1], checkpoint
+
+        timings = []
+        for query in (lambda: tape.bars('1m', limit=BAR_LIMIT), lambda: tape.bars('1d', limit=BAR_LIMIT),
+                      lambda: tape.recent(50)):
+            start = time.perf_counter()
+            for _ in range(QUERIES):
+                query()
+            timings.append((time.perf_counter() - start) / QUERIES * 1000)
+        print(f"{checkpoint:>10,} {append_rate:>10,.0f} {timings[0]:>11.3f} {timings[1]:>11.3f} {timings[2]:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
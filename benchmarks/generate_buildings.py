@@ -0,0 +1,133 @@
+"""
+Deterministic synthetic building portfolios in the buildings_data.csv schema.
+
+Run from the project root:
+    python -m benchmarks.generate_buildings --rows 1k 100k 1M 10M
+"""
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from ingest import BUILDING_COLUMNS
+
+SIZES = {'1k': 1_000, '100k': 100_000, '1M': 1_000_000, '10M': 10_000_000}
+# Rows generated per step; each step draws from its own seeded stream, so
+# the output for a given seed does not depend on memory or chunking
+CHUNK_ROWS = 250_000
+NUM_CITIES = 200
+STREETS = np.array(['Main St', 'Oak Ave', 'Park Rd', 'Market St', 'River Dr', 'Hill St', 'Lake Ave', 'Elm St'])
+GRID_EMISSION_FACTOR = 0.4
+# Share of rows without coordinates, as in real registries
+MISSING_COORDINATES = 0.01
+
+
+def parse_size(text):
+    """'100k' -> 100000; plain integers are accepted too."""
+    if text in SIZES:
+        return SIZES[text]
+    return int(float(text.replace('k', 'e3').replace('M', 'e6')))
+
+
+def city_centers(seed):
+    rng = np.random.default_rng([seed, 0])
+    return rng.uniform(25.0, 60.0, NUM_CITIES), rng.uniform(-125.0, 30.0, NUM_CITIES)
+
+
+def generate_chunk(start, rows, seed=0):
+    """
+    Buildings start .. start+rows-1 of the portfolio for `seed`.
+
+    Buildings are clustered around city centres. Energy use follows floor
+    area times a lognormal intensity, emissions follow energy use, and the
+    1-5 rating tracks intensity, so the columns relate to each other the
+    way real data does.
+    """
+    rng = np.random.default_rng([seed, 1, start // CHUNK_ROWS])
+    center_lat, center_lon = city_centers(seed)
+    ids = np.arange(start + 1, start + rows + 1)
+    city = rng.integers(0, NUM_CITIES, rows)
+
+    area = np.round(rng.lognormal(10.0, 0.8, rows)).astype(np.int64) + 500
+    intensity = rng.lognormal(2.7, 0.45, rows)  # kWh per sq ft
+    energy = np.round(area * intensity, 2)
+    emissions = np.round(energy * GRID_EMISSION_FACTOR * rng.uniform(0.8, 1.2, rows), 2)
+    # Quintiles of intensity: the most efficient fifth rates 5
+    rating = 5 - np.clip(np.searchsorted(np.exp(2.7 + 0.45 * np.array([-0.84, -0.25, 0.25, 0.84])),
+                                         intensity), 0, 4)
+
+    latitude = np.round(center_lat[city] + rng.normal(0, 0.08, rows), 6)
+    longitude = np.round(center_lon[city] + rng.normal(0, 0.1, rows), 6)
+    missing = rng.random(rows) < MISSING_COORDINATES
+    latitude[missing] = np.nan
+    longitude[missing] = np.nan
+
+    # Better-rated buildings have more surplus credits to sell
+    credits = rng.poisson(rating * 5)
+    price = np.round(rng.uniform(150.0, 300.0, rows), 2)
+
+    name = pd.Series(ids).astype(str).radd('Building_')
+    address = (pd.Series(rng.integers(1, 1000, rows)).astype(str) + ' '
+               + STREETS[rng.integers(0, len(STREETS), rows)] + ', City_'
+               + pd.Series(city + 1).astype(str))
+    return pd.DataFrame({
+        'name': name,
+        'address': address,
+        'area_sqft': area,
+        'annual_emissions': emissions,
+        'energy_usage': energy,
+        'rating': rating,
+        'latitude': latitude,
+        'longitude': longitude,
+        'credits_available': credits,
+        'price_per_credit': price,
+    }, columns=BUILDING_COLUMNS)
+
+
+def generate_buildings(rows, seed=0):
+    """The whole portfolio as one DataFrame (for sizes that fit in memory)."""
+    return pd.concat([generate_chunk(start, min(CHUNK_ROWS, rows - start), seed)
+                      for start in range(0, rows, CHUNK_ROWS)], ignore_index=True)
+
+
+def write_buildings_csv(path, rows, seed=0):
+    """Stream a portfolio to CSV chunk by chunk, in bounded memory."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        for start in range(0, rows, CHUNK_ROWS):
+            chunk = generate_chunk(start, min(CHUNK_ROWS, rows - start), seed)
+            chunk.to_csv(f, index=False, header=start == 0)
+    os.replace(tmp_path, path)
+    return path
+
+
+def dataset_path(directory, rows, seed=0):
+    return os.path.join(directory, f'buildings-{rows}-seed{seed}.csv')
+
+
+def ensure_dataset(directory, rows, seed=0):
+    """Path of the CSV for (rows, seed), generating it on first use."""
+    path = dataset_path(directory, rows, seed)
+    if not os.path.exists(path):
+        write_buildings_csv(path, rows, seed)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', nargs='+', default=['1k', '100k'], help='Sizes, e.g. 1k 100k 1M 10M')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='data/synthetic')
+    args = parser.parse_args()
+
+    for size in args.rows:
+        rows = parse_size(size)
+        start = time.perf_counter()
+        path = write_buildings_csv(dataset_path(args.out, rows, args.seed), rows, args.seed)
+        elapsed = time.perf_counter() - start
+        print(f"{rows:>12,} rows -> {path} ({os.path.getsize(path) / 1e6:,.1f} MB, {elapsed:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
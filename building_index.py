@@ -0,0 +1,62 @@
+import numpy as np
+
+
+class BuildingIndex:
+    """
+    Hash index from building name to row position.
+
+    Positions only ever grow as rows are appended, so an index stays valid
+    for any older frame as long as the position is within that frame. When a
+    name appears more than once the first row wins, matching what a boolean
+    scan followed by .iloc[0] returns.
+    """
+
+    def __init__(self):
+        self._positions = {}
+        self.size = 0
+
+    def extend(self, names, start=None):
+        """Index names for the rows starting at `start` (defaults to the end of the index)."""
+        start = self.size if start is None else start
+        positions = self._positions
+        for offset, name in enumerate(names):
+            positions.setdefault(name, start + offset)
+        self.size = max(self.size, start + len(names))
+
+    def position(self, name):
+        return self._positions.get(name)
+
+    def positions(self, names):
+        """Positions of many names at once, -1 for names not in the index."""
+        get = self._positions.get
+        return np.fromiter((get(name, -1) for name in names), dtype=np.int64, count=len(names))
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    def __len__(self):
+        return len(self._positions)
+
+
+def building_row(buildings_data, building_name, index=None):
+    """
+    Return the row for a building as a Series.
+
+    Args:
+        buildings_data (pd.DataFrame): Building table
+        building_name (str): Name to look up
+        index (BuildingIndex): Index over buildings_data; without one the table is scanned
+
+    Raises:
+        KeyError: If the building is not in the table
+    """
+    if index is not None:
+        position = index.position(building_name)
+        if position is not None and position < len(buildings_data):
+            return buildings_data.iloc[position]
+        raise KeyError(building_name)
+
+    matches = buildings_data[buildings_data['name'] == building_name]
+    if matches.empty:
+        raise KeyError(building_name)
+    return matches.iloc[0]
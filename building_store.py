@@ -0,0 +1,420 @@
+import contextlib
+import json
+import os
+import shutil
+import threading
+try:
+    import fcntl
+except ImportError:
+    # Windows: writers in one process are still serialized by the thread lock
+    fcntl = None
+import numpy as np
+import pandas as pd
+import streamlit as st
+from ingest import BUILDING_COLUMNS, TEXT_COLUMNS
+from building_index import BuildingIndex
+from spatial_index import SpatialIndex
+from aggregates import PortfolioAggregates
+from benchmarking import PeerBenchmarks
+from upsert import row_hashes
+
+STORE_DIR = os.environ.get(
+    'BUILDING_STORE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'buildings')
+)
+MIN_CAPACITY = 1024
+
+
+class BuildingStore:
+    """
+    Building table persisted as one memory-mapped .npy file per column.
+
+    Column files are allocated with spare capacity, so appends that fit are
+    written in place and only cost the new rows. When the capacity or a
+    column's dtype has to grow, a new generation directory is written and
+    meta.json is switched to it atomically; frames already handed out keep
+    reading the old mapping. Updates to existing rows always go to a new
+    generation: changed columns are copied and patched, the rest are hard
+    links, so no frame ever sees a row change underneath it. Writers take a
+    lock file, so processes sharing a store never interleave writes.
+
+    frame() returns a DataFrame whose numeric columns are read-only views of
+    the mappings (no copy) and is built once per data version, so every
+    session shares the same object. The name and address indexes, row
+    hashes, portfolio aggregates and peer benchmarks are built on first use
+    and then extended by each append; the spatial index is rebuilt lazily
+    when the version changes. A write by another process drops them all, to
+    be rebuilt on next use.
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self._lock = threading.RLock()
+        self._meta_mtime = None
+        self._meta = self._read_meta()
+        self._columns = None
+        self._frame = None
+        self._frame_version = None
+        self._index = None
+        self._spatial_index = None
+        self._spatial_version = None
+        self._aggregates = None
+        self._benchmarks = None
+        self._address_index = None
+        self._row_hashes = None
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.root, 'meta.json')
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            self._meta_mtime = os.stat(self._meta_path).st_mtime_ns
+            return meta
+        except FileNotFoundError:
+            return {'version': 0, 'generation': 0, 'rows': 0, 'capacity': 0, 'dtypes': {}}
+
+    def _write_meta(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self._meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._meta, f)
+        os.replace(tmp_path, self._meta_path)
+        self._meta_mtime = os.stat(self._meta_path).st_mtime_ns
+
+    def _generation_dir(self, generation):
+        return os.path.join(self.root, f'gen-{generation}')
+
+    def refresh(self):
+        """Pick up writes made by another process since the metadata was last read."""
+        with self._lock:
+            try:
+                mtime = os.stat(self._meta_path).st_mtime_ns
+            except FileNotFoundError:
+                return
+            if mtime != self._meta_mtime:
+                generation, version = self._meta['generation'], self._meta['version']
+                self._meta = self._read_meta()
+                if self._meta['generation'] != generation:
+                    self._columns = None
+                if self._meta['version'] != version:
+                    # Another process wrote; it may have rewritten rows these were built from
+                    self._reset_derived()
+
+    def _reset_derived(self):
+        self._index = None
+        self._address_index = None
+        self._row_hashes = None
+        self._aggregates = None
+        self._benchmarks = None
+
+    @contextlib.contextmanager
+    def _writing(self):
+        """Hold the thread lock and the store's lock file, with the metadata up to date."""
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, 'write.lock'), 'a') as lock_file:
+                if fcntl is not None:
+                    # Released when the file is closed
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self.refresh()
+                yield
+
+    @property
+    def version(self):
+        return self._meta['version']
+
+    def __len__(self):
+        return self._meta['rows']
+
+    def _open_columns(self):
+        if self._columns is None and self._meta['dtypes']:
+            gen_dir = self._generation_dir(self._meta['generation'])
+            self._columns = {
+                col: np.load(os.path.join(gen_dir, f'{col}.npy'), mmap_mode='r+')
+                for col in BUILDING_COLUMNS
+            }
+        return self._columns
+
+    @property
+    def index(self):
+        """Name index covering every row in the store."""
+        with self._lock:
+            self.refresh()
+            rows = self._meta['rows']
+            if self._index is None:
+                self._index = BuildingIndex()
+            if self._index.size < rows:
+                # First use, or rows appended by another process
+                start = self._index.size
+                self._index.extend(self._open_columns()['name'][start:rows].tolist(), start)
+            return self._index
+
+    @property
+    def address_index(self):
+        """Address index covering every row in the store, for upserts keyed on address."""
+        with self._lock:
+            self.refresh()
+            rows = self._meta['rows']
+            if self._address_index is None:
+                self._address_index = BuildingIndex()
+            if self._address_index.size < rows:
+                start = self._address_index.size
+                self._address_index.extend(self._open_columns()['address'][start:rows].tolist(), start)
+            return self._address_index
+
+    @property
+    def row_hashes(self):
+        """Fingerprint of every row (see upsert.row_hashes), hashed once and extended on append."""
+        with self._lock:
+            frame = self.frame()
+            if self._row_hashes is None:
+                self._row_hashes = np.zeros(0, dtype=np.uint64)
+            if len(self._row_hashes) < len(frame):
+                start = len(self._row_hashes)
+                self._row_hashes = np.concatenate([self._row_hashes, row_hashes(frame.iloc[start:])])
+            return self._row_hashes
+
+    @property
+    def aggregates(self):
+        """Portfolio totals covering every row, folded forward on each append."""
+        with self._lock:
+            frame = self.frame()
+            if self._aggregates is None:
+                self._aggregates = PortfolioAggregates()
+            if self._aggregates.count < len(frame):
+                start = self._aggregates.count
+                self._aggregates.update(frame.iloc[start:], start)
+            return self._aggregates
+
+    @property
+    def benchmarks(self):
+        """Peer-group intensity rankings covering every row, merged forward on each append."""
+        with self._lock:
+            frame = self.frame()
+            if self._benchmarks is None:
+                self._benchmarks = PeerBenchmarks()
+            if self._benchmarks.count < len(frame):
+                start = self._benchmarks.count
+                self._benchmarks.update(frame.iloc[start:], start)
+            return self._benchmarks
+
+    @property
+    def spatial_index(self):
+        """Lat/lon grid index over the current rows, rebuilt once per data version."""
+        with self._lock:
+            frame = self.frame()
+            if self._spatial_index is None or self._spatial_version != self.version:
+                self._spatial_index = SpatialIndex(frame['latitude'].to_numpy(dtype=float),
+                                                   frame['longitude'].to_numpy(dtype=float))
+                self._spatial_version = self.version
+            return self._spatial_index
+
+    def frame(self):
+        """Return the shared, read-only DataFrame for the current data version."""
+        with self._lock:
+            self.refresh()
+            if self._frame is not None and self._frame_version == self.version:
+                return self._frame
+
+            columns = self._open_columns()
+            if columns is None:
+                frame = pd.DataFrame({col: [] for col in BUILDING_COLUMNS})
+            else:
+                rows = self._meta['rows']
+                data = {}
+                for col in BUILDING_COLUMNS:
+                    values = columns[col][:rows]
+                    if col in TEXT_COLUMNS:
+                        data[col] = values.astype(object)
+                    else:
+                        view = values.view(np.ndarray)
+                        view.flags.writeable = False
+                        data[col] = view
+                frame = pd.DataFrame(data, columns=BUILDING_COLUMNS, copy=False)
+
+            self._frame = frame
+            self._frame_version = self.version
+            return frame
+
+    @staticmethod
+    def _column_values(data, col):
+        if col in TEXT_COLUMNS:
+            return np.asarray(data[col].fillna('').astype(str), dtype=np.str_)
+        return data[col].to_numpy()
+
+    def _write_generation(self, dtypes, capacity, new_values=None):
+        """Copy existing rows plus any new ones into a fresh generation directory."""
+        new_values = new_values or {}
+        rows = self._meta['rows']
+        old_columns = self._open_columns()
+        generation = self._meta['generation'] + 1
+        gen_dir = self._generation_dir(generation)
+        os.makedirs(gen_dir, exist_ok=True)
+
+        columns = {}
+        for col in BUILDING_COLUMNS:
+            column = np.lib.format.open_memmap(
+                os.path.join(gen_dir, f'{col}.npy'), mode='w+',
+                dtype=np.dtype(dtypes[col]), shape=(capacity,)
+            )
+            if old_columns is not None and rows:
+                column[:rows] = old_columns[col][:rows]
+            if col in new_values:
+                column[rows:rows + len(new_values[col])] = new_values[col]
+            column.flush()
+            columns[col] = column
+
+        old_dir = self._generation_dir(self._meta['generation'])
+        self._meta.update(generation=generation, capacity=capacity, dtypes=dtypes)
+        self._columns = columns
+        return old_dir
+
+    def append(self, data):
+        """
+        Append building rows and bump the data version.
+
+        Args:
+            data (pd.DataFrame): Rows with the ingest.BUILDING_COLUMNS schema
+
+        Returns:
+            int: Number of rows in the store after the append
+        """
+        with self._writing():
+            rows = self._meta['rows']
+            new_values = {col: self._column_values(data, col) for col in BUILDING_COLUMNS}
+
+            dtypes = {}
+            for col, values in new_values.items():
+                current = self._meta['dtypes'].get(col)
+                dtypes[col] = np.result_type(np.dtype(current), values.dtype).str if current else values.dtype.str
+
+            old_dir = None
+            end = rows + len(data)
+            if self._open_columns() is None or end > self._meta['capacity'] or dtypes != self._meta['dtypes']:
+                capacity = max(end, 2 * self._meta['capacity'], MIN_CAPACITY)
+                old_dir = self._write_generation(dtypes, capacity, new_values)
+            else:
+                for col, values in new_values.items():
+                    column = self._columns[col]
+                    column[rows:end] = values
+                    column.flush()
+
+            if self._index is not None and self._index.size == rows:
+                self._index.extend(new_values['name'].tolist(), rows)
+            if self._address_index is not None and self._address_index.size == rows:
+                self._address_index.extend(new_values['address'].tolist(), rows)
+            if self._row_hashes is not None and len(self._row_hashes) == rows:
+                self._row_hashes = np.concatenate([self._row_hashes, row_hashes(data)])
+            if self._aggregates is not None and self._aggregates.count == rows:
+                self._aggregates.update(data, rows)
+            if self._benchmarks is not None and self._benchmarks.count == rows:
+                self._benchmarks.update(data, rows)
+
+            self._meta['rows'] = end
+            self._meta['version'] += 1
+            self._write_meta()
+            if old_dir is not None:
+                # Mappings held by older frames stay valid after the unlink
+                shutil.rmtree(old_dir, ignore_errors=True)
+            return end
+
+    def _write_patched_generation(self, dtypes, positions, new_values):
+        """
+        Next generation with new_values written at positions. Only the
+        columns being changed are copied; the others are hard links to the
+        current files.
+        """
+        rows, capacity = self._meta['rows'], self._meta['capacity']
+        old_columns = self._open_columns()
+        old_dir = self._generation_dir(self._meta['generation'])
+        generation = self._meta['generation'] + 1
+        gen_dir = self._generation_dir(generation)
+        os.makedirs(gen_dir, exist_ok=True)
+
+        for col in BUILDING_COLUMNS:
+            path = os.path.join(gen_dir, f'{col}.npy')
+            if col not in new_values:
+                try:
+                    os.link(os.path.join(old_dir, f'{col}.npy'), path)
+                except OSError:
+                    # No hard links here, or a file left by an interrupted write
+                    shutil.copyfile(os.path.join(old_dir, f'{col}.npy'), path)
+                continue
+            column = np.lib.format.open_memmap(path, mode='w+', dtype=np.dtype(dtypes[col]), shape=(capacity,))
+            column[:rows] = old_columns[col][:rows]
+            column[positions] = new_values[col]
+            column.flush()
+
+        self._meta.update(generation=generation, dtypes=dtypes)
+        self._columns = None
+        return old_dir
+
+    def update_rows(self, positions, data):
+        """
+        Overwrite existing rows and bump the data version.
+
+        The changed columns are written to a new generation rather than in
+        place, since frames already handed out read the current files.
+        Columns not in data are linked, not copied.
+
+        Args:
+            positions (array-like): Row positions to overwrite
+            data (pd.DataFrame): Replacement values, aligned with positions; any subset of columns
+        """
+        with self._writing():
+            positions = np.asarray(positions, dtype=np.int64)
+            if len(positions) == 0:
+                return
+            if positions.min() < 0 or positions.max() >= self._meta['rows']:
+                raise IndexError("Row position out of range")
+
+            new_values = {col: self._column_values(data, col) for col in BUILDING_COLUMNS if col in data.columns}
+            dtypes = dict(self._meta['dtypes'])
+            for col, values in new_values.items():
+                dtypes[col] = np.result_type(np.dtype(dtypes[col]), values.dtype).str
+
+            columns = self._open_columns()
+            before = pd.DataFrame({col: columns[col][positions] for col in BUILDING_COLUMNS})
+            old_dir = self._write_patched_generation(dtypes, positions, new_values)
+            columns = self._open_columns()
+            rewritten = pd.DataFrame({col: columns[col][positions] for col in BUILDING_COLUMNS})
+
+            if 'name' in new_values:
+                self._index = None
+            if 'address' in new_values:
+                self._address_index = None
+            if self._row_hashes is not None and len(self._row_hashes) == self._meta['rows']:
+                # Only the rewritten rows get a new fingerprint, in a copy since a plan may hold the old array
+                self._row_hashes = self._row_hashes.copy()
+                self._row_hashes[positions] = row_hashes(rewritten)
+            else:
+                self._row_hashes = None
+            if self._aggregates is not None and not (self._aggregates.count == self._meta['rows']
+                                                     and self._aggregates.replace(positions, before, rewritten)):
+                self._aggregates = None
+            # Rankings cannot be patched in place; rebuild on next use
+            self._benchmarks = None
+
+            self._meta['version'] += 1
+            self._write_meta()
+            # Mappings held by older frames stay valid after the unlink
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+
+@st.cache_resource(show_spinner=False)
+def get_building_store():
+    """Return the process-wide building store shared by every session."""
+    return BuildingStore()
+
+
+def sync_buildings_data():
+    """Point this session at the shared frame, refreshing it if the data has changed."""
+    store = get_building_store()
+    frame = store.frame()
+    if st.session_state.get('buildings_version') != store.version or 'buildings_data' not in st.session_state:
+        st.session_state.buildings_data = frame
+        st.session_state.buildings_version = store.version
+    return frame
@@ -0,0 +1,91 @@
+import time
+
+# Rough characters-per-token ratio for English text; good enough for budgeting
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_BUDGET = 3000
+# Share of the budget the digest of dropped turns may use
+SUMMARY_SHARE = 0.15
+SUMMARY_SNIPPET_CHARS = 120
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def summarize_turns(turns, token_budget):
+    """
+    Extractive digest of dropped turns: the opening of each earlier user
+    question, newest first, until the budget is used.
+    """
+    lines = []
+    used = 0
+    for message in reversed(turns):
+        if message['role'] != 'user':
+            continue
+        snippet = message['content'].strip().replace('\n', ' ')
+        if len(snippet) > SUMMARY_SNIPPET_CHARS:
+            snippet = snippet[:SUMMARY_SNIPPET_CHARS].rstrip() + '...'
+        cost = estimate_tokens(snippet)
+        if used + cost > token_budget:
+            break
+        lines.append(f"- {snippet}")
+        used += cost
+    if not lines:
+        return None
+    return {
+        'role': 'system',
+        'content': "Earlier in this consultation the user asked about:\n" + "\n".join(reversed(lines)),
+    }
+
+
+def build_context(system_message, messages, token_budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Assemble the prompt messages for one turn within a token budget.
+
+    The building context is always sent first. The newest turns are kept
+    whole for as long as they fit; anything older is replaced by a short
+    digest, so per-turn prompt size stays bounded however long the chat runs.
+
+    Args:
+        system_message (dict): Pinned building context
+        messages (list): Chat history, oldest first, ending with the new user turn
+        token_budget (int): Approximate token limit for the whole prompt
+
+    Returns:
+        list: Messages to send
+    """
+    remaining = token_budget - estimate_tokens(system_message['content'])
+    summary_budget = int(token_budget * SUMMARY_SHARE)
+
+    kept = []
+    for position in range(len(messages) - 1, -1, -1):
+        cost = estimate_tokens(messages[position]['content'])
+        # The latest user turn is always sent, even if it alone exceeds the budget
+        if kept and cost > remaining - summary_budget:
+            break
+        kept.append(messages[position])
+        remaining -= cost
+    kept.reverse()
+
+    dropped = messages[:len(messages) - len(kept)]
+    summary = summarize_turns(dropped, summary_budget) if dropped else None
+    return [system_message] + ([summary] if summary else []) + kept
+
+
+class TurnTimer:
+    """Records time to first token and total latency of one streamed reply."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.total = None
+
+    def token(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter() - self.start
+
+    def done(self):
+        self.total = time.perf_counter() - self.start
+
+    def as_dict(self):
+        return {'first_token_ms': (self.first_token or 0) * 1000, 'total_ms': (self.total or 0) * 1000}
@@ -1,19 +1,19 @@
 import streamlit as st
 import pandas as pd
-import google.generativeai as genai
+from building_store import sync_buildings_data
 # config.py
 EI_API_KEY = "your_api_key_here"
 
-# Configure Gemini API
-genai.configure(api_key=st.secrets["GOOGLE_API_KEY"])
+def configure_gemini():
+    """Import and configure the Gemini SDK on first use rather than at startup."""
+    import google.generativeai as genai
+    genai.configure(api_key=st.secrets["GOOGLE_API_KEY"])
+    return genai
 
 # Initialize session state variables
 def init_config():
-    if 'buildings_data' not in st.session_state:
-        # Mock data for buildings
-        st.session_state.buildings_data = pd.DataFrame({
-            
-        })
+    # Buildings live in the shared on-disk store; the session only holds a reference
+    sync_buildings_data()
 
     if 'offset_projects' not in st.session_state:
         # Mock data for offset projects
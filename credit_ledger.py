@@ -0,0 +1,337 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+LEDGER_PATH = os.environ.get(
+    'CREDIT_LEDGER_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ledger.sqlite3')
+)
+# How long the writer waits for more purchases to share a commit, and the
+# most it puts in one transaction
+BATCH_WINDOW_SECONDS = 0.002
+MAX_BATCH = 512
+
+
+class LedgerError(ValueError):
+    """Raised when a purchase is rejected (unknown building, bad quantity, self-trade)."""
+
+
+class InsufficientCredits(LedgerError):
+    """Raised when the seller does not hold enough credits."""
+
+
+class CreditLedger:
+    """
+    Append-only log of credit transfers between buildings, and of
+    purchases from offset projects.
+
+    Balances are the uploaded credits_available plus the net of every
+    transfer. An offset project's remaining credits are its listed
+    credits_available less everything sold from it, so every session and
+    process draws on one inventory. The net is kept in memory as one array indexed by building
+    store position, so reading the balances of a whole table is a vectorized
+    add with no query and no reload.
+
+    Purchases are queued to a single writer thread. It validates them
+    against the in-memory balances and commits whatever arrived within
+    BATCH_WINDOW_SECONDS as one SQLite transaction. With WAL and
+    synchronous=FULL each purchase is durable once transfer() returns, and
+    a busy market pays for one fsync per batch rather than one per trade.
+    Before each batch the writer folds in transfers committed by other
+    processes, inside the same write lock, so two workers can never both
+    sell the last credits.
+    """
+
+    def __init__(self, building_store, path=LEDGER_PATH, batch_window=BATCH_WINDOW_SECONDS,
+                 max_batch=MAX_BATCH):
+        self.store = building_store
+        self.path = path
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.stats = {'transfers': 0, 'rejected': 0, 'commits': 0}
+        self._delta = np.zeros(0, dtype=np.int64)
+        # Credits sold by each offset project
+        self._offsets_sold = {}
+        self._last_id = 0
+        # Guards the net array, the last seen id and the reader connection; held
+        # across a whole batch so a concurrent catch-up cannot apply it twice
+        self._lock = threading.RLock()
+        self._queue = queue.Queue()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._reader = self._connect()
+        self._reader.executescript("""
+            CREATE TABLE IF NOT EXISTS transfers (
+                id INTEGER PRIMARY KEY,
+                time REAL NOT NULL,
+                buyer TEXT NOT NULL,
+                seller TEXT NOT NULL,
+                credits INTEGER NOT NULL,
+                price REAL
+            );
+        """)
+        columns = [row[1] for row in self._reader.execute('PRAGMA table_info(transfers)')]
+        if 'offset' not in columns:
+            # Ledgers from before offset purchases hold only building transfers
+            self._reader.execute('ALTER TABLE transfers ADD COLUMN offset INTEGER NOT NULL DEFAULT 0')
+        self._catch_up(self._reader)
+        self._writer = threading.Thread(target=self._write_loop, name='credit-ledger', daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=FULL')
+        return conn
+
+    def _ensure_size(self, rows):
+        if len(self._delta) < rows:
+            grown = np.zeros(max(rows, 2 * len(self._delta)), dtype=np.int64)
+            grown[:len(self._delta)] = self._delta
+            self._delta = grown
+
+    def _apply(self, buyers, sellers, credits):
+        """Add transfers (given as store positions) to the in-memory net."""
+        if len(credits) == 0:
+            return
+        self._ensure_size(int(max(buyers.max(), sellers.max())) + 1)
+        np.add.at(self._delta, buyers, credits)
+        np.subtract.at(self._delta, sellers, credits)
+
+    def _apply_offsets(self, buyers, credits):
+        """Add offset purchases (buyers as store positions) to the in-memory net."""
+        if len(credits) == 0:
+            return
+        self._ensure_size(int(buyers.max()) + 1)
+        np.add.at(self._delta, buyers, credits)
+
+    def _catch_up(self, conn):
+        """Fold in transfers committed since the last one seen, by this or another process."""
+        with self._lock:
+            rows = conn.execute('SELECT id, buyer, seller, credits, offset FROM transfers WHERE id > ? '
+                                'ORDER BY id', (self._last_id,)).fetchall()
+            if not rows:
+                return
+            index = self.store.index
+            ids, buyers, sellers, credits, offsets = zip(*rows)
+            offsets = np.asarray(offsets, dtype=bool)
+            credits = np.asarray(credits, dtype=np.int64)
+            for project, sold in zip(np.asarray(sellers, dtype=object)[offsets], credits[offsets]):
+                self._offsets_sold[project] = self._offsets_sold.get(project, 0) + int(sold)
+            buyer_positions = np.array([index.position(name) for name in buyers], dtype=float)
+            seller_positions = np.array([np.nan if offset else index.position(name)
+                                         for name, offset in zip(sellers, offsets)], dtype=float)
+            # Transfers for buildings no longer in the store cannot affect any row
+            known = np.isfinite(buyer_positions) & np.isfinite(seller_positions)
+            self._apply(buyer_positions[known].astype(np.int64), seller_positions[known].astype(np.int64),
+                        credits[known])
+            bought = offsets & np.isfinite(buyer_positions)
+            self._apply_offsets(buyer_positions[bought].astype(np.int64), credits[bought])
+            self._last_id = ids[-1]
+
+    def refresh(self):
+        """Pick up transfers committed by other processes."""
+        self._catch_up(self._reader)
+
+    def balances(self, buildings_data):
+        """
+        Current credits for every row of a building table from the store.
+
+        Returns:
+            np.ndarray: credits_available plus the net of all transfers, aligned with the rows
+        """
+        self.refresh()
+        base = buildings_data['credits_available'].to_numpy()
+        with self._lock:
+            delta = self._delta[:len(base)]
+            return base + np.pad(delta, (0, len(base) - len(delta)))
+
+    def balance(self, position):
+        """Current credits of the building at one store position."""
+        self.refresh()
+        with self._lock:
+            delta = int(self._delta[position]) if position < len(self._delta) else 0
+        return self.store.frame()['credits_available'].iat[position] + delta
+
+    def offset_balances(self, offset_projects):
+        """
+        Credits each offset project has left.
+
+        Returns:
+            np.ndarray: Listed credits_available less every purchase from the project
+        """
+        self.refresh()
+        listed = np.nan_to_num(offset_projects['credits_available'].to_numpy(dtype=float), nan=0.0)
+        with self._lock:
+            sold = np.array([self._offsets_sold.get(name, 0) for name in offset_projects['name']], dtype=float)
+        return np.maximum(listed - sold, 0)
+
+    def submit(self, buyer, seller, credits, price=None):
+        """Queue a purchase; the Future resolves to the transfer id once it is durable."""
+        future = Future()
+        self._queue.put((buyer, seller, credits, price, future, None))
+        return future
+
+    def submit_offset(self, buyer, project, credits, price, listed):
+        """
+        Queue a purchase from an offset project with `listed` credits in total;
+        the Future resolves like submit's.
+        """
+        future = Future()
+        self._queue.put((buyer, project, credits, price, future, listed))
+        return future
+
+    def transfer(self, buyer, seller, credits, price=None, timeout=30):
+        """
+        Move credits from seller to buyer and wait until the transfer is committed.
+
+        Raises:
+            InsufficientCredits: If the seller holds fewer than `credits`
+            LedgerError: If a building is unknown, the quantity is invalid or buyer is seller
+        """
+        return self.submit(buyer, seller, credits, price).result(timeout)
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                                 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            requests = [item for item in batch if item is not None]
+            if requests:
+                self._commit_batch(conn, requests)
+            if len(requests) < len(batch):
+                conn.close()
+                return
+
+    def _validate(self, index, frame, pending, buyer, seller, credits, listed=None):
+        if buyer == seller and listed is None:
+            raise LedgerError("A building cannot buy its own credits")
+        try:
+            whole = float(credits).is_integer()
+        except (TypeError, ValueError):
+            whole = False
+        if not whole or credits <= 0:
+            raise LedgerError("Credits must be a positive whole number")
+        buyer_position = index.position(buyer)
+        if buyer_position is None or buyer_position >= len(frame):
+            raise LedgerError(f"Unknown building: {buyer}")
+        if listed is not None:
+            try:
+                listed = float(listed)
+            except (TypeError, ValueError):
+                raise LedgerError(f"Unknown listing for {seller}")
+            available = ((listed if np.isfinite(listed) else 0) - self._offsets_sold.get(seller, 0)
+                         + pending.get(('offset', seller), 0))
+            if credits > available:
+                raise InsufficientCredits(f"{seller} has only {int(max(available, 0)):,} credits available")
+            return buyer_position, None
+        seller_position = index.position(seller)
+        if seller_position is None or seller_position >= len(frame):
+            raise LedgerError(f"Unknown building: {seller}")
+        available = (frame['credits_available'].iat[seller_position]
+                     + (self._delta[seller_position] if seller_position < len(self._delta) else 0)
+                     + pending.get(seller_position, 0))
+        # Ingest allows a missing credits_available, which must not read as unlimited
+        if not np.isfinite(available):
+            available = 0
+        if credits > available:
+            raise InsufficientCredits(f"{seller} has only {int(available):,} credits available")
+        return buyer_position, seller_position
+
+    def _commit_batch(self, conn, batch):
+        with self._lock:
+            self._commit_locked(conn, batch)
+
+    def _commit_locked(self, conn, batch):
+        accepted, rejected = [], []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            self._catch_up(conn)
+            index, frame = self.store.index, self.store.frame()
+            # Net effect of the batch so far, so later purchases see earlier ones
+            pending = {}
+            for buyer, seller, credits, price, future, listed in batch:
+                try:
+                    buyer_position, seller_position = self._validate(index, frame, pending, buyer, seller,
+                                                                     credits, listed)
+                except LedgerError as e:
+                    rejected.append((future, e))
+                    continue
+                seller_key = ('offset', seller) if seller_position is None else seller_position
+                pending[seller_key] = pending.get(seller_key, 0) - int(credits)
+                pending[buyer_position] = pending.get(buyer_position, 0) + int(credits)
+                accepted.append((buyer, seller, int(credits), price, future, buyer_position, seller_position))
+
+            now = time.time()
+            ids = []
+            for buyer, seller, credits, price, _, _, seller_position in accepted:
+                cursor = conn.execute('INSERT INTO transfers (time, buyer, seller, credits, price, offset) '
+                                      'VALUES (?, ?, ?, ?, ?, ?)',
+                                      (now, buyer, seller, credits, price, int(seller_position is None)))
+                ids.append(cursor.lastrowid)
+            conn.execute('COMMIT')
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            for _, _, _, _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        if accepted:
+            transfers = [a for a in accepted if a[6] is not None]
+            purchases = [a for a in accepted if a[6] is None]
+            self._apply(np.array([a[5] for a in transfers], dtype=np.int64),
+                        np.array([a[6] for a in transfers], dtype=np.int64),
+                        np.array([a[2] for a in transfers], dtype=np.int64))
+            self._apply_offsets(np.array([a[5] for a in purchases], dtype=np.int64),
+                                np.array([a[2] for a in purchases], dtype=np.int64))
+            for _, project, credits, *_ in purchases:
+                self._offsets_sold[project] = self._offsets_sold.get(project, 0) + credits
+            # BEGIN IMMEDIATE kept other writers out, so these ids follow the last seen one
+            self._last_id = ids[-1]
+        self.stats['transfers'] += len(accepted)
+        self.stats['rejected'] += len(rejected)
+        self.stats['commits'] += 1
+        for transfer_id, (*_, future, _, _) in zip(ids, accepted):
+            future.set_result(transfer_id)
+        for future, error in rejected:
+            future.set_exception(error)
+
+    def history(self, limit=20, building=None):
+        """Most recent transfers, newest first, optionally for one building."""
+        query = 'SELECT id, time, buyer, seller, credits, price FROM transfers'
+        params = ()
+        if building is not None:
+            query += ' WHERE buyer = ? OR seller = ?'
+            params = (building, building)
+        query += ' ORDER BY id DESC LIMIT ?'
+        with self._lock:
+            history = pd.read_sql_query(query, self._reader, params=params + (limit,))
+        history['time'] = pd.to_datetime(history['time'], unit='s')
+        return history
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+        self._reader.close()
+
+
+@st.cache_resource(show_spinner=False)
+def get_credit_ledger():
+    """Return the process-wide credit ledger over the shared building store."""
+    from building_store import get_building_store
+    return CreditLedger(get_building_store())
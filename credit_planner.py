@@ -0,0 +1,243 @@
+"""
+Least-cost carbon credit purchase plans.
+
+Credits are interchangeable and each seller has a fixed price, so buying
+the cheapest units first is optimal: the LP of minimizing cost under
+per-seller capacities has a greedy solution. Sellers are sorted by price
+once, and a plan is the overlap of two cumulative curves: supply, the
+running total of capacity in price order, and demand, the running total
+of what each buyer needs, in priority order. Each buyer receives the
+units of the supply curve covering their stretch of the demand curve.
+That is the same as serving buyers one at a time from what is left, so
+two buyers never count the same credits. It is also cheapest for the
+batch as a whole, since exactly the cheapest units are bought. Building a
+plan costs O((buyers + sellers) log(buyers + sellers)), and a plan has at
+most buyers + sellers - 1 legs.
+"""
+from concurrent.futures import TimeoutError as FutureTimeout
+import numpy as np
+import pandas as pd
+from credit_ledger import LedgerError
+
+# Source label of building sellers, next to the offset projects' verification standards
+BUILDING_SOURCE = 'Building ledger'
+SUPPLY_COLUMNS = ['name', 'kind', 'source', 'price', 'available', 'position']
+LEG_COLUMNS = ['buyer', 'seller', 'kind', 'source', 'credits', 'price', 'cost', 'position']
+# How long submit_plan waits for each leg before reporting it as pending
+LEG_TIMEOUT_SECONDS = 30
+
+
+def credit_supply(sellers, offset_projects=None, sources=None, exclude=(), seller_limit=None):
+    """
+    Every seller a plan may buy from, cheapest first.
+
+    Args:
+        sellers (pd.DataFrame): Building sellers with name, credits_available (current ledger
+            balances) and price_per_credit, indexed by building store position
+        offset_projects (pd.DataFrame): Offset projects with name, credits_available,
+            price_per_credit and verification
+        sources (iterable): Accepted sources (BUILDING_SOURCE and verification standards);
+            None accepts all
+        exclude (iterable): Names that may not sell, such as the buyers themselves
+        seller_limit (int): Most credits any one seller may sell in the plan
+
+    Returns:
+        pd.DataFrame: SUPPLY_COLUMNS; position is the store position of building sellers and -1
+            for offset projects
+    """
+    frames = [pd.DataFrame({
+        'name': sellers['name'].to_numpy(),
+        'kind': 'building',
+        'source': BUILDING_SOURCE,
+        'price': sellers['price_per_credit'].to_numpy(dtype=float),
+        'available': sellers['credits_available'].to_numpy(dtype=float),
+        'position': sellers.index.to_numpy(dtype=np.int64),
+    })]
+    if offset_projects is not None and not offset_projects.empty:
+        frames.append(pd.DataFrame({
+            'name': offset_projects['name'].to_numpy(),
+            'kind': 'offset',
+            'source': offset_projects['verification'].fillna('Unverified').to_numpy(),
+            'price': offset_projects['price_per_credit'].to_numpy(dtype=float),
+            'available': offset_projects['credits_available'].to_numpy(dtype=float),
+            'position': -1,
+        }))
+    supply = pd.concat(frames, ignore_index=True)
+
+    available = np.floor(np.nan_to_num(supply['available'].to_numpy(), nan=0.0))
+    if seller_limit is not None:
+        available = np.minimum(available, seller_limit)
+    keep = np.isfinite(supply['price'].to_numpy()) & (supply['price'].to_numpy() >= 0) & (available > 0)
+    if sources is not None:
+        keep &= supply['source'].isin(list(sources)).to_numpy()
+    if len(exclude):
+        keep &= ~supply['name'].isin(list(exclude)).to_numpy()
+    supply['available'] = available.astype(np.int64)
+    supply = supply[keep]
+    return supply.iloc[np.argsort(supply['price'].to_numpy(), kind='stable')].reset_index(drop=True)
+
+
+def allocate(capacity, demand):
+    """
+    Split the supply curve among buyers in order.
+
+    Args:
+        capacity (np.ndarray): Credits of each seller, in the order they are used
+        demand (np.ndarray): Credits each buyer needs, in priority order
+
+    Returns:
+        tuple: (seller index, buyer index, credits) of each leg, in supply order
+    """
+    capacity = np.asarray(capacity, dtype=np.int64)
+    demand = np.asarray(demand, dtype=np.int64)
+    supply_ends = np.cumsum(capacity)
+    demand_ends = np.cumsum(demand)
+    served = min(supply_ends[-1] if len(supply_ends) else 0, demand_ends[-1] if len(demand_ends) else 0)
+    # Every point where the seller or the buyer changes, up to the last unit bought
+    cuts = np.union1d(supply_ends[supply_ends < served], demand_ends[demand_ends < served])
+    starts = np.concatenate([[0], cuts]) if served else np.zeros(0, dtype=np.int64)
+    ends = np.append(cuts, served) if served else np.zeros(0, dtype=np.int64)
+    # Buyers needing nothing still add a cut, which would leave an empty leg
+    credits = ends - starts
+    starts = starts[credits > 0]
+    seller = np.searchsorted(supply_ends, starts, side='right')
+    buyer = np.searchsorted(demand_ends, starts, side='right')
+    return seller, buyer, credits[credits > 0]
+
+
+class PurchasePlan:
+    """Legs of a purchase plan and what each buyer could not get."""
+
+    def __init__(self, legs, buyers, required, leg_buyers):
+        self.legs = legs
+        self.buyers = buyers
+        self.required = required
+        # Buyer number of each leg, so repeated names stay separate
+        self._leg_buyers = leg_buyers
+
+    def _per_buyer(self, column):
+        return np.bincount(self._leg_buyers, weights=self.legs[column].to_numpy(dtype=float),
+                           minlength=len(self.buyers))
+
+    @property
+    def filled(self):
+        """Credits planned for each buyer."""
+        return self._per_buyer('credits').astype(np.int64)
+
+    @property
+    def shortfall(self):
+        """Credits each buyer still needs after the plan."""
+        return self.required - self.filled
+
+    @property
+    def total_cost(self):
+        return float(self.legs['cost'].sum())
+
+    @property
+    def average_price(self):
+        credits = self.legs['credits'].sum()
+        return self.total_cost / credits if credits else None
+
+    def summary(self):
+        """Per buyer: required, planned and missing credits, cost and average price."""
+        cost = self._per_buyer('cost')
+        filled = self.filled
+        with np.errstate(invalid='ignore', divide='ignore'):
+            average = np.where(filled > 0, cost / filled, np.nan)
+        return pd.DataFrame({
+            'buyer': self.buyers,
+            'required': self.required,
+            'planned': filled,
+            'shortfall': self.required - filled,
+            'cost': cost,
+            'average_price': average,
+        })
+
+
+def plan_purchases(buyers, required, supply):
+    """
+    Least-cost plan for buyers sharing one supply.
+
+    Buyers are served in the order given, each from the cheapest credits
+    still unclaimed, so earlier buyers get the better prices when supply
+    runs short.
+
+    Args:
+        buyers (array-like): Buyer names, in priority order
+        required (array-like): Credits each buyer needs
+        supply (pd.DataFrame): Sellers from credit_supply, cheapest first
+
+    Returns:
+        PurchasePlan
+    """
+    buyers = np.asarray(buyers, dtype=object)
+    # Uploaded values may be text; anything that is not a number counts as nothing needed
+    required = pd.to_numeric(pd.Series(required), errors='coerce').to_numpy(dtype=float)
+    required = np.maximum(np.nan_to_num(required, posinf=0.0, neginf=0.0), 0).astype(np.int64)
+    seller, buyer, credits = allocate(supply['available'].to_numpy(), required)
+    legs = supply.iloc[seller].reset_index(drop=True)
+    legs = pd.DataFrame({
+        'buyer': buyers[buyer],
+        'seller': legs['name'].to_numpy(),
+        'kind': legs['kind'].to_numpy(),
+        'source': legs['source'].to_numpy(),
+        'credits': credits,
+        'price': legs['price'].to_numpy(),
+        'cost': credits * legs['price'].to_numpy(),
+        'position': legs['position'].to_numpy(),
+    }, columns=LEG_COLUMNS)
+    return PurchasePlan(legs, buyers, required, buyer)
+
+
+def plan_purchase(buyer, required, supply):
+    """Least-cost plan for one buyer; see plan_purchases."""
+    return plan_purchases([buyer], [required], supply[supply['name'] != buyer])
+
+
+def submit_plan(ledger, plan, offset_projects=None):
+    """
+    Queue every leg of a plan on the credit ledger.
+
+    The ledger commits them in batches and validates each against the
+    balances at commit time, and offset legs against what the project has
+    left after every session's purchases, so a leg that lost a race to
+    another purchase is rejected rather than overselling.
+
+    Args:
+        ledger (CreditLedger): The shared ledger
+        plan (PurchasePlan): The plan to execute
+        offset_projects (pd.DataFrame): The listings the plan's offset legs came from
+
+    A leg still queued after LEG_TIMEOUT_SECONDS is reported as pending,
+    not failed: the ledger will still commit or reject it, so buying it
+    again could buy the credits twice.
+
+    Returns:
+        pd.DataFrame: The legs with transfer_id, error and pending; a leg has at most one of them
+    """
+    legs = plan.legs.reset_index(drop=True)
+    listed = {}
+    if offset_projects is not None and not offset_projects.empty:
+        listed = dict(zip(offset_projects['name'], offset_projects['credits_available']))
+    futures = [
+        ledger.submit(buyer, seller, int(credits), float(price)) if kind == 'building'
+        else ledger.submit_offset(buyer, seller, int(credits), float(price), listed.get(seller, 0))
+        for buyer, seller, kind, credits, price in legs[['buyer', 'seller', 'kind', 'credits', 'price']].itertuples(
+            index=False)
+    ]
+    ids, errors, pending = [], [], []
+    for future in futures:
+        transfer_id, error = None, None
+        try:
+            transfer_id = future.result(LEG_TIMEOUT_SECONDS)
+        except FutureTimeout:
+            pass
+        except LedgerError as e:
+            error = str(e)
+        except Exception as e:
+            # The batch's commit failed and was rolled back, so nothing was bought
+            error = f"Ledger unavailable ({type(e).__name__}); try again"
+        ids.append(transfer_id)
+        errors.append(error)
+        pending.append(transfer_id is None and error is None)
+    return legs.assign(transfer_id=ids, error=errors, pending=pending)
@@ -0,0 +1,197 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from ingest import rating_codes
+from map_layer import RATING_COLORS
+from instrumentation import timed
+
+# Up to this many buildings get one bar each; beyond it the chart is
+# aggregated on the server so the figure size no longer grows with the portfolio
+DETAIL_CHART_LIMIT = 500
+TOP_N = 20
+INTENSITY_BINS = 40
+# Points drawn in the WebGL scatter; larger portfolios are sampled down to this
+SCATTER_POINTS = 20_000
+
+MODES = ["Per building", "Top / bottom emitters", "By rating", "By emissions intensity", "Emissions vs. area"]
+RATING_SCALE = ['red', 'orange', 'yellow', 'lightgreen', 'green']
+EMISSIONS_LABEL = 'Annual Emissions (kg CO2e)'
+
+
+def detail_figure(buildings_data):
+    """One bar per building, colored by rating; only for small portfolios."""
+    return px.bar(buildings_data,
+                  x='name', y='annual_emissions',
+                  color='rating',
+                  color_continuous_scale=RATING_SCALE,
+                  labels={'name': 'Building Name',
+                          'annual_emissions': EMISSIONS_LABEL,
+                          'rating': 'Rating (1-5)'},
+                  title='Building Emissions Comparison')
+
+
+def top_bottom(buildings_data, n=TOP_N):
+    """
+    The n highest and n lowest emitters plus one bucket averaging everyone else.
+
+    Selection uses argpartition, so the cost is linear in the number of buildings.
+
+    Returns:
+        pd.DataFrame: Columns label, annual_emissions, rating and group, highest first
+    """
+    emissions = buildings_data['annual_emissions'].to_numpy(dtype=float)
+    finite = np.flatnonzero(np.isfinite(emissions))
+    values = emissions[finite]
+    n = min(n, len(finite) // 2)
+    if n == 0:
+        top, bottom = finite[np.argsort(-values)], finite[:0]
+    else:
+        top = finite[np.argpartition(-values, n - 1)[:n]]
+        bottom = finite[np.argpartition(values, n - 1)[:n]]
+        top = top[np.argsort(-emissions[top])]
+        bottom = bottom[np.argsort(-emissions[bottom])]
+
+    names = buildings_data['name'].to_numpy()
+    ratings = buildings_data['rating'].to_numpy(dtype=float)
+    rows = [pd.DataFrame({'label': names[top], 'annual_emissions': emissions[top],
+                          'rating': ratings[top], 'group': 'Highest'})]
+
+    others = len(finite) - len(top) - len(bottom)
+    if others > 0:
+        others_mean = (values.sum() - emissions[top].sum() - emissions[bottom].sum()) / others
+        rows.append(pd.DataFrame({'label': [f'Others ({others:,} buildings, average)'],
+                                  'annual_emissions': [others_mean], 'rating': [np.nan],
+                                  'group': 'Others'}))
+    rows.append(pd.DataFrame({'label': names[bottom], 'annual_emissions': emissions[bottom],
+                              'rating': ratings[bottom], 'group': 'Lowest'}))
+    return pd.concat(rows, ignore_index=True)
+
+
+def top_bottom_figure(buildings_data, n=TOP_N):
+    data = top_bottom(buildings_data, n)
+    colors = np.where(data['group'] == 'Others', 'lightgray',
+                      np.where(data['group'] == 'Highest', 'indianred', 'seagreen'))
+    fig = go.Figure(go.Bar(x=data['label'].astype(str), y=data['annual_emissions'], marker_color=colors,
+                           customdata=data['rating'],
+                           hovertemplate='%{x}<br>%{y:,.1f} kg CO2e<br>Rating: %{customdata}<extra></extra>'))
+    fig.update_layout(title=f'Highest and Lowest {len(data[data["group"] == "Highest"])} Emitters',
+                      xaxis_title='Building', yaxis_title=EMISSIONS_LABEL)
+    return fig
+
+
+def rating_colorscale():
+    """Stepped colorscale mapping rating codes 0-5 (cmin=0, cmax=5) to RATING_COLORS."""
+    scale = []
+    for code, color in enumerate(RATING_COLORS):
+        scale += [[code / 6, str(color)], [(code + 1) / 6, str(color)]]
+    return scale
+
+
+def rating_summary(buildings_data):
+    """Building count, total and mean emissions per rating 1-5, from one bincount pass."""
+    emissions = buildings_data['annual_emissions'].to_numpy(dtype=float)
+    codes = rating_codes(buildings_data['rating'])
+    finite = np.isfinite(emissions)
+    counts = np.bincount(codes, minlength=6)
+    emitting = np.bincount(codes[finite], minlength=6)
+    totals = np.bincount(codes[finite], weights=emissions[finite], minlength=6)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(emitting > 0, totals / emitting, np.nan)
+    return pd.DataFrame({'rating': np.arange(1, 6), 'buildings': counts[1:],
+                         'total_emissions': totals[1:], 'mean_emissions': means[1:]})
+
+
+def rating_figure(buildings_data):
+    summary = rating_summary(buildings_data)
+    fig = go.Figure(go.Bar(
+        x=summary['rating'], y=summary['total_emissions'], marker_color=list(RATING_COLORS[1:]),
+        customdata=np.column_stack([summary['buildings'], summary['mean_emissions']]),
+        hovertemplate=('Rating %{x}<br>%{y:,.0f} kg CO2e total<br>%{customdata[0]:,} buildings'
+                       '<br>%{customdata[1]:,.1f} kg CO2e average<extra></extra>'),
+    ))
+    fig.update_layout(title='Emissions by Rating', xaxis_title='Rating (1-5)',
+                      yaxis_title='Total ' + EMISSIONS_LABEL, xaxis=dict(dtick=1))
+    return fig
+
+
+def intensity_histogram(buildings_data, bins=INTENSITY_BINS):
+    """
+    Histogram of emissions intensity (kg CO2e per sq ft) on log-spaced bins.
+
+    Returns:
+        tuple: (counts, bin edges)
+    """
+    emissions = buildings_data['annual_emissions'].to_numpy(dtype=float)
+    area = buildings_data['area_sqft'].to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        intensity = emissions / area
+    intensity = intensity[np.isfinite(intensity) & (intensity > 0)]
+    if len(intensity) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(1)
+    low, high = intensity.min(), intensity.max()
+    edges = np.geomspace(low, high if high > low else low * 1.01, bins + 1)
+    counts, edges = np.histogram(intensity, bins=edges)
+    return counts, edges
+
+
+def intensity_figure(buildings_data, bins=INTENSITY_BINS):
+    counts, edges = intensity_histogram(buildings_data, bins)
+    fig = go.Figure(go.Bar(
+        x=np.sqrt(edges[:-1] * edges[1:]), y=counts, width=np.diff(edges),
+        customdata=np.column_stack([edges[:-1], edges[1:]]) if len(counts) else None,
+        hovertemplate='%{customdata[0]:.3g}-%{customdata[1]:.3g} kg CO2e/sq ft<br>%{y:,} buildings<extra></extra>',
+    ))
+    fig.update_layout(title='Distribution of Emissions Intensity', xaxis_title='kg CO2e per sq ft (log scale)',
+                      yaxis_title='Buildings', xaxis_type='log', bargap=0)
+    return fig
+
+
+def scatter_figure(buildings_data, max_points=SCATTER_POINTS, seed=0):
+    """Emissions against floor area as a WebGL scatter, sampled down to max_points."""
+    positions = np.arange(len(buildings_data))
+    if len(positions) > max_points:
+        positions = np.sort(np.random.default_rng(seed).choice(positions, max_points, replace=False))
+    sample = buildings_data.iloc[positions]
+    fig = go.Figure(go.Scattergl(
+        x=sample['area_sqft'].to_numpy(dtype=float), y=sample['annual_emissions'].to_numpy(dtype=float),
+        mode='markers', text=sample['name'].to_numpy(),
+        # Numeric codes on a stepped colorscale validate far faster than one color string per point
+        marker=dict(size=4, opacity=0.6, color=rating_codes(sample['rating']),
+                    colorscale=rating_colorscale(), cmin=-0.5, cmax=5.5),
+        hovertemplate='%{text}<br>%{x:,.0f} sq ft<br>%{y:,.1f} kg CO2e<extra></extra>',
+    ))
+    title = 'Emissions vs. Floor Area'
+    if len(positions) < len(buildings_data):
+        title += f' ({len(positions):,} of {len(buildings_data):,} buildings sampled)'
+    fig.update_layout(title=title, xaxis_title='Area (sq ft)', yaxis_title=EMISSIONS_LABEL,
+                      xaxis_type='log', yaxis_type='log')
+    return fig
+
+
+def chart_modes(num_buildings):
+    """Chart modes offered for a portfolio of this size; the first is the default."""
+    return MODES if num_buildings <= DETAIL_CHART_LIMIT else MODES[1:]
+
+
+@timed()
+def emissions_figure(buildings_data, mode=None):
+    """
+    Emissions chart for the home page.
+
+    Small portfolios default to one bar per building. Above
+    DETAIL_CHART_LIMIT only the aggregated modes are available, so the
+    figure's payload stays bounded however many buildings there are.
+    """
+    modes = chart_modes(len(buildings_data))
+    if mode not in modes:
+        mode = modes[0]
+    if mode == "Per building":
+        return detail_figure(buildings_data)
+    if mode == "Top / bottom emitters":
+        return top_bottom_figure(buildings_data)
+    if mode == "By rating":
+        return rating_figure(buildings_data)
+    if mode == "By emissions intensity":
+        return intensity_figure(buildings_data)
+    return scatter_figure(buildings_data)
@@ -1,25 +1,195 @@
+import numpy as np
+import pandas as pd
 import streamlit as st
+from building_index import building_row
+from building_store import get_building_store
+from credit_ledger import LedgerError, get_credit_ledger
+from credit_planner import BUILDING_SOURCE, credit_supply, plan_purchase, plan_purchases, submit_plan
+
+# Buyers in one batch plan; uploads beyond this are rejected rather than truncated
+MAX_BATCH_BUYERS = 100_000
+
+def nearby_sellers(sellers_df, building, radius_km, spatial_index):
+    """Sellers within radius_km of a building, nearest first, with a distance_km column."""
+    positions, distances = spatial_index.radius(building['latitude'], building['longitude'], radius_km)
+    distance = pd.Series(distances, index=positions, name='distance_km')
+    nearby = sellers_df.join(distance, how='inner')
+    return nearby[nearby['name'] != building['name']].sort_values('distance_km')
+
+def offset_projects():
+    """The session's offset project listings."""
+    return st.session_state.get('offset_projects', pd.DataFrame())
+
+def remaining_offsets(ledger, offsets):
+    """Offset listings with credits_available reduced by every purchase recorded in the ledger."""
+    if offsets.empty:
+        return offsets
+    return offsets.assign(credits_available=ledger.offset_balances(offsets))
+
+def source_options(offsets):
+    """Building ledger plus every verification standard among the offset projects."""
+    standards = offsets['verification'].fillna('Unverified').unique().tolist() if not offsets.empty else []
+    return [BUILDING_SOURCE] + sorted(standards)
+
+def execute_plan(ledger, plan):
+    """Submit every leg of a plan to the ledger; returns a message."""
+    results = submit_plan(ledger, plan, offset_projects())
+    done = results['transfer_id'].notna()
+    failed = results['error'].notna()
+    pending = results['pending']
+    message = f"Purchased {int(results.loc[done, 'credits'].sum()):,} credits in {int(done.sum()):,} trades"
+    if failed.any():
+        reasons = results.loc[failed, 'error'].value_counts()
+        message += f"; {int(failed.sum()):,} trades were rejected: " + "; ".join(
+            f"{reason} ({count:,})" for reason, count in reasons.items())
+    if pending.any():
+        message += (f"; {int(pending.sum()):,} trades for {int(results.loc[pending, 'credits'].sum()):,} credits "
+                    "are still being recorded. Check Recent Purchases before buying those credits again")
+    return message
+
+def supply_filters(offsets, key, columns):
+    """Seller cap and accepted sources, the same for single and batch plans."""
+    seller_limit = columns[0].number_input("Most Credits From One Seller", min_value=0, value=0, step=10,
+                                           key=f"{key}_seller_limit", help="0 means no limit")
+    options = source_options(offsets)
+    sources = columns[1].multiselect("Accepted Sources", options, default=options, key=f"{key}_sources")
+    return sources, seller_limit or None
+
+def display_purchase_planner(buyer, sellers_df, ledger):
+    """Least-cost plan for one buyer across building sellers and offset projects."""
+    st.subheader("Least-Cost Purchase Plan")
+    offsets = remaining_offsets(ledger, offset_projects())
+    col1, col2, col3 = st.columns(3)
+    required = col1.number_input("Credits Needed", min_value=1, value=100, step=10, key="plan_required")
+    sources, seller_limit = supply_filters(offsets, "plan", (col2, col3))
+
+    supply = credit_supply(sellers_df, offsets, sources, exclude=[buyer], seller_limit=seller_limit)
+    plan = plan_purchase(buyer, required, supply)
+    if plan.legs.empty:
+        st.info("No credits match these filters.")
+        return
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total Cost", f"${plan.total_cost:,.2f}")
+    col2.metric("Average Price", f"${plan.average_price:,.2f}")
+    col3.metric("Shortfall", f"{int(plan.shortfall[0]):,} credits")
+    st.dataframe(plan.legs.drop(columns=['buyer', 'position']), hide_index=True, use_container_width=True)
+    if st.button("Execute Plan"):
+        st.session_state.purchase_message = execute_plan(ledger, plan)
+        st.rerun()
+
+def display_batch_planner(buildings_data, balances, ledger, index):
+    """Plans for many buyers at once, from an uploaded CSV of name and credits_required."""
+    with st.expander("Batch Purchase Planning"):
+        st.caption("Buyers are served in file order, each from the cheapest credits no earlier buyer took; "
+                   "buyers in the file do not sell.")
+        uploaded = st.file_uploader("Buyers CSV (name, credits_required)", type='csv', key="batch_buyers")
+        if uploaded is None:
+            return
+        orders = pd.read_csv(uploaded)
+        missing = {'name', 'credits_required'} - set(orders.columns)
+        if missing:
+            st.error(f"Missing columns: {', '.join(sorted(missing))}")
+            return
+        if len(orders) > MAX_BATCH_BUYERS:
+            st.error(f"At most {MAX_BATCH_BUYERS:,} buyers per batch")
+            return
+        # The ledger only credits buildings it knows
+        known = orders['name'].map(lambda name: name in index).to_numpy(dtype=bool)
+        if not known.all():
+            st.warning(f"Skipping {int((~known).sum()):,} buyers not in the portfolio")
+            orders = orders[known]
+        offsets = remaining_offsets(ledger, offset_projects())
+        sources, seller_limit = supply_filters(offsets, "batch", st.columns(2))
+        has_credits = balances > 0
+        sellers = buildings_data.loc[has_credits, ['name', 'price_per_credit']].assign(
+            credits_available=balances[has_credits])
+        supply = credit_supply(sellers, offsets, sources, exclude=orders['name'], seller_limit=seller_limit)
+        plan = plan_purchases(orders['name'], orders['credits_required'], supply)
+
+        summary = plan.summary()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Credits Planned", f"{int(summary['planned'].sum()):,}")
+        col2.metric("Total Cost", f"${plan.total_cost:,.2f}")
+        col3.metric("Buyers Short", f"{int((summary['shortfall'] > 0).sum()):,}")
+        st.dataframe(summary, hide_index=True, use_container_width=True)
+        st.download_button("Download Trades", plan.legs.drop(columns='position').to_csv(index=False),
+                           file_name='purchase_plan.csv', mime='text/csv')
+        if st.button("Execute Batch", disabled=plan.legs.empty):
+            st.session_state.purchase_message = execute_plan(ledger, plan)
+            st.rerun()
 
 def display_emissions_trading():
     st.header("Carbon Credits Trading")
     
-    sellers_df = st.session_state.buildings_data[
-        st.session_state.buildings_data['credits_available'] > 0
-    ][['name', 'credits_available', 'price_per_credit']]
+    store = get_building_store()
+    ledger = get_credit_ledger()
+    buildings_data = st.session_state.buildings_data
+    # Balances come from the ledger's in-memory net, so purchases show up without reloading the data
+    balances = ledger.balances(buildings_data)
+    # Credits trade in whole units, so a balance below one has nothing to sell
+    has_credits = balances >= 1
+    sellers_df = buildings_data.loc[has_credits, ['name', 'price_per_credit']]
+    sellers_df.insert(1, 'credits_available', balances[has_credits])
+
+    if 'purchase_message' in st.session_state:
+        st.success(st.session_state.pop('purchase_message'))
     
     if not sellers_df.empty:
+        buyer = st.selectbox("Select Your Building", options=buildings_data['name'])
+        buyer_row = building_row(buildings_data, buyer, store.index)
+        st.caption(f"{buyer} holds {int(balances[store.index.position(buyer)]):,} credits")
+        sellers_df = sellers_df[sellers_df['name'] != buyer]
+
+        if st.checkbox("Only show sellers near my building"):
+            radius_km = st.slider("Search Radius (km)", min_value=1, max_value=500, value=25)
+            if np.isfinite(buyer_row['latitude']) and np.isfinite(buyer_row['longitude']):
+                sellers_df = nearby_sellers(sellers_df, buyer_row, radius_km, store.spatial_index)
+            else:
+                st.warning(f"{buyer} has no coordinates; showing all sellers.")
+
         st.subheader("Available Credits")
+        if sellers_df.empty:
+            st.info("No sellers found within the search radius.")
+            return
         st.dataframe(sellers_df)
+        offsets = remaining_offsets(ledger, offset_projects())
+        if not offsets.empty:
+            st.dataframe(offsets, hide_index=True)
         
         # Credit purchase form
         st.subheader("Purchase Credits")
-        buyer = st.selectbox("Select Your Building", options=st.session_state.buildings_data['name'])
-        seller = st.selectbox("Select Seller", options=sellers_df['name'])
+        # The ledger finds a seller by name, which resolves to the first row with that name
+        addressable = store.index.positions(sellers_df['name'].to_numpy()) == sellers_df.index.to_numpy()
+        seller_position = st.selectbox("Select Seller", options=sellers_df.index[addressable],
+                                       format_func=lambda position: buildings_data['name'].iat[position])
+        seller = buildings_data['name'].iat[seller_position]
         credits_to_buy = st.number_input(
             "Number of Credits to Purchase",
             min_value=1,
-            max_value=int(sellers_df[sellers_df['name'] == seller]['credits_available'].iloc[0])
+            max_value=int(balances[seller_position])
         )
         
         if st.button("Purchase Credits"):
-            st.success(f"Successfully purchased {credits_to_buy:,} credits from {seller}")
+            price = float(buildings_data['price_per_credit'].iat[seller_position])
+            try:
+                ledger.transfer(buyer, seller, int(credits_to_buy), price)
+            except LedgerError as e:
+                # Another session bought the credits first
+                st.error(str(e))
+            except Exception as e:
+                # Timed out waiting for the writer, or its commit failed. A timed-out purchase may
+                # still commit, so point at the history before a retry
+                st.error(f"The purchase could not be confirmed ({type(e).__name__}). "
+                         "Check Recent Purchases below, then try again.")
+            else:
+                st.session_state.purchase_message = (
+                    f"Successfully purchased {credits_to_buy:,} credits from {seller}"
+                )
+                st.rerun()
+
+        display_purchase_planner(buyer, sellers_df, ledger)
+
+        with st.expander("Recent Purchases"):
+            st.dataframe(ledger.history(10, building=buyer), hide_index=True)
+
+        display_batch_planner(buildings_data, balances, ledger, store.index)
@@ -1,15 +1,71 @@
+import os
 import streamlit as st
-import google.generativeai as genai
+from llm_cache import StubModel, cache_key, get_response_cache
+from chat_context import TurnTimer, build_context
+from instrumentation import timed, timed_iter
+from batch_recommendations import DEFAULT_USAGE, DEFAULT_WORKERS, generate_portfolio_recommendations
+from benchmarking import describe
+from building_index import building_row
+from building_store import get_building_store
+from config import configure_gemini
 
-def get_gemini_response(messages):
-    model = genai.GenerativeModel('gemini-pro')
+REPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+MODEL_NAME = 'gemini-pro'
+
+@st.cache_resource(show_spinner=False)
+def get_model():
+    """Build the model client once per process; GEMINI_STUB=1 swaps in an offline stub."""
+    if os.environ.get('GEMINI_STUB'):
+        return StubModel(MODEL_NAME)
+    return configure_gemini().GenerativeModel(MODEL_NAME)
+
+@timed()
+def get_gemini_response(messages, model=None, cache=None):
+    model = model or get_model()
+    cache = cache or get_response_cache()
+    prompt = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
+    # The prompt embeds the building context, so it keys the cache on both
+    return cache.get_or_generate(cache_key(MODEL_NAME, prompt),
+                                 lambda: model.generate_content(prompt).text)
+
+def stream_gemini_response(messages, timer=None, model=None, cache=None):
+    """
+    Yield the reply in chunks as the model produces them.
+
+    Cached replies are yielded whole; fresh ones are cached once the stream
+    completes, so an interrupted stream is never stored, nor is one that
+    produced no text.
+    """
+    model = model or get_model()
+    cache = cache or get_response_cache()
+    timer = timer or TurnTimer()
     prompt = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
-    response = model.generate_content(prompt)
-    return response.text
+    key = cache_key(MODEL_NAME, prompt)
+
+    cached = cache.get(key)
+    if cached is not None:
+        timer.token()
+        yield cached
+        timer.done()
+        return
+
+    chunks = []
+    for chunk in model.generate_content(prompt, stream=True):
+        text = chunk.text
+        if text:
+            timer.token()
+            chunks.append(text)
+            yield text
+    timer.done()
+    if chunks:
+        cache.set(key, "".join(chunks))
 
-def get_building_context(building_name, buildings_data):
-    building = buildings_data[buildings_data['name'] == building_name].iloc[0]
+def get_building_context(building_name, buildings_data, index=None, benchmarks=None):
+    building = building_row(buildings_data, building_name, index)
     energy_intensity = building['energy_usage'] / building['area_sqft']
+    peers = peer_comparison(building_name, index, benchmarks)
+    peer_section = "\n        Peer Comparison (percentile 100 = lowest intensity among peers):\n" + "".join(
+        f"        - {line}\n" for line in peers) if peers else ""
     
     return {
         'role': 'system',
@@ -21,11 +77,20 @@ def get_building_context(building_name, buildings_data):
         Energy Intensity: {energy_intensity:.2f} kWh/sq ft
         Performance Rating: {building['rating']}/5
         Annual CO2 Emissions: {building['annual_emissions']} kg CO2e
-        
+        {peer_section}
         Provide specific, actionable advice based on this data and the user's questions.
         Focus on practical recommendations and clear explanations."""
     }
 
+def peer_comparison(building_name, index, benchmarks):
+    """Peer benchmark lines for one building; empty without benchmarks covering it."""
+    if benchmarks is None or index is None:
+        return []
+    position = index.position(building_name)
+    if position is None or position >= benchmarks.count:
+        return []
+    return describe(benchmarks.building_summary(position))
+
 def display_energy_consultation():
     st.title("🏢 Energy Efficiency Chatbot")
     
@@ -52,9 +117,11 @@ def display_energy_consultation():
         st.session_state.current_building = building_name
 
     # Display Building Metrics
-    building_data = st.session_state.buildings_data[
-        st.session_state.buildings_data['name'] == building_name
-    ].iloc[0]
+    store = get_building_store()
+    building_index = store.index
+    # Store rankings only line up with this session's rows when it is current
+    benchmarks = store.benchmarks if st.session_state.get('buildings_version') == store.version else None
+    building_data = building_row(st.session_state.buildings_data, building_name, building_index)
     energy_intensity = building_data['energy_usage'] / building_data['area_sqft']
 
     st.subheader("📊 Building Metrics")
@@ -63,6 +130,10 @@ def display_energy_consultation():
     col2.metric("Energy Usage", f"{building_data['energy_usage']} kWh")
     col3.metric("Annual Emissions", f"{building_data['annual_emissions']} kg CO2e")
     col4.metric("Energy Intensity", f"{energy_intensity:.2f} kWh/sq ft")
+    peers = peer_comparison(building_name, building_index, benchmarks)
+    if peers:
+        with st.expander("🏅 Peer Comparison"):
+            st.markdown("\n".join(f"- {line}" for line in peers))
 
     # Chat Interface
     st.subheader("💬 Chat with the Energy Consultant")
@@ -78,12 +149,9 @@ def display_energy_consultation():
         # Add user message to chat
         st.session_state.messages.append({"role": "user", "content": prompt})
         
-        # Get building context if this is the first message
-        if len(st.session_state.messages) == 1:
-            context = get_building_context(building_name, st.session_state.buildings_data)
-            messages_with_context = [context] + st.session_state.messages
-        else:
-            messages_with_context = st.session_state.messages
+        # Pin the building context and fit the history into the token budget
+        context = get_building_context(building_name, st.session_state.buildings_data, building_index, benchmarks)
+        messages_with_context = build_context(context, st.session_state.messages)
 
         # Display user message
         with st.chat_message("user"):
@@ -91,10 +159,19 @@ def display_energy_consultation():
 
         # Get and display assistant response
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = get_gemini_response(messages_with_context)
-                st.write(response)
-                st.session_state.messages.append({"role": "assistant", "content": response})
+            timer = TurnTimer()
+            response = st.write_stream(timed_iter('energy_consultation.stream_gemini_response',
+                                                  stream_gemini_response(messages_with_context, timer)))
+            st.session_state.messages.append({"role": "assistant", "content": response})
+            st.session_state.setdefault('chat_latency', []).append(timer.as_dict())
+            # An empty stream never records a first token
+            if timer.first_token is not None:
+                st.caption(f"First token in {timer.first_token * 1000:.0f} ms, "
+                           f"complete in {timer.total * 1000:.0f} ms")
+
+    stats = get_response_cache().stats
+    st.caption(f"Response cache: {stats['memory_hits'] + stats['disk_hits']} hits, "
+               f"{stats['misses']} misses ({get_response_cache().hit_rate():.0%} hit rate)")
 
     # Download Chat Log
     if st.session_state.messages:
@@ -113,4 +190,41 @@ def display_energy_consultation():
     # Clear chat button
     if st.button("🗑️ Clear Chat"):
         st.session_state.messages = []
-        st.rerun()
\ No newline at end of file
+        st.rerun()
+
+    display_portfolio_recommendations(building_index)
+
+def display_portfolio_recommendations(building_index):
+    """Batch recommendations for every building, resumable across runs."""
+    with st.expander("📑 Portfolio Recommendations"):
+        usage_description = st.text_input("Usage context applied to every building",
+                                          value=DEFAULT_USAGE)
+        workers = st.slider("Concurrent requests", 1, 32, DEFAULT_WORKERS)
+        if st.button("Generate for All Buildings"):
+            os.makedirs(REPORT_DIR, exist_ok=True)
+            # Resume only runs over the same data and usage context
+            run_id = cache_key(str(st.session_state.buildings_version), usage_description)[:12]
+            checkpoint_path = os.path.join(REPORT_DIR, f'recommendations-{run_id}.jsonl')
+            progress_bar = st.progress(0.0, text="Starting...")
+
+            def report_progress(done, total, failed):
+                progress_bar.progress(done / total, text=f"{done:,}/{total:,} buildings ({failed:,} failed)")
+
+            report = generate_portfolio_recommendations(
+                st.session_state.buildings_data, get_model(), index=building_index,
+                usage_description=usage_description, workers=workers,
+                checkpoint_path=checkpoint_path,
+                cache=get_response_cache(), progress=report_progress,
+            )
+            st.session_state.portfolio_report = report
+
+        report = st.session_state.get('portfolio_report')
+        if report is not None:
+            failed = report['error'].notna().sum()
+            st.write(f"{len(report) - failed:,} recommendations generated, {failed:,} failed.")
+            st.download_button(
+                "📥 Download Portfolio Report",
+                data=report.to_csv(index=False),
+                file_name="portfolio_recommendations.csv",
+                mime="text/csv"
+            )
\ No newline at end of file
@@ -0,0 +1,149 @@
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+
+# Rows fitted per pass; bounds the temporaries to a few hundred MB at 1M buildings
+CHUNK_ROWS = 250_000
+
+
+def t_quantile(p, dof):
+    """
+    Student-t quantile for an array of degrees of freedom, without SciPy.
+
+    Exact for 1 and 2 degrees of freedom, Cornish-Fisher expansion above.
+    """
+    dof = np.asarray(dof, dtype=float)
+    z = NormalDist().inv_cdf(p)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (z
+             + (z**3 + z) / (4 * dof)
+             + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * dof**2)
+             + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * dof**3))
+    t = np.where(dof == 1, np.tan(np.pi * (p - 0.5)), t)
+    t = np.where(dof == 2, (2 * p - 1) / np.sqrt(2 * p * (1 - p)), t)
+    return np.where(dof >= 1, t, np.nan)
+
+
+class TrendFit:
+    """Per-building linear trend parameters from fit_trends."""
+
+    def __init__(self, years, slope, intercept, residual_std, n_obs, x_mean, sxx):
+        self.years = years
+        self.slope = slope
+        self.intercept = intercept
+        self.residual_std = residual_std
+        self.n_obs = n_obs
+        self.x_mean = x_mean
+        self.sxx = sxx
+
+    def __len__(self):
+        return len(self.slope)
+
+
+def _fit_chunk(x, y):
+    mask = np.isfinite(y)
+    w = mask.astype(float)
+    y = np.where(mask, y, 0.0)
+
+    n = w.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = (w * x).sum(axis=1) / n
+        y_mean = y.sum(axis=1) / n
+        dx = (x - x_mean[:, None]) * w
+        sxx = (dx * dx).sum(axis=1)
+        slope = np.where(sxx > 0, (dx * (y - y_mean[:, None])).sum(axis=1) / sxx, 0.0)
+        intercept = y_mean - slope * x_mean
+        residuals = (y - intercept[:, None] - slope[:, None] * x) * w
+        residual_std = np.sqrt((residuals ** 2).sum(axis=1) / (n - 2))
+    residual_std = np.where(n > 2, residual_std, np.nan)
+    return slope, intercept, residual_std, n, x_mean, sxx
+
+
+def fit_trends(history, years=None):
+    """
+    Fit an ordinary least-squares trend to every building at once.
+
+    Args:
+        history (np.ndarray): Emissions of shape (buildings, years); NaN marks missing years
+        years (array-like): Year labels for the columns (default 0..n-1)
+
+    Returns:
+        TrendFit: slope, intercept and residual spread per building
+    """
+    history = np.asarray(history, dtype=float)
+    if history.ndim == 1:
+        history = history[None, :]
+    years = np.arange(history.shape[1]) if years is None else np.asarray(years)
+    x = years.astype(float)[None, :]
+
+    parts = [_fit_chunk(x, history[start:start + CHUNK_ROWS])
+             for start in range(0, len(history), CHUNK_ROWS)]
+    if not parts:
+        parts = [_fit_chunk(x, history)]
+    return TrendFit(years, *(np.concatenate(arrays) for arrays in zip(*parts)))
+
+
+def forecast(fit, future_years, confidence=0.95):
+    """
+    Project fitted trends forward with prediction intervals.
+
+    Buildings with fewer than three observations get a NaN interval, and
+    buildings with a single observation are carried forward flat.
+
+    Args:
+        fit (TrendFit): Result of fit_trends
+        future_years (array-like): Years to predict, on the same scale as fit.years
+        confidence (float): Two-sided prediction interval coverage
+
+    Returns:
+        tuple: (predicted, lower, upper), each of shape (buildings, len(future_years))
+    """
+    x0 = np.asarray(future_years, dtype=float)[None, :]
+    predicted = fit.intercept[:, None] + fit.slope[:, None] * x0
+
+    t = t_quantile(0.5 + confidence / 2, fit.n_obs - 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spread = fit.residual_std[:, None] * np.sqrt(
+            1 + 1 / fit.n_obs[:, None] + (x0 - fit.x_mean[:, None]) ** 2 / fit.sxx[:, None]
+        )
+    half_width = t[:, None] * spread
+    return predicted, predicted - half_width, predicted + half_width
+
+
+def portfolio_forecast(fit, future_years, confidence=0.95):
+    """
+    Sum per-building forecasts into portfolio totals.
+
+    Interval half-widths are combined in quadrature, treating buildings as
+    independent; buildings without an interval contribute only their point
+    forecast.
+
+    Returns:
+        tuple: (predicted, lower, upper), each of shape (len(future_years),)
+    """
+    predicted, lower, _ = forecast(fit, future_years, confidence)
+    total = np.nansum(predicted, axis=0)
+    half_width = np.sqrt(np.nansum((predicted - lower) ** 2, axis=0))
+    return total, total - half_width, total + half_width
+
+
+def history_matrix(history, names, index):
+    """
+    Pivot long-format history into a (buildings, years) matrix aligned to the store.
+
+    Args:
+        history (pd.DataFrame): Columns name, year and annual_emissions
+        names: Building names in row order (e.g. buildings_data['name'])
+        index (BuildingIndex): Name index over the same rows
+
+    Returns:
+        tuple: (matrix with NaN for missing years, sorted year labels)
+    """
+    years = np.sort(history['year'].unique())
+    matrix = np.full((len(names), len(years)), np.nan)
+    positions = history['name'].map(index.position)
+    known = positions.notna() & (positions < len(names))
+    rows = positions[known].astype(np.int64).to_numpy()
+    cols = np.searchsorted(years, history.loc[known, 'year'].to_numpy())
+    matrix[rows, cols] = pd.to_numeric(history.loc[known, 'annual_emissions']).to_numpy(dtype=float)
+    return matrix, years
@@ -1,28 +1,29 @@
+import hashlib
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import folium
 from streamlit_folium import st_folium
-from io import StringIO
 import numpy as np
-from sklearn.linear_model import LinearRegression
 import plotly.graph_objects as go
+from ingest import read_buildings_csv, IngestError
+from building_store import get_building_store, sync_buildings_data
+from map_layer import build_building_map, cell_layer, viewport_bbox
+from emissions_charts import chart_modes, emissions_figure, DETAIL_CHART_LIMIT
+from aggregates import PortfolioAggregates
+from benchmarking import PeerBenchmarks, METRICS, GROUPINGS, TOP_K, group_label
+from upsert import PREVIEW_ROWS, apply_upsert, plan_upsert
+from forecasting import fit_trends, forecast, portfolio_forecast, history_matrix
+from timeseries_store import get_timeseries_store, emissions_history
+from scenarios import ScenarioEngine, DEFAULT_SCENARIOS, retrofit_plan
+from instrumentation import span, timed
+
+PREDICTION_PAGE_SIZES = [25, 50, 100, 250]
+METRIC_LABELS = {'emissions_intensity': 'Emissions intensity', 'energy_intensity': 'Energy intensity'}
+UPLOAD_MODES = {'name': 'Update by name', 'address': 'Update by address', 'append': 'Append all rows'}
+GROUPING_LABELS = {'size_band': 'Floor area band', 'location': 'Location', 'rating': 'Rating'}
 
 def init_config():
     """Ensure session state is initialized."""
-    if 'buildings_data' not in st.session_state:
-        st.session_state.buildings_data = pd.DataFrame({
-            'name': [],
-            'address': [],
-            'area_sqft': [],
-            'annual_emissions': [],
-            'energy_usage': [],
-            'rating': [],
-            'latitude': [],
-            'longitude': [],
-            'credits_available': [],
-            'price_per_credit': []
-        })
+    sync_buildings_data()
     if 'offset_projects' not in st.session_state:
         st.session_state.offset_projects = pd.DataFrame({   
             'name': [],
@@ -67,82 +68,205 @@ def upload_buildings_data():
     uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
     
     if uploaded_file is not None:
-        try:
-            # Read the CSV file
-            string_data = StringIO(uploaded_file.getvalue().decode("utf-8"))
-            new_data = pd.read_csv(string_data)
-            
-            # Validate required columns
-            required_columns = ['name', 'address', 'area_sqft', 'annual_emissions', 
-                              'energy_usage', 'rating', 'latitude', 'longitude', 
-                              'credits_available', 'price_per_credit']
-            
-            missing_columns = [col for col in required_columns if col not in new_data.columns]
-            
-            if missing_columns:
-                st.error(f"Missing required columns: {', '.join(missing_columns)}")
-                return
-            
-            # Validate data types
+        # Parse each upload once; the confirm click reruns the script
+        upload_key = (uploaded_file.name, uploaded_file.size)
+        pending = st.session_state.get('pending_upload')
+        if pending is None or pending[0] != upload_key:
+            progress_bar = st.progress(0.0, text="Reading CSV...")
+
+            def report_progress(fraction, rows, rows_per_sec):
+                progress_bar.progress(fraction, text=f"Read {rows:,} rows ({rows_per_sec:,.0f} rows/s)")
+
             try:
-                new_data['area_sqft'] = pd.to_numeric(new_data['area_sqft'])
-                new_data['annual_emissions'] = pd.to_numeric(new_data['annual_emissions'])
-                new_data['energy_usage'] = pd.to_numeric(new_data['energy_usage'])
-                new_data['latitude'] = pd.to_numeric(new_data['latitude'])
-                new_data['longitude'] = pd.to_numeric(new_data['longitude'])
-                new_data['credits_available'] = pd.to_numeric(new_data['credits_available'])
-                new_data['price_per_credit'] = pd.to_numeric(new_data['price_per_credit'])
-                new_data['rating'] = pd.to_numeric(new_data['rating'])
-            except ValueError as e:
-                st.error(f"Error converting numeric columns: {str(e)}")
+                new_data, stats = read_buildings_csv(uploaded_file, total_bytes=uploaded_file.size,
+                                                     progress=report_progress)
+            except IngestError as e:
+                progress_bar.empty()
+                st.error(str(e))
                 return
-            
-            # Validate ratings (1-5)
-            if not new_data['rating'].between(1, 5).all():
-                st.error("Rating must be between 1 and 5")
+            except Exception as e:
+                progress_bar.empty()
+                st.error(f"Error processing file: {str(e)}")
                 return
+            progress_bar.empty()
+            pending = (upload_key, new_data, stats)
+            st.session_state.pending_upload = pending
+
+        _, new_data, stats = pending
+        st.caption(f"Parsed {stats['rows']:,} rows in {stats['seconds']:.2f}s "
+                   f"({stats['rows_per_sec']:,.0f} rows/s)")
             
-            # Preview the data
-            st.subheader("Data Preview")
-            st.dataframe(new_data.head())
-            
-            # Add confirmation button
+        # Preview the data
+        st.subheader("Data Preview")
+        st.dataframe(new_data.head())
+
+        mode = st.radio("Upload Mode", list(UPLOAD_MODES), format_func=UPLOAD_MODES.get, horizontal=True,
+                        key="upload_mode")
+        if mode == 'append':
             if st.button("Confirm Upload"):
-                # Append new data to existing data
-                st.session_state.buildings_data = pd.concat([st.session_state.buildings_data, new_data], 
-                                                          ignore_index=True)
-                st.success(f"Successfully added {len(new_data)} buildings to the database!")
-                
-                # Show updated total
-                st.info(f"Total buildings in database: {len(st.session_state.buildings_data)}")
-                
-        except Exception as e:
-            st.error(f"Error processing file: {str(e)}")
-def predict_emissions(historical_data, forecast_years=5):
+                # Append new data to the shared store
+                get_building_store().append(new_data)
+                finish_upload(f"Successfully added {len(new_data)} buildings to the database!")
+            return
+
+        # Diff once per upload, key and data version; the confirm click reruns the script
+        store = get_building_store()
+        plan_key = (upload_key, mode, store.version)
+        if st.session_state.get('upsert_plan', (None,))[0] != plan_key:
+            st.session_state.upsert_plan = (plan_key, plan_upsert(store, new_data, mode))
+        plan = st.session_state.upsert_plan[1]
+        st.subheader("Changes")
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("New Buildings", f"{len(plan.new_rows):,}")
+        col2.metric("Updated Buildings", f"{len(plan.positions):,}")
+        col3.metric("Unchanged", f"{plan.unchanged:,}")
+        col4.metric("Repeated in File", f"{plan.duplicates:,}",
+                    help="Earlier rows for a key that appears again; the last one is used")
+        if len(plan.positions):
+            with st.expander(f"Updated fields ({', '.join(plan.columns)})"):
+                st.dataframe(plan.preview, hide_index=True, use_container_width=True)
+                if len(plan.positions) > PREVIEW_ROWS:
+                    st.caption(f"First {PREVIEW_ROWS:,} of {len(plan.positions):,} updated buildings")
+        if len(plan.new_rows):
+            with st.expander("New buildings"):
+                st.dataframe(plan.new_rows.head(PREVIEW_ROWS), hide_index=True, use_container_width=True)
+
+        if st.button("Confirm Upload", disabled=plan.empty):
+            try:
+                apply_upsert(store, plan)
+            except ValueError as e:
+                st.error(str(e))
+                return
+            finish_upload(f"Added {len(plan.new_rows):,} and updated {len(plan.positions):,} buildings; "
+                          f"{plan.unchanged:,} were unchanged")
+
+def finish_upload(message):
+    sync_buildings_data()
+    del st.session_state.pending_upload
+    st.session_state.pop('upsert_plan', None)
+    st.success(message)
+
+    # Show updated total
+    st.info(f"Total buildings in database: {len(st.session_state.buildings_data)}")
+
+def building_history(buildings_data, data_version, history=None, timeseries=None):
     """
-    Calculate emission predictions based on historical data.
-    
-    Args:
-        historical_data (pd.DataFrame): DataFrame containing historical emissions data
-        forecast_years (int): Number of years to forecast
+    Per-building emissions history as a (buildings, years) matrix.
+
+    Uses the uploaded long-format history when given, else annual totals of
+    the metered hourly consumption if it spans at least two years; buildings
+    without any history fall back to their current emissions as the latest
+    year. Otherwise two prior years are synthesized within ±10% of today's
+    value, seeded on the data version so reruns see the same series.
+    Metered data comes from `timeseries`, by default the app's shared store.
+
+    Returns:
+        tuple: (matrix, x offsets in years from the first column)
     """
-    if len(historical_data) < 2:
-        st.warning("Insufficient historical data for prediction. Need at least 2 data points.")
-        return None
-        
-    # Prepare data for prediction
-    X = np.arange(len(historical_data)).reshape(-1, 1)
-    y = historical_data['annual_emissions'].values
-    
-    # Fit linear regression model
-    model = LinearRegression()
-    model.fit(X, y)
-    
-    # Generate future dates for prediction
-    future_X = np.arange(len(historical_data), len(historical_data) + forecast_years).reshape(-1, 1)
-    predictions = model.predict(future_X)
-    
-    return predictions
+    current = buildings_data['annual_emissions'].to_numpy(dtype=float)
+    if history is not None:
+        matrix, years = history_matrix(history, buildings_data['name'], get_building_store().index)
+    else:
+        timeseries = timeseries if timeseries is not None else get_timeseries_store()
+        matrix, years = emissions_history(timeseries, len(current))
+        metered = ~np.isnan(matrix).all(axis=0)
+        matrix, years = matrix[:, metered], years[metered]
+    if len(years) >= 2:
+        no_history = np.isnan(matrix).all(axis=1)
+        matrix[no_history, -1] = current[no_history]
+        return matrix, (years - years[0]).astype(float)
+
+    # This would ideally be replaced with actual historical data
+    rng = np.random.default_rng(data_version)
+    noise = rng.uniform(-0.1, 0.1, size=(len(current), 2))
+    matrix = np.column_stack([current[:, None] * (1 + noise), current])
+    return matrix, np.arange(3, dtype=float)
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_trend_fit(data_version, history_key, _buildings_data, _history):
+    """Fit every building's trend once per data version and history upload."""
+    with span('home.building_history'):
+        matrix, x = building_history(_buildings_data, data_version, _history)
+    with span('forecasting.fit_trends'):
+        return matrix, x, fit_trends(matrix, x)
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_scenario_engine(data_version, history_key, _fit, _current):
+    """One Monte Carlo engine per fit; it keeps its own cache of simulated blocks."""
+    return ScenarioEngine(_fit, _current)
+
+@timed()
+def forecast_figure(x, historical_totals, future_x, predictions, lower, upper,
+                    target_emissions, reduction_target, scenario_bands=None):
+    """
+    Portfolio forecast chart: history, prediction band, forecast and target
+    pathway, plus the simulated 5th-95th percentile range and median when
+    scenario_bands is given.
+    """
+    fig = go.Figure()
+
+    # Historical data
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=historical_totals,
+        name='Historical',
+        line=dict(color='blue')
+    ))
+
+    # 95% prediction interval
+    if np.isfinite(lower).all() and np.isfinite(upper).all():
+        fig.add_trace(go.Scatter(
+            x=np.concatenate([future_x, future_x[::-1]]),
+            y=np.concatenate([upper, lower[::-1]]),
+            fill='toself',
+            fillcolor='rgba(255, 0, 0, 0.1)',
+            line=dict(width=0),
+            name='95% Prediction Interval',
+            hoverinfo='skip'
+        ))
+
+    # Monte Carlo pathways, including any planned retrofits
+    if scenario_bands is not None:
+        fig.add_trace(go.Scatter(
+            x=np.concatenate([future_x, future_x[::-1]]),
+            y=np.concatenate([scenario_bands[2], scenario_bands[0][::-1]]),
+            fill='toself',
+            fillcolor='rgba(128, 0, 128, 0.1)',
+            line=dict(width=0),
+            name='Simulated 5-95% Range',
+            hoverinfo='skip'
+        ))
+        fig.add_trace(go.Scatter(
+            x=future_x,
+            y=scenario_bands[1],
+            name='Simulated Median',
+            line=dict(color='purple', dash='dot')
+        ))
+
+    # Predictions
+    fig.add_trace(go.Scatter(
+        x=future_x,
+        y=predictions,
+        name='Predicted (Business as Usual)',
+        line=dict(color='red', dash='dash')
+    ))
+
+    # Target pathway
+    fig.add_trace(go.Scatter(
+        x=np.concatenate([[x[-1]], future_x]),
+        y=target_emissions,
+        name=f'Target ({reduction_target}% Annual Reduction)',
+        line=dict(color='green', dash='dash')
+    ))
+
+    fig.update_layout(
+        title='Emissions Forecast vs Reduction Target',
+        xaxis_title='Years from Present',
+        yaxis_title='Total Annual Emissions (kg CO2e)',
+        hovermode='x unified'
+    )
+
+    return fig
 
 def display_predictive_analysis():
     """Display predictive analysis section in the Streamlit app."""
@@ -161,67 +285,56 @@ def display_predictive_analysis():
         max_value=100.0, 
         value=5.0
     )
+    history_file = st.sidebar.file_uploader(
+        "Emissions History (optional CSV: name, year, annual_emissions)", type="csv", key="history_upload"
+    )
+    history, history_key = None, ('timeseries', get_timeseries_store().version)
+    if history_file is not None:
+        try:
+            history = pd.read_csv(history_file, usecols=['name', 'year', 'annual_emissions'])
+            history_key = (history_file.name, history_file.size)
+        except ValueError as e:
+            st.sidebar.error(f"Error reading history: {str(e)}")
+    num_scenarios = st.sidebar.slider("Simulated Scenarios", 100, 5000, DEFAULT_SCENARIOS, step=100)
+    seed = st.sidebar.number_input("Random Seed", min_value=0, value=0, step=1)
     
     # Calculate current total emissions
-    current_total = st.session_state.buildings_data['annual_emissions'].sum()
-    
-    # Generate predictions
-    historical_data = pd.DataFrame({
-        'annual_emissions': [current_total]
-    })
+    current_total = get_portfolio_aggregates().emissions_sum
     
-    # Add some synthetic historical data based on current total
-    # This would ideally be replaced with actual historical data
-    for i in range(2):
-        historical_val = current_total * (1 + np.random.uniform(-0.1, 0.1))
-        historical_data = pd.concat([
-            pd.DataFrame({'annual_emissions': [historical_val]}),
-            historical_data
-        ])
-    
-    predictions = predict_emissions(historical_data, forecast_years)
+    # Fit every building's trend in one batched least-squares pass
+    matrix, x, fit = get_trend_fit(st.session_state.buildings_version, history_key,
+                                   st.session_state.buildings_data, history)
+    predictions = None
+    if len(x) < 2:
+        st.warning("Insufficient historical data for prediction. Need at least 2 data points.")
+    else:
+        historical_totals = np.nansum(matrix, axis=0)
+        future_x = x[-1] + np.arange(1, forecast_years + 1)
+        building_forecast, _, _ = forecast(fit, future_x)
+        predictions, lower, upper = portfolio_forecast(fit, future_x)
     
     if predictions is not None:
         # Calculate target reduction pathway
-        target_emissions = [current_total]
-        for _ in range(forecast_years):
-            target_emissions.append(target_emissions[-1] * (1 - reduction_target/100))
+        target_emissions = current_total * (1 - reduction_target/100) ** np.arange(forecast_years + 1)
+
+        # Simulate pathways; the engine reuses every block whose inputs did not change
+        retrofit_start, retrofit_reduction = plan_retrofits(forecast_years)
+        engine = get_scenario_engine(st.session_state.buildings_version, history_key, fit,
+                                     st.session_state.buildings_data['annual_emissions'].to_numpy(dtype=float))
+        with st.spinner("Simulating scenarios..."), span('scenarios.run'):
+            scenarios = engine.run(forecast_years, num_scenarios, int(seed), retrofit_start, retrofit_reduction)
+        meet_probability = scenarios.probability_of_meeting(target_emissions[1:])
             
         # Create visualization
-        fig = go.Figure()
-        
-        # Historical data
-        fig.add_trace(go.Scatter(
-            x=list(range(len(historical_data))),
-            y=historical_data['annual_emissions'],
-            name='Historical',
-            line=dict(color='blue')
-        ))
-        
-        # Predictions
-        fig.add_trace(go.Scatter(
-            x=list(range(len(historical_data), len(historical_data) + forecast_years)),
-            y=predictions,
-            name='Predicted (Business as Usual)',
-            line=dict(color='red', dash='dash')
-        ))
-        
-        # Target pathway
-        fig.add_trace(go.Scatter(
-            x=list(range(len(historical_data) - 1, len(historical_data) + forecast_years)),
-            y=target_emissions,
-            name=f'Target ({reduction_target}% Annual Reduction)',
-            line=dict(color='green', dash='dash')
-        ))
-        
-        fig.update_layout(
-            title='Emissions Forecast vs Reduction Target',
-            xaxis_title='Years from Present',
-            yaxis_title='Total Annual Emissions (kg CO2e)',
-            hovermode='x unified'
-        )
-        
+        fig = forecast_figure(x, historical_totals, future_x, predictions, lower, upper,
+                              target_emissions, reduction_target, scenarios.bands())
         st.plotly_chart(fig, use_container_width=True)
+        st.metric(
+            f"Probability of Meeting the Year {forecast_years} Target",
+            f"{meet_probability[-1]:.0%}",
+            help=f"Share of {scenarios.scenarios:,} simulated pathways, including planned retrofits, "
+                 "that end at or below the target."
+        )
         
         # Calculate and display key metrics
         final_predicted = predictions[-1]
@@ -272,18 +385,150 @@ def display_predictive_analysis():
             
         # Detailed building-level predictions
         st.subheader("🏢 Building-Level Predictions")
-        building_predictions = pd.DataFrame({
-            'Building': st.session_state.buildings_data['name'],
-            'Current Emissions': st.session_state.buildings_data['annual_emissions'],
-            f'Predicted Emissions (Year {forecast_years})': st.session_state.buildings_data['annual_emissions'] * 
-                (final_predicted / current_total),
-            'Current Rating': st.session_state.buildings_data['rating']
-        }).sort_values('Current Emissions', ascending=False)
-        
-        st.dataframe(building_predictions.style.format({
-            'Current Emissions': '{:.1f}',
-            f'Predicted Emissions (Year {forecast_years})': '{:.1f}'
-        }))
+        building_probability = scenarios.building_probability((1 - reduction_target / 100) ** forecast_years)
+        scenario_key = (reduction_target, num_scenarios, int(seed),
+                        hashlib.blake2b(retrofit_start.tobytes() + retrofit_reduction.tobytes()).hexdigest())
+        display_building_predictions(building_forecast[:, -1], fit.slope, forecast_years, history_key,
+                                     building_probability, scenario_key)
+
+def plan_retrofits(forecast_years):
+    """
+    Sidebar controls for retrofits to include in the simulation.
+
+    Returns:
+        tuple: (retrofit_start, retrofit_reduction) per building, as for ScenarioEngine.run
+    """
+    buildings_data = st.session_state.buildings_data
+    with st.sidebar.expander("Planned Retrofits"):
+        max_rating = st.selectbox("Retrofit buildings rated at or below", [None, 1, 2, 3, 4, 5],
+                                  format_func=lambda rating: "None" if rating is None else str(rating),
+                                  key="retrofit_max_rating")
+        selected = np.zeros(len(buildings_data), dtype=bool)
+        if max_rating is not None:
+            selected |= buildings_data['rating'].to_numpy(dtype=float) <= max_rating
+        # Picking individual buildings is only offered where the list stays usable
+        if len(buildings_data) <= DETAIL_CHART_LIMIT:
+            names = st.multiselect("Also retrofit", buildings_data['name'].tolist(), key="retrofit_buildings")
+            selected |= buildings_data['name'].isin(names).to_numpy()
+        reduction = st.slider("Expected reduction (%)", 0, 90, 30, key="retrofit_reduction")
+        start_year = st.slider("Takes effect in year", 1, forecast_years, 1, key="retrofit_start")
+        st.caption(f"{int(selected.sum()):,} buildings selected")
+    return retrofit_plan(selected, start_year, reduction / 100)
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_prediction_order(data_version, history_key, forecast_years, sort_by, scenario_key, _values):
+    """
+    Row order for one sort column, largest first with missing values last.
+
+    scenario_key identifies the simulation behind simulated columns and is
+    None for the others, so they are not re-sorted when it changes.
+    """
+    values = np.asarray(_values, dtype=float)
+    return np.argsort(np.where(np.isnan(values), np.inf, -values), kind='stable')
+
+def display_building_predictions(predicted, trend, forecast_years, history_key, meet_probability, scenario_key):
+    """
+    Paginated building-level prediction table.
+
+    Only the current page is turned into a DataFrame and sent to the
+    browser, so the payload stays the same size for any portfolio.
+    """
+    buildings_data = st.session_state.buildings_data
+    predicted_label = f'Predicted Emissions (Year {forecast_years})'
+    columns = {
+        'Current Emissions': buildings_data['annual_emissions'].to_numpy(dtype=float),
+        predicted_label: predicted,
+        'Trend (per Year)': trend,
+        'Current Rating': buildings_data['rating'].to_numpy(),
+        'Chance of Meeting Target': meet_probability,
+    }
+
+    col1, col2, col3 = st.columns(3)
+    sort_by = col1.selectbox("Sort by", list(columns), key="predictions_sort")
+    page_size = col2.selectbox("Rows per page", PREDICTION_PAGE_SIZES, index=1, key="predictions_page_size")
+    num_pages = max(1, -(-len(buildings_data) // page_size))
+    page = col3.number_input(f"Page (of {num_pages:,})", min_value=1, max_value=num_pages, value=1,
+                             key="predictions_page")
+
+    order = get_prediction_order(st.session_state.buildings_version, history_key, forecast_years, sort_by,
+                                 scenario_key if sort_by == 'Chance of Meeting Target' else None,
+                                 columns[sort_by])
+    start = (page - 1) * page_size
+    rows = order[start:start + page_size]
+    building_predictions = pd.DataFrame({
+        'Building': buildings_data['name'].to_numpy()[rows],
+        **{label: values[rows] for label, values in columns.items()},
+    })
+    st.dataframe(building_predictions, hide_index=True, use_container_width=True, column_config={
+        'Current Emissions': st.column_config.NumberColumn(format='%.1f'),
+        predicted_label: st.column_config.NumberColumn(format='%.1f'),
+        'Trend (per Year)': st.column_config.NumberColumn(format='%+.1f'),
+        'Chance of Meeting Target': st.column_config.ProgressColumn(min_value=0.0, max_value=1.0, format='%.2f'),
+    })
+    st.caption(f"Buildings {start + 1:,}-{start + len(rows):,} of {len(buildings_data):,}")
+
+def get_portfolio_aggregates():
+    """Aggregates for this session's data; the store's running totals when it is current."""
+    store = get_building_store()
+    if st.session_state.get('buildings_version') == store.version:
+        return store.aggregates
+    return PortfolioAggregates.from_frame(st.session_state.buildings_data)
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_session_benchmarks(data_version, _buildings_data):
+    return PeerBenchmarks.from_frame(_buildings_data)
+
+def get_portfolio_benchmarks():
+    """Peer benchmarks for this session's data; the store's merged rankings when it is current."""
+    store = get_building_store()
+    if st.session_state.get('buildings_version') == store.version:
+        return store.benchmarks
+    return get_session_benchmarks(st.session_state.get('buildings_version'), st.session_state.buildings_data)
+
+def display_peer_benchmarks():
+    """Best and worst buildings by intensity, with their percentile in each peer group."""
+    st.subheader("🏅 Peer Benchmarking")
+    buildings_data = st.session_state.buildings_data
+    benchmarks = get_portfolio_benchmarks()
+    col1, col2 = st.columns(2)
+    metric = col1.selectbox("Metric", list(METRICS), format_func=METRIC_LABELS.get, key="benchmark_metric")
+    best = col2.radio("Show", ["Best", "Worst"], horizontal=True, key="benchmark_direction") == "Best"
+    unit = METRICS[metric][1]
+
+    rows = benchmarks.top_k(metric, TOP_K, best=best)
+    table = pd.DataFrame({
+        'Building': buildings_data['name'].to_numpy()[rows],
+        f'{METRIC_LABELS[metric]} ({unit})': benchmarks.values(metric)[rows],
+    })
+    column_config = {table.columns[1]: st.column_config.NumberColumn(format='%.3f')}
+    for grouping in GROUPINGS:
+        percentiles, _ = benchmarks.percentiles(metric, grouping)
+        codes = benchmarks.codes(grouping)[rows]
+        table[GROUPING_LABELS[grouping]] = [group_label(grouping, code) for code in codes]
+        label = f'Percentile ({GROUPING_LABELS[grouping]})'
+        table[label] = percentiles[rows]
+        column_config[label] = st.column_config.ProgressColumn(min_value=0.0, max_value=100.0, format='%.0f')
+    st.dataframe(table, hide_index=True, use_container_width=True, column_config=column_config)
+    st.caption(f"Percentile = share of peers with a higher {METRIC_LABELS[metric].lower()}; 100 is best in group.")
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_building_map(data_version, _buildings_data):
+    """Build the map once per data version; reruns reuse the cached object."""
+    return build_building_map(_buildings_data)
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def get_cell_layer(data_version, zoom, bbox, _buildings_data):
+    """Grid-aggregated marker layer for one data version, zoom level and viewport."""
+    positions = None
+    if bbox:
+        positions = get_building_store().spatial_index.bbox(*bbox)
+        positions = positions[positions < len(_buildings_data)]
+    return cell_layer(_buildings_data, zoom, positions)
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_emissions_figure(data_version, mode, _buildings_data):
+    """Emissions chart for one data version and chart mode."""
+    return emissions_figure(_buildings_data, mode)
 
 def display_home():
     # Add upload section at the top
@@ -298,23 +543,14 @@ def display_home():
         st.warning("No building data available. Please upload data to get started.")
         return
 
-    # Safely calculate metrics
-    num_buildings = len(st.session_state.buildings_data)
-    avg_emissions = (
-        st.session_state.buildings_data['annual_emissions'].mean()
-        if 'annual_emissions' in st.session_state.buildings_data.columns and not st.session_state.buildings_data['annual_emissions'].isnull().all()
-        else 0
-    )
-    best_building = (
-        st.session_state.buildings_data.loc[st.session_state.buildings_data['annual_emissions'].idxmin()]
-        if 'annual_emissions' in st.session_state.buildings_data.columns and not st.session_state.buildings_data['annual_emissions'].isnull().all()
-        else None
-    )
-    total_credits = (
-        st.session_state.buildings_data['credits_available'].sum()
-        if 'credits_available' in st.session_state.buildings_data.columns
-        else 0
-    )
+    # Metrics come from running aggregates, so reruns do not rescan the table
+    aggregates = get_portfolio_aggregates()
+    num_buildings = aggregates.count
+    avg_emissions = aggregates.mean_emissions
+    # Lowest emissions per sq ft, so size does not decide the winner
+    best = get_portfolio_benchmarks().top_k('emissions_intensity', 1)
+    best_building = st.session_state.buildings_data.iloc[best[0]] if len(best) else None
+    total_credits = aggregates.credits_total
 
     # Display metrics
     col1, col2, col3, col4 = st.columns(4)
@@ -323,7 +559,8 @@ def display_home():
     with col2:
         st.metric("Average Emissions", f"{avg_emissions/1000:.1f} tons CO2e" if avg_emissions > 0 else "N/A")
     with col3:
-        st.metric("Best Performer", best_building['name'] if best_building is not None else "N/A")
+        st.metric("Best Performer", best_building['name'] if best_building is not None else "N/A",
+                  help="Lowest annual emissions per sq ft")
     with col4:
         st.metric("Available Credits", f"{total_credits:,} tons CO2e" if total_credits > 0 else "N/A")
 
@@ -333,36 +570,34 @@ def display_home():
     # Emissions comparison chart
     if 'annual_emissions' in st.session_state.buildings_data.columns and not st.session_state.buildings_data['annual_emissions'].isnull().all():
         st.subheader("Emissions Comparison")
-        fig = px.bar(st.session_state.buildings_data,
-                     x='name', y='annual_emissions',
-                     color='rating',
-                     color_continuous_scale=['red', 'orange', 'yellow', 'lightgreen', 'green'],
-                     labels={'name': 'Building Name', 
-                            'annual_emissions': 'Annual Emissions (kg CO2e)',
-                            'rating': 'Rating (1-5)'},
-                     title='Building Emissions Comparison')
+        # Large portfolios only offer aggregated views, so the chart payload stays bounded
+        mode = st.radio("Chart", chart_modes(len(st.session_state.buildings_data)),
+                        horizontal=True, label_visibility="collapsed", key="emissions_chart_mode")
+        fig = get_emissions_figure(st.session_state.buildings_version, mode, st.session_state.buildings_data)
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.info("No emissions data available for comparison.")
 
+    st.markdown("---")
+    display_peer_benchmarks()
+
     # Map view
     if not st.session_state.buildings_data.empty and 'latitude' in st.session_state.buildings_data.columns and 'longitude' in st.session_state.buildings_data.columns:
         st.subheader("Geographic Distribution")
-        first_building = st.session_state.buildings_data.iloc[0]
-        map_center = [first_building.get('latitude', 0), first_building.get('longitude', 0)]
-        m = folium.Map(location=map_center, zoom_start=13)
-
-        for _, row in st.session_state.buildings_data.iterrows():
-            color = get_rating_color(row.get('rating', 0))
-            folium.CircleMarker(
-                location=[row.get('latitude', 0), row.get('longitude', 0)],
-                radius=10,
-                popup=f"{row.get('name', 'Unknown')}<br>Emissions: {row.get('annual_emissions', 'N/A')} kg CO2e<br>Rating: {row.get('rating', 'N/A')}/5",
-                color=color,
-                fill=True
-            ).add_to(m)
-
-        st_folium(m, width=800, height=400)
+        # The component's last reported view, available before it re-renders
+        view = st.session_state.get('buildings_map') or {}
+        zoom = view.get('zoom') or 13
+        center = view.get('center')
+        m, needs_cells = get_building_map(st.session_state.buildings_version, st.session_state.buildings_data)
+        cells = None
+        if needs_cells:
+            bbox = viewport_bbox(view.get('bounds'), zoom)
+            cells = get_cell_layer(st.session_state.buildings_version, zoom, bbox, st.session_state.buildings_data)
+
+        with span('home.st_folium'):
+            st_folium(m, key='buildings_map', width=800, height=400, zoom=zoom,
+                      center=(center['lat'], center['lng']) if center else None,
+                      feature_group_to_add=cells, returned_objects=['zoom', 'center', 'bounds'])
     else:
         st.info("No geographic data available.")
           
\ No newline at end of file
@@ -0,0 +1,139 @@
+import time
+import numpy as np
+import pandas as pd
+from instrumentation import timed
+
+TEXT_COLUMNS = ['name', 'address']
+NUMERIC_COLUMNS = ['area_sqft', 'annual_emissions', 'energy_usage', 'rating',
+                   'latitude', 'longitude', 'credits_available', 'price_per_credit']
+BUILDING_COLUMNS = ['name', 'address', 'area_sqft', 'annual_emissions',
+                    'energy_usage', 'rating', 'latitude', 'longitude',
+                    'credits_available', 'price_per_credit']
+# Parsed as floats so NaN survives validation, narrowed back when integral
+INTEGER_COLUMNS = ['area_sqft', 'rating', 'credits_available']
+
+# Explicit dtypes let the C parser convert and validate numbers as it reads,
+# instead of building object columns and converting them afterwards
+BUILDING_DTYPES = {**{col: object for col in TEXT_COLUMNS},
+                   **{col: np.float64 for col in NUMERIC_COLUMNS}}
+
+DEFAULT_CHUNKSIZE = 100_000
+
+
+class IngestError(ValueError):
+    """Raised when an uploaded buildings file fails validation."""
+
+
+def rating_codes(ratings):
+    """Integral ratings 1-5 as themselves, anything else (or missing) as 0."""
+    ratings = np.asarray(ratings, dtype=float)
+    valid = np.isfinite(ratings) & (ratings == np.round(ratings)) & (ratings >= 1) & (ratings <= 5)
+    return np.where(valid, np.nan_to_num(ratings), 0).astype(np.int64)
+
+
+class ColumnBuffer:
+    """Growable column-oriented buffer that chunks are appended into."""
+
+    def __init__(self, capacity=0):
+        self.size = 0
+        self.capacity = max(int(capacity), 1)
+        self.columns = {
+            col: np.empty(self.capacity, dtype=BUILDING_DTYPES[col])
+            for col in BUILDING_COLUMNS
+        }
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        for col, values in self.columns.items():
+            grown = np.empty(capacity, dtype=values.dtype)
+            grown[:self.size] = values[:self.size]
+            self.columns[col] = grown
+        self.capacity = capacity
+
+    def append(self, chunk):
+        end = self.size + len(chunk)
+        if end > self.capacity:
+            self._grow(end)
+        for col, values in self.columns.items():
+            values[self.size:end] = chunk[col].to_numpy()
+        self.size = end
+
+    def to_frame(self):
+        data = {col: values[:self.size] for col, values in self.columns.items()}
+        for col in INTEGER_COLUMNS:
+            values = data[col]
+            if np.array_equal(values, np.round(values)):
+                data[col] = values.astype(np.int64)
+        return pd.DataFrame(data, columns=BUILDING_COLUMNS)
+
+
+@timed()
+def validate_chunk(chunk, first_row):
+    """Vectorized checks on one parsed chunk; raises IngestError on the first bad row."""
+    bad_rating = ~chunk['rating'].between(1, 5).to_numpy()
+    if bad_rating.any():
+        row = first_row + int(np.argmax(bad_rating))
+        raise IngestError(f"Rating must be between 1 and 5 (row {row + 1})")
+
+
+@timed()
+def read_buildings_csv(source, chunksize=DEFAULT_CHUNKSIZE, total_bytes=None, progress=None):
+    """
+    Stream a buildings CSV into a DataFrame chunk by chunk.
+
+    Args:
+        source: Path or binary file-like object (e.g. a Streamlit UploadedFile)
+        chunksize (int): Rows parsed per chunk
+        total_bytes (int): Size of the input, used to preallocate and report progress
+        progress (callable): Called as progress(fraction, rows, rows_per_sec) after each chunk
+
+    Returns:
+        tuple: (DataFrame, stats dict with rows, seconds and rows_per_sec)
+    """
+    start = time.perf_counter()
+
+    header = pd.read_csv(source, nrows=0).columns
+    missing_columns = [col for col in BUILDING_COLUMNS if col not in header]
+    if missing_columns:
+        raise IngestError(f"Missing required columns: {', '.join(missing_columns)}")
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+    buffer = None
+    try:
+        reader = pd.read_csv(source, usecols=BUILDING_COLUMNS, dtype=BUILDING_DTYPES,
+                             chunksize=chunksize)
+        for chunk in reader:
+            if buffer is None:
+                # Size the buffer from the first chunk's bytes-per-row
+                capacity = len(chunk)
+                if total_bytes and hasattr(source, 'tell') and source.tell() > 0:
+                    capacity = int(total_bytes / source.tell() * len(chunk) * 1.1) + 1
+                buffer = ColumnBuffer(capacity)
+            validate_chunk(chunk, buffer.size)
+            buffer.append(chunk)
+
+            if progress is not None:
+                elapsed = time.perf_counter() - start
+                fraction = 1.0
+                if total_bytes and hasattr(source, 'tell'):
+                    fraction = min(source.tell() / total_bytes, 1.0)
+                progress(fraction, buffer.size, buffer.size / elapsed if elapsed > 0 else 0.0)
+    except ValueError as e:
+        if isinstance(e, IngestError):
+            raise
+        raise IngestError(f"Error converting numeric columns: {str(e)}") from e
+
+    if buffer is None:
+        buffer = ColumnBuffer()
+    data = buffer.to_frame()
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        'rows': len(data),
+        'seconds': elapsed,
+        'rows_per_sec': len(data) / elapsed if elapsed > 0 else 0.0,
+    }
+    return data, stats
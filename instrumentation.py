@@ -0,0 +1,213 @@
+"""
+Latency instrumentation for page renders and hot paths.
+
+Wrap code in span("name") or decorate a function with @timed() and every
+call is recorded in a process-wide registry of latency histograms. The
+registry can be read as a Prometheus text exposition (served on
+METRICS_PORT when set), written to a JSON file (METRICS_LOG), or shown in
+the app's debug panel.
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, as in Prometheus' default latency buckets plus a
+# few slower ones for model round trips and large uploads
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float('inf'))
+RECENT_SPANS = 200
+
+_parent = contextvars.ContextVar('span_parent', default=None)
+
+
+class LatencyHistogram:
+    """Cumulative-bucket latency histogram for one instrumented name."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.errors = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds, error=False):
+        for position, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[position] += 1
+                break
+        self.count += 1
+        self.errors += error
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation within its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                upper = min(bound, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'sum_seconds': self.sum,
+            'mean_ms': self.sum / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.quantile(0.5) * 1000,
+            'p95_ms': self.quantile(0.95) * 1000,
+            'p99_ms': self.quantile(0.99) * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe collection of histograms keyed by span name."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._recent = deque(maxlen=RECENT_SPANS)
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, error=False, parent=None):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.observe(seconds, error)
+            self._recent.append({'name': name, 'parent': parent, 'ms': seconds * 1000,
+                                 'error': error, 'time': time.time()})
+
+    def snapshot(self):
+        """Summary statistics per name, slowest total time first."""
+        with self._lock:
+            stats = {name: histogram.as_dict() for name, histogram in self._histograms.items()}
+        return dict(sorted(stats.items(), key=lambda item: -item[1]['sum_seconds']))
+
+    def recent(self):
+        with self._lock:
+            return list(self._recent)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._recent.clear()
+
+    def prometheus_text(self, metric='app_span_duration_seconds'):
+        """Render all histograms in the Prometheus text exposition format."""
+        lines = [f'# HELP {metric} Latency of instrumented spans.', f'# TYPE {metric} histogram']
+        error_lines = ['# HELP app_span_errors_total Spans that raised.', '# TYPE app_span_errors_total counter']
+        with self._lock:
+            for name, histogram in sorted(self._histograms.items()):
+                label = name.replace('\\', '\\\\').replace('"', '\\"')
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{metric}_bucket{{span="{label}",le="{le}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{span="{label}"}} {histogram.sum}')
+                lines.append(f'{metric}_count{{span="{label}"}} {histogram.count}')
+                error_lines.append(f'app_span_errors_total{{span="{label}"}} {histogram.errors}')
+        return '\n'.join(lines + error_lines) + '\n'
+
+    def write_json(self, path):
+        """Write the current snapshot atomically, for scraping by log shippers."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'time': time.time(), 'pid': os.getpid(), 'spans': self.snapshot()}, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block and record it under name; nested spans record their parent."""
+    parent = _parent.get()
+    token = _parent.set(name)
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        # Control flow such as a Streamlit rerun or an early generator
+        # close is a BaseException and not counted as an error
+        error = True
+        raise
+    finally:
+        _parent.reset(token)
+        registry.observe(name, time.perf_counter() - start, error, parent)
+
+
+def timed(name=None):
+    """Decorator form of span(); the name defaults to module.function."""
+    def decorate(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def timed_iter(name, iterable):
+    """
+    Record the time to exhaust an iterable (e.g. a streamed reply) as one span.
+
+    The span is not made the parent of code run by the consumer between items.
+    """
+    parent = _parent.get()
+    start = time.perf_counter()
+    error = False
+    try:
+        yield from iterable
+    except Exception:
+        error = True
+        raise
+    finally:
+        registry.observe(name, time.perf_counter() - start, error, parent)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] == '/metrics':
+            body = registry.prometheus_text().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path.split('?')[0] == '/metrics.json':
+            body = json.dumps(registry.snapshot()).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """Serve /metrics (Prometheus) and /metrics.json from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_DIR = os.environ.get(
+    'LLM_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'llm_cache')
+)
+MEMORY_ENTRIES = 256
+DISK_TTL_SECONDS = 7 * 24 * 3600
+DISK_MAX_BYTES = 50 * 1024 * 1024
+
+
+def normalize_text(text):
+    """Case-fold and collapse whitespace so trivially different prompts share a key."""
+    return re.sub(r'\s+', ' ', text).strip().casefold()
+
+
+def cache_key(model_name, prompt):
+    payload = json.dumps([model_name, normalize_text(prompt)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for model responses.
+
+    An in-memory LRU answers repeated questions without I/O. Behind it, a
+    SQLite table keeps responses across restarts; entries expire after
+    ttl_seconds, and the least recently used ones are evicted once the
+    stored text exceeds max_bytes.
+    """
+
+    def __init__(self, directory=CACHE_DIR, memory_entries=MEMORY_ENTRIES,
+                 ttl_seconds=DISK_TTL_SECONDS, max_bytes=DISK_MAX_BYTES):
+        self.memory_entries = memory_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._db = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(directory, 'responses.sqlite3'),
+                                       check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )""")
+            self._db.commit()
+
+    def _remember(self, key, response):
+        self._memory[key] = response
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached response for key, or None; an empty response counts as a miss."""
+        with self._lock:
+            if self._memory.get(key):
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return self._memory[key]
+
+            if self._db is not None:
+                now = time.time()
+                row = self._db.execute(
+                    'SELECT response, created FROM responses WHERE key = ?', (key,)
+                ).fetchone()
+                # Caches written before empty replies were refused may still hold one
+                if row is not None and row[0] and now - row[1] <= self.ttl_seconds:
+                    self._db.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+                    self._db.commit()
+                    self._remember(key, row[0])
+                    self.stats['disk_hits'] += 1
+                    return row[0]
+
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, key, response):
+        """Store a response; empty ones are ignored, so a blank reply is asked again."""
+        if not response:
+            return
+        with self._lock:
+            self._remember(key, response)
+            if self._db is None:
+                return
+            now = time.time()
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                (key, response, len(response.encode('utf-8')), now, now)
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now):
+        self._db.execute('DELETE FROM responses WHERE created < ?', (now - self.ttl_seconds,))
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk from least recently used until enough has been freed
+        excess = total - self.max_bytes
+        stale = []
+        for key, size in self._db.execute('SELECT key, size FROM responses ORDER BY accessed'):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._db.executemany('DELETE FROM responses WHERE key = ?', stale)
+
+    def get_or_generate(self, key, generate):
+        """Return the cached response, or call generate() and cache what it returns."""
+        response = self.get(key)
+        if response is None:
+            response = generate()
+            self.set(key, response)
+        return response
+
+    def hit_rate(self):
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        total = hits + self.stats['misses']
+        return hits / total if total else 0.0
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """
+    Offline stand-in for genai.GenerativeModel.
+
+    Replies deterministically from the prompt and counts calls, so caching
+    and batch jobs can be exercised without network access or an API key.
+    latency (seconds per call) and error_rate (probability of raising) let
+    tests simulate a slow or flaky API.
+    """
+
+    def __init__(self, model_name='stub', latency=0.0, error_rate=0.0, seed=None):
+        self.model_name = model_name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise RuntimeError("Injected stub model failure")
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8]
+        text = (f"[{self.model_name} {digest}] Consider an energy audit, LED retrofits "
+                f"and HVAC scheduling to improve this building's rating.")
+        if stream:
+            return [StubResponse(word + ' ') for word in text.split(' ')]
+        return StubResponse(text)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide response cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
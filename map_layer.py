@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+import folium
+from folium.plugins import FastMarkerCluster
+from instrumentation import timed
+from ingest import rating_codes
+
+# Index 0 is the fallback for ratings outside 1-5, as in home.get_rating_color
+RATING_COLORS = np.array(['gray', 'red', 'orange', 'yellow', 'lightgreen', 'green'])
+
+# Up to this many points are shipped raw and clustered in the browser;
+# beyond it, points are aggregated into grid cells on the server per zoom level
+CLIENT_CLUSTER_LIMIT = 20_000
+MAX_CELLS = 2_000
+# Grid cells per map tile edge; a tile spans 360 / 2**zoom degrees
+CELLS_PER_TILE = 4
+
+MARKER_CALLBACK = """\
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+                                {radius: 10, color: row[2], fill: true});
+    marker.bindPopup(row[3]);
+    return marker;
+}
+"""
+
+
+def rating_colors(ratings):
+    """Vectorized get_rating_color: integral ratings 1-5 map to colors, anything else to gray."""
+    return RATING_COLORS[rating_codes(ratings)]
+
+
+def located(buildings_data):
+    """Rows that have finite coordinates."""
+    lat = buildings_data['latitude'].to_numpy(dtype=float)
+    lon = buildings_data['longitude'].to_numpy(dtype=float)
+    return buildings_data[np.isfinite(lat) & np.isfinite(lon)]
+
+
+def marker_rows(buildings_data):
+    """Build [lat, lon, color, popup] rows for FastMarkerCluster with column operations."""
+    popups = (
+        buildings_data['name'].astype(str)
+        + '<br>Emissions: ' + buildings_data['annual_emissions'].astype(str)
+        + ' kg CO2e<br>Rating: ' + buildings_data['rating'].astype(str) + '/5'
+    )
+    rows = pd.DataFrame({
+        'lat': buildings_data['latitude'].to_numpy(dtype=float),
+        'lon': buildings_data['longitude'].to_numpy(dtype=float),
+        'color': rating_colors(buildings_data['rating']),
+        'popup': popups.to_numpy(),
+    })
+    return rows.to_numpy().tolist()
+
+
+def aggregate_grid(lat, lon, rating, emissions, zoom):
+    """
+    Bin points into square lat/lon cells sized for the zoom level.
+
+    The cell size doubles until at most MAX_CELLS cells are occupied.
+
+    Returns:
+        dict: Per-cell arrays of count, mean lat/lon, mean rating and total emissions
+    """
+    cell = 360.0 / (2 ** zoom) / CELLS_PER_TILE
+    while True:
+        rows = np.floor((lat + 90.0) / cell).astype(np.int64)
+        cols = np.floor((lon + 180.0) / cell).astype(np.int64)
+        keys = rows * (int(360.0 / cell) + 2) + cols
+        cells, inverse = np.unique(keys, return_inverse=True)
+        if len(cells) <= MAX_CELLS or cell >= 180.0:
+            break
+        cell *= 2
+
+    counts = np.bincount(inverse)
+    return {
+        'count': counts,
+        'latitude': np.bincount(inverse, lat) / counts,
+        'longitude': np.bincount(inverse, lon) / counts,
+        'rating': np.bincount(inverse, rating) / counts,
+        'annual_emissions': np.bincount(inverse, emissions),
+    }
+
+
+def viewport_bbox(bounds, zoom):
+    """
+    Padded, tile-aligned box around a Leaflet viewport.
+
+    Padding by half a viewport on each side lets small pans reuse the same
+    cached layer; snapping to the tile grid keeps the cache key stable.
+
+    Returns:
+        tuple: (min_lat, min_lon, max_lat, max_lon), or None without bounds
+    """
+    if not bounds or not bounds.get('_southWest') or not bounds.get('_northEast'):
+        return None
+    south, west = bounds['_southWest']['lat'], bounds['_southWest']['lng']
+    north, east = bounds['_northEast']['lat'], bounds['_northEast']['lng']
+    if east - west >= 360:
+        return None
+    pad_lat, pad_lon = (north - south) / 2, (east - west) / 2
+    tile = 360.0 / (2 ** zoom)
+    min_lat = max(np.floor((south - pad_lat) / tile) * tile, -90.0)
+    max_lat = min(np.ceil((north + pad_lat) / tile) * tile, 90.0)
+    min_lon = np.floor((west - pad_lon) / tile) * tile
+    max_lon = np.ceil((east + pad_lon) / tile) * tile
+    if max_lon - min_lon >= 360:
+        return (float(min_lat), -180.0, float(max_lat), 180.0)
+    # Leaflet reports unwrapped longitudes after panning across the antimeridian
+    min_lon = (min_lon + 180.0) % 360.0 - 180.0
+    max_lon = (max_lon + 180.0) % 360.0 - 180.0
+    return (float(min_lat), float(min_lon), float(max_lat), float(max_lon))
+
+
+@timed()
+def cell_layer(buildings_data, zoom, positions=None):
+    """
+    Feature group with one circle per occupied grid cell.
+
+    Args:
+        positions (np.ndarray): Optional row positions to restrict the layer to,
+            e.g. a spatial index query for the current viewport
+    """
+    if positions is not None:
+        buildings_data = buildings_data.iloc[positions]
+    data = located(buildings_data)
+    cells = aggregate_grid(
+        data['latitude'].to_numpy(dtype=float),
+        data['longitude'].to_numpy(dtype=float),
+        np.nan_to_num(data['rating'].to_numpy(dtype=float)),
+        np.nan_to_num(data['annual_emissions'].to_numpy(dtype=float)),
+        zoom,
+    )
+    colors = rating_colors(np.round(cells['rating']))
+    # Area-proportional radius, capped so dense cells do not swallow the map
+    radii = np.clip(4 + 2 * np.sqrt(cells['count']), 4, 30)
+
+    layer = folium.FeatureGroup(name='Buildings')
+    for lat, lon, count, rating, emissions, color, radius in zip(
+        cells['latitude'], cells['longitude'], cells['count'], cells['rating'],
+        cells['annual_emissions'], colors, radii
+    ):
+        folium.CircleMarker(
+            location=[lat, lon],
+            radius=float(radius),
+            popup=f"{count:,} buildings<br>Emissions: {emissions/1000:,.1f} tons CO2e<br>Avg Rating: {rating:.1f}/5",
+            color=color,
+            fill=True,
+        ).add_to(layer)
+    return layer
+
+
+def map_center(buildings_data):
+    first_building = buildings_data.iloc[0]
+    return [first_building.get('latitude', 0), first_building.get('longitude', 0)]
+
+
+@timed()
+def build_building_map(buildings_data, zoom=13):
+    """
+    Build the Geographic Distribution map.
+
+    Small portfolios get a single FastMarkerCluster layer whose markers are
+    created in the browser from one JSON array. Larger ones get an empty base
+    map; the caller adds cell_layer(buildings_data, zoom) as a dynamic
+    feature group so only the aggregated cells change as the user zooms.
+
+    Returns:
+        tuple: (folium.Map, bool) where the flag says whether cells are needed
+    """
+    m = folium.Map(location=map_center(buildings_data), zoom_start=zoom)
+    if len(buildings_data) > CLIENT_CLUSTER_LIMIT:
+        return m, True
+
+    FastMarkerCluster(marker_rows(located(buildings_data)), callback=MARKER_CALLBACK,
+                      name='Buildings').add_to(m)
+    return m, False
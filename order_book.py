@@ -0,0 +1,215 @@
+import heapq
+import math
+import itertools
+import threading
+from collections import deque
+
+BUY = "buy"
+SELL = "sell"
+# Depth deltas kept for subscribers that reconnect; anyone further behind gets a snapshot
+DELTA_HISTORY = 10_000
+
+
+class Order:
+    """A resting limit order."""
+
+    __slots__ = ("order_id", "side", "price", "quantity")
+
+    def __init__(self, order_id, side, price, quantity):
+        self.order_id = order_id
+        self.side = side
+        self.price = price
+        self.quantity = quantity
+
+
+class OrderBook:
+    """
+    Price-time-priority limit order book for carbon credits.
+
+    Each side keeps a dict of price -> FIFO queue of orders plus a heap of
+    prices, so inserting a new price level is O(log n) and finding the best
+    level is O(1). Empty levels are dropped from the dict and their heap
+    entries are discarded lazily.
+
+    The resting quantity of every level is kept as a running total, and the
+    levels touched since the last take_changes() are remembered, so a
+    publisher can send only what changed instead of the whole book.
+    """
+
+    def __init__(self):
+        self._levels = {BUY: {}, SELL: {}}
+        self._totals = {BUY: {}, SELL: {}}
+        self._changed = {BUY: set(), SELL: set()}
+        # Bids are stored negated so both heaps are min-heaps
+        self._heaps = {BUY: [], SELL: []}
+        self._ids = itertools.count(1)
+        self.sequence = 0
+
+    def _best_price(self, side):
+        heap = self._heaps[side]
+        levels = self._levels[side]
+        while heap:
+            price = -heap[0] if side == BUY else heap[0]
+            if price in levels:
+                return price
+            heapq.heappop(heap)
+        return None
+
+    def best_bid(self):
+        return self._best_price(BUY)
+
+    def best_ask(self):
+        return self._best_price(SELL)
+
+    def _rest(self, order):
+        levels = self._levels[order.side]
+        queue = levels.get(order.price)
+        if queue is None:
+            queue = levels[order.price] = deque()
+            heapq.heappush(self._heaps[order.side], -order.price if order.side == BUY else order.price)
+        queue.append(order)
+        totals = self._totals[order.side]
+        totals[order.price] = totals.get(order.price, 0) + order.quantity
+        self._changed[order.side].add(order.price)
+
+    def submit(self, side, quantity, price):
+        """
+        Match an incoming limit order and rest any unfilled remainder.
+
+        Args:
+            side (str): "buy" or "sell"
+            quantity (int): Number of credits
+            price (float): Limit price per credit
+
+        Returns:
+            tuple: (order_id, transactions, remaining quantity)
+        """
+        if side not in (BUY, SELL):
+            raise ValueError(f"Unknown side: {side}")
+        # NaN slips through every comparison below and inf cannot become an int
+        if not math.isfinite(float(quantity)):
+            raise ValueError("Quantity must be a finite number")
+        if not float(quantity).is_integer():
+            # int() would truncate 1.9 to 1 credit
+            raise ValueError("Quantity must be a whole number of credits")
+        quantity = int(quantity) if isinstance(quantity, int) else int(float(quantity))
+        price = float(price)
+        if not math.isfinite(price):
+            raise ValueError("Price must be a finite number")
+        if quantity <= 0:
+            raise ValueError("Quantity must be a positive integer")
+        if price <= 0:
+            raise ValueError("Price must be positive")
+        if round(price, 2) != price:
+            # Rounding would move the limit, possibly past what the trader set
+            raise ValueError("Price must have at most two decimal places")
+
+        order_id = next(self._ids)
+        self.sequence += 1
+        contra = SELL if side == BUY else BUY
+        contra_levels = self._levels[contra]
+        transactions = []
+
+        while quantity > 0:
+            best = self._best_price(contra)
+            if best is None or (best > price if side == BUY else best < price):
+                break
+            queue = contra_levels[best]
+            level_start = quantity
+            while queue and quantity > 0:
+                resting = queue[0]
+                fill = min(quantity, resting.quantity)
+                resting.quantity -= fill
+                quantity -= fill
+                transactions.append({
+                    "buy_order_id": order_id if side == BUY else resting.order_id,
+                    "sell_order_id": resting.order_id if side == BUY else order_id,
+                    "price": best,
+                    "quantity": fill,
+                })
+                if resting.quantity == 0:
+                    queue.popleft()
+            self._totals[contra][best] -= level_start - quantity
+            self._changed[contra].add(best)
+            if not queue:
+                del contra_levels[best]
+                del self._totals[contra][best]
+
+        if quantity > 0:
+            self._rest(Order(order_id, side, price, quantity))
+
+        return order_id, transactions, quantity
+
+    def depth(self, side, levels=None):
+        """Return aggregated price levels for one side, best price first."""
+        prices = sorted(self._levels[side], reverse=(side == BUY))
+        if levels is not None:
+            prices = prices[:levels]
+        return [self._level(side, price) for price in prices]
+
+    def _level(self, side, price):
+        """Aggregate of one price level; quantity and orders are 0 once it is empty."""
+        queue = self._levels[side].get(price)
+        return {
+            "price": price,
+            "quantity": self._totals[side].get(price, 0),
+            "orders": len(queue) if queue else 0,
+        }
+
+    def take_changes(self):
+        """
+        Return the new aggregate of every level touched since the last call, and reset.
+
+        Returns:
+            list: Dicts with side, price, quantity and orders; quantity 0 means the level was removed
+        """
+        changes = [dict(side=side, **self._level(side, price))
+                   for side in (BUY, SELL) for price in sorted(self._changed[side])]
+        self._changed = {BUY: set(), SELL: set()}
+        return changes
+
+    def snapshot(self, levels=None):
+        """Return both sides of the book in the shape the trading page expects."""
+        return {
+            "buy": self.depth(BUY, levels),
+            "sell": self.depth(SELL, levels),
+        }
+
+
+class DepthFeed:
+    """
+    Bounded, sequence-numbered history of order book deltas.
+
+    The publisher appends one delta per book sequence number; subscribers ask
+    for everything after the last sequence they applied and block in wait()
+    until something newer arrives. A subscriber that has fallen further
+    behind than the history reaches gets None and must start again from a
+    snapshot.
+    """
+
+    def __init__(self, history=DELTA_HISTORY):
+        self._deltas = deque(maxlen=history)
+        self._condition = threading.Condition()
+        self.sequence = 0
+
+    def publish(self, sequence, changes):
+        with self._condition:
+            self._deltas.append({"sequence": sequence, "changes": changes})
+            self.sequence = sequence
+            self._condition.notify_all()
+
+    def since(self, sequence):
+        """Deltas after sequence, oldest first, or None if they are no longer all held."""
+        with self._condition:
+            if sequence == self.sequence:
+                return []
+            if sequence > self.sequence or not self._deltas or self._deltas[0]["sequence"] > sequence + 1:
+                return None
+            # Sequence numbers are contiguous, so the offset into the history is direct
+            start = sequence + 1 - self._deltas[0]["sequence"]
+            return list(itertools.islice(self._deltas, start, None))
+
+    def wait(self, sequence, timeout=None):
+        """Block until a delta after sequence is published; False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.sequence != sequence, timeout)
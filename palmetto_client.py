@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import httpx
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+EI_API_URL = "https://ei.palmetto.com/api/v0/"
+CACHE_DIR = os.environ.get(
+    'PALMETTO_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'palmetto_cache')
+)
+DEFAULT_CONCURRENCY = 20
+
+
+def is_retryable(error):
+    """Retry transport failures, rate limiting and server errors; not bad requests."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+class PalmettoClient:
+    """
+    Async client for the Palmetto EI building-energy-model API.
+
+    One AsyncClient connection pool is shared by every request, a semaphore
+    caps in-flight calls, and bem/calculate results are cached on disk
+    keyed on (lat, lon, from, to), so repeated enrichment runs are free.
+
+    Use as an async context manager:
+
+        async with PalmettoClient(api_key) as client:
+            results = await client.calculate_many(locations, "2019-01-01T00:00:00", "2020-01-01T00:00:00")
+    """
+
+    def __init__(self, api_key, base_url=EI_API_URL, max_concurrency=DEFAULT_CONCURRENCY,
+                 cache_dir=CACHE_DIR, timeout=30.0, max_attempts=4, transport=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.transport = transport
+        self.stats = {'cache_hits': 0, 'requests': 0, 'errors': 0}
+        self._client = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.max_concurrency,
+                                max_keepalive_connections=self.max_concurrency),
+            headers={
+                "accept": "application/json",
+                "content-type": "application/json",
+                "X-API-Key": self.api_key,
+            },
+            transport=self.transport,
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._client.aclose()
+
+    def _cache_path(self, latitude, longitude, from_datetime, to_datetime):
+        # Round coordinates to ~1 m so float noise does not defeat the cache
+        key = json.dumps([round(float(latitude), 5), round(float(longitude), 5), from_datetime, to_datetime])
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.json")
+
+    def _read_cache(self, path):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_cache(self, path, result):
+        if self.cache_dir is None:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+
+    async def health(self):
+        response = await self._client.get("health")
+        return response.text
+
+    async def calculate(self, latitude, longitude, from_datetime, to_datetime):
+        """Run bem/calculate for one location, served from the disk cache when possible."""
+        path = self._cache_path(latitude, longitude, from_datetime, to_datetime)
+        cached = self._read_cache(path)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return cached
+
+        payload = {
+            "location": {"latitude": float(latitude), "longitude": float(longitude)},
+            "parameters": {"from_datetime": from_datetime, "to_datetime": to_datetime},
+        }
+        async for attempt in AsyncRetrying(retry=retry_if_exception(is_retryable),
+                                           stop=stop_after_attempt(self.max_attempts),
+                                           wait=wait_random_exponential(multiplier=0.5, max=20),
+                                           reraise=True):
+            with attempt:
+                async with self._semaphore:
+                    self.stats['requests'] += 1
+                    response = await self._client.post("bem/calculate", json=payload)
+                response.raise_for_status()
+
+        result = response.json()
+        self._write_cache(path, result)
+        return result
+
+    async def calculate_many(self, locations, from_datetime, to_datetime, progress=None):
+        """
+        Fan out bem/calculate over many (lat, lon) pairs.
+
+        Duplicate coordinates are requested once. Failures are returned in
+        place of results as {"error": message} so one bad location does not
+        sink the batch.
+
+        Returns:
+            list: Results in the order of `locations`
+        """
+        locations = [(float(lat), float(lon)) for lat, lon in locations]
+        unique = list(dict.fromkeys(loc for loc in locations if math.isfinite(loc[0]) and math.isfinite(loc[1])))
+        results = {}
+        done = 0
+
+        async def run(location):
+            nonlocal done
+            try:
+                results[location] = await self.calculate(*location, from_datetime, to_datetime)
+            except Exception as e:
+                self.stats['errors'] += 1
+                results[location] = {"error": str(e)}
+            done += 1
+            if progress is not None:
+                progress(done, len(unique))
+
+        await asyncio.gather(*(run(location) for location in unique))
+        missing = {"error": "Missing coordinates"}
+        return [results.get(location, missing) for location in locations]
+
+
+def enrich_buildings(buildings_data, api_key, from_datetime, to_datetime, **client_kwargs):
+    """
+    Synchronous helper: energy-model results for every building with coordinates.
+
+    Returns:
+        list: One result (or {"error": ...}) per row of buildings_data
+    """
+    async def run():
+        async with PalmettoClient(api_key, **client_kwargs) as client:
+            return await client.calculate_many(
+                zip(buildings_data['latitude'], buildings_data['longitude']),
+                from_datetime, to_datetime,
+            )
+    return asyncio.run(run())
+
+
+def mock_transport(latency=0.0, fail_every=0):
+    """
+    In-process stand-in for the EI API, for tests and offline runs.
+
+    Answers health and bem/calculate with deterministic synthetic
+    consumption derived from the requested coordinates. With fail_every=N,
+    every Nth calculate call returns HTTP 503 to exercise retries.
+    """
+    calls = {'calculate': 0}
+
+    async def handler(request):
+        if latency:
+            await asyncio.sleep(latency)
+        if request.url.path.endswith('/health'):
+            return httpx.Response(200, text="OK")
+        if request.url.path.endswith('/bem/calculate'):
+            calls['calculate'] += 1
+            if fail_every and calls['calculate'] % fail_every == 0:
+                return httpx.Response(503, json={"error": "Service unavailable"})
+            body = json.loads(request.content)
+            location = body['location']
+            seed = abs(hash((location['latitude'], location['longitude']))) % 1000
+            return httpx.Response(200, json={
+                "location": location,
+                "parameters": body['parameters'],
+                "annual_consumption_kwh": 50_000 + seed * 10,
+            })
+        return httpx.Response(404, json={"error": "Not found"})
+
+    transport = httpx.MockTransport(handler)
+    transport.calls = calls
+    return transport
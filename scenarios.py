@@ -0,0 +1,243 @@
+"""
+Monte Carlo emissions pathways for the whole portfolio.
+
+Each building's fitted trend (forecasting.fit_trends) is simulated forward
+as a tensor of scenario x building x year. Every scenario draws the trend's
+level and slope from their sampling distributions, adds yearly residual
+noise, and applies any planned retrofit with an uncertain efficacy from its
+start year. The result keeps the portfolio total of every scenario and year,
+plus a few quantiles of each building's final-year emissions relative to
+today. From those, the probability of meeting any reduction target is
+cheap to evaluate.
+"""
+import hashlib
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+DEFAULT_SCENARIOS = 1000
+# Elements of the scenario x building x year tensor simulated at once (float32)
+CHUNK_ELEMENTS = 1 << 23
+# Runs with more elements than this are spread over a process pool
+PARALLEL_ELEMENTS = 1 << 27
+# Year-to-year spread, relative to current emissions, for buildings whose
+# history is too short to estimate one
+FALLBACK_VOLATILITY = 0.05
+# Standard deviation of a retrofit's achieved reduction, relative to its nominal one
+RETROFIT_SPREAD = 0.25
+# Final-year quantiles kept per building, for per-building target probabilities
+QUANTILE_LEVELS = np.linspace(0.0, 1.0, 21)
+# Chunk results kept across runs: enough for a few configurations of a large portfolio
+MAX_CACHED_CHUNKS = 2048
+
+
+def simulate_chunk(level, slope, level_se, slope_se, sigma, pivot, current,
+                   retrofit_start, retrofit_reduction, steps, scenarios, seed):
+    """
+    Simulate one block of buildings.
+
+    Args:
+        level, slope, level_se, slope_se, sigma, pivot, current (np.ndarray): Per-building
+            trend value at the pivot year, slope, their standard errors, residual spread,
+            pivot year and current emissions
+        retrofit_start (np.ndarray): Years from now when each building's retrofit takes
+            effect (inf for none)
+        retrofit_reduction (np.ndarray): Nominal fraction of emissions each retrofit removes
+        steps (np.ndarray): Future years on the fit's scale
+        scenarios (int): Number of pathways
+        seed (np.random.SeedSequence): Seed for this block
+
+    Returns:
+        tuple: (portfolio totals of shape (scenarios, years), final-year quantiles of
+            emissions relative to current of shape (len(QUANTILE_LEVELS), buildings))
+    """
+    rng = np.random.default_rng(seed)
+    rows, years = len(level), len(steps)
+    shape = (scenarios, rows)
+    level = (level + level_se * rng.standard_normal(shape, dtype=np.float32)).astype(np.float32)
+    slope = (slope + slope_se * rng.standard_normal(shape, dtype=np.float32)).astype(np.float32)
+    offsets = (steps[:, None] - pivot[None, :]).astype(np.float32)
+    # Laid out scenario x year x building so each year's slice is contiguous
+    paths = rng.standard_normal((scenarios, years, rows), dtype=np.float32)
+    paths *= sigma.astype(np.float32)
+    for year in range(years):
+        paths[:, year, :] += level + slope * offsets[year]
+    np.maximum(paths, 0, out=paths)
+
+    retrofitted = np.flatnonzero(np.isfinite(retrofit_start))
+    if len(retrofitted):
+        nominal = retrofit_reduction[retrofitted].astype(np.float32)
+        efficacy = np.clip(nominal * (1 + RETROFIT_SPREAD * rng.standard_normal(
+            (scenarios, len(nominal)), dtype=np.float32)), 0, 1)
+        for year in range(years):
+            active = year + 1 >= retrofit_start[retrofitted]
+            paths[:, year, retrofitted[active]] *= 1 - efficacy[:, active]
+
+    totals = np.nansum(paths, axis=2, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = paths[:, -1, :] / current.astype(np.float32)
+    quantiles = np.quantile(ratio, QUANTILE_LEVELS, axis=0).astype(np.float32)
+    return totals, quantiles
+
+
+class ScenarioResult:
+    """Outcome of ScenarioEngine.run."""
+
+    def __init__(self, totals, quantiles, steps):
+        self.totals = totals
+        self.quantiles = quantiles
+        self.steps = steps
+
+    @property
+    def scenarios(self):
+        return self.totals.shape[0]
+
+    def bands(self, percentiles=(5, 50, 95)):
+        """Portfolio total per year at the given percentiles, shape (len(percentiles), years)."""
+        return np.percentile(self.totals, percentiles, axis=0)
+
+    def probability_of_meeting(self, target):
+        """
+        Share of scenarios whose portfolio total is at or below the target, per year.
+
+        Args:
+            target (np.ndarray): Target total for each simulated year
+        """
+        return (self.totals <= np.asarray(target)[None, :]).mean(axis=0)
+
+    def building_probability(self, ratio):
+        """
+        Estimated chance each building ends at or below `ratio` times its current
+        emissions, interpolated between its stored quantiles; NaN without a baseline.
+        """
+        q = self.quantiles
+        below = (q <= ratio).sum(axis=0)
+        upper = np.minimum(below, len(QUANTILE_LEVELS) - 1)
+        lower = np.maximum(below - 1, 0)
+        columns = np.arange(q.shape[1])
+        q_low, q_high = q[lower, columns], q[upper, columns]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction = np.where(q_high > q_low, (ratio - q_low) / (q_high - q_low), 0.0)
+        probability = QUANTILE_LEVELS[lower] + np.clip(fraction, 0, 1) * (
+            QUANTILE_LEVELS[upper] - QUANTILE_LEVELS[lower])
+        probability = np.where(below == 0, 0.0, np.where(below == len(QUANTILE_LEVELS), 1.0, probability))
+        return np.where(np.isnan(q).any(axis=0), np.nan, probability)
+
+
+class ScenarioEngine:
+    """
+    Monte Carlo simulator over one set of fitted trends.
+
+    The portfolio is simulated in blocks of buildings, each with its own
+    seed derived from the run seed and the block number, so results do not
+    depend on how many processes ran them. Block results are kept in an LRU
+    keyed on everything that went into them: a repeated run costs nothing,
+    and changing one building's retrofit resimulates only its block.
+    """
+
+    def __init__(self, fit, current):
+        """
+        Args:
+            fit (TrendFit): Per-building trends from forecasting.fit_trends
+            current (np.ndarray): Current annual emissions per building
+        """
+        current = np.asarray(current, dtype=float)
+        self.current = current
+        self.x_last = float(np.max(fit.years)) if len(fit.years) else 0.0
+        n_obs = np.maximum(fit.n_obs, 1)
+        estimated = np.isfinite(fit.residual_std) & (fit.residual_std > 0)
+        self.sigma = np.where(estimated, fit.residual_std, FALLBACK_VOLATILITY * np.abs(current))
+        self.pivot = np.where(np.isfinite(fit.x_mean), fit.x_mean, self.x_last)
+        slope = np.nan_to_num(fit.slope)
+        intercept = np.where(np.isfinite(fit.intercept), fit.intercept, current)
+        self.level = intercept + slope * self.pivot
+        self.slope = slope
+        self.level_se = self.sigma / np.sqrt(n_obs)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.slope_se = np.where(fit.sxx > 0, self.sigma / np.sqrt(fit.sxx), 0.0)
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.current)
+
+    def run(self, horizon, scenarios=DEFAULT_SCENARIOS, seed=0, retrofit_start=None,
+            retrofit_reduction=None, workers=None):
+        """
+        Simulate `scenarios` pathways of every building for `horizon` years.
+
+        Args:
+            horizon (int): Years to simulate
+            scenarios (int): Pathways per building
+            seed (int): Run seed; the same seed and inputs give the same result
+            retrofit_start (np.ndarray): Per building, years from now when its retrofit takes
+                effect; inf (or None for all) means no retrofit
+            retrofit_reduction (np.ndarray): Per building, nominal fraction of emissions removed
+            workers (int): Process count for large runs (default: CPU count); 1 disables the pool
+
+        Returns:
+            ScenarioResult
+        """
+        buildings = len(self)
+        steps = self.x_last + np.arange(1, horizon + 1, dtype=float)
+        if retrofit_start is None:
+            retrofit_start = np.full(buildings, np.inf)
+            retrofit_reduction = np.zeros(buildings)
+        retrofit_start = np.asarray(retrofit_start, dtype=float)
+        retrofit_reduction = np.asarray(retrofit_reduction, dtype=float)
+
+        rows = max(1, CHUNK_ELEMENTS // (scenarios * horizon))
+        starts = range(0, buildings, rows)
+        keys, pending = [], {}
+        for number, start in enumerate(starts):
+            block = slice(start, start + rows)
+            plan = retrofit_start[block].tobytes() + retrofit_reduction[block].tobytes()
+            key = (start, rows, horizon, scenarios, seed, hashlib.blake2b(plan, digest_size=16).digest())
+            keys.append(key)
+            if key not in self._cache:
+                pending[key] = (self.level[block], self.slope[block], self.level_se[block],
+                                self.slope_se[block], self.sigma[block], self.pivot[block],
+                                self.current[block], retrofit_start[block], retrofit_reduction[block],
+                                steps, scenarios, np.random.SeedSequence([seed, number]))
+
+        workers = workers or os.cpu_count() or 1
+        if workers > 1 and len(pending) > 1 and len(pending) * rows * scenarios * horizon > PARALLEL_ELEMENTS:
+            # Spawned workers import only NumPy and this module, and do not
+            # inherit the server's threads
+            with ProcessPoolExecutor(min(workers, len(pending)),
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                results = pool.map(simulate_chunk, *zip(*pending.values()))
+                computed = dict(zip(pending, results))
+        else:
+            computed = {key: simulate_chunk(*args) for key, args in pending.items()}
+
+        self._cache.update(computed)
+        blocks = [self._cache[key] for key in keys]
+        for key in keys:
+            self._cache.move_to_end(key)
+        while len(self._cache) > MAX_CACHED_CHUNKS:
+            self._cache.popitem(last=False)
+
+        if not blocks:
+            return ScenarioResult(np.zeros((scenarios, horizon)),
+                                  np.zeros((len(QUANTILE_LEVELS), 0), dtype=np.float32), steps)
+        totals = np.sum([totals for totals, _ in blocks], axis=0)
+        quantiles = np.concatenate([quantiles for _, quantiles in blocks], axis=1)
+        return ScenarioResult(totals, quantiles, steps)
+
+
+def retrofit_plan(selected, start_year, reduction):
+    """
+    Per-building retrofit arrays for ScenarioEngine.run.
+
+    Args:
+        selected (np.ndarray): Boolean mask of the buildings to retrofit
+        start_year (int): Years from now when the retrofits take effect
+        reduction (float): Nominal fraction of emissions each one removes
+
+    Returns:
+        tuple: (retrofit_start, retrofit_reduction)
+    """
+    selected = np.asarray(selected, dtype=bool)
+    return np.where(selected, float(start_year), np.inf), np.where(selected, float(reduction), 0.0)
@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+from flask import Flask, Response, g, jsonify, request
+from order_book import OrderBook, DepthFeed, BUY, SELL
+from trade_tape import TradeTape
+from instrumentation import registry
+
+app = Flask(__name__)
+
+# Single in-process book shared by all request threads
+book = OrderBook()
+book_lock = threading.Lock()
+# Depth deltas for the streaming endpoint, published while book_lock is held
+feed = DepthFeed()
+# Every fill, with OHLC/volume bars; has its own lock so reads skip book_lock
+tape = TradeTape()
+# Idle streams get a comment line this often so dead clients are noticed
+HEARTBEAT_SECONDS = 15
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_latency(response):
+    if request.endpoint is not None:
+        registry.observe(f"server.{request.endpoint}", time.perf_counter() - g.request_start,
+                         response.status_code >= 500)
+    return response
+
+
+@app.get("/metrics")
+def metrics():
+    """Per-endpoint latency histograms in the Prometheus text format."""
+    return registry.prometheus_text(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+def execute_order(side, payload):
+    """Run one order through the book; caller must hold book_lock."""
+    order_id, transactions, remaining = book.submit(
+        side, payload.get("quantity", 0), payload.get("price", 0)
+    )
+    feed.publish(book.sequence, book.take_changes())
+    tape.record_transactions(transactions)
+    return {
+        "order_id": order_id,
+        "transactions": transactions,
+        "remaining": remaining,
+    }
+
+
+def submit_order(side):
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Expected a JSON object with quantity and price"}), 400
+    try:
+        with book_lock:
+            result = execute_order(side, payload)
+    except (OverflowError, TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+
+@app.get("/api/order-book")
+def get_order_book():
+    levels = request.args.get("levels", type=int)
+    with book_lock:
+        # The sequence only moves when an order is submitted, so it doubles
+        # as a validator for conditional requests
+        etag = f"{book.sequence}-{levels}"
+        if request.if_none_match.contains(etag):
+            return "", 304, {"ETag": f'"{etag}"'}
+        snapshot = book.snapshot(levels)
+        sequence = book.sequence
+    return jsonify({"order_book": snapshot, "sequence": sequence}), 200, {"ETag": f'"{etag}"'}
+
+
+def server_sent_event(event, sequence, data):
+    return f"event: {event}\nid: {sequence}\ndata: {json.dumps(data)}\n\n"
+
+
+def depth_events(since):
+    """
+    Yield the order book as server-sent events: a snapshot when the
+    subscriber has no usable position, then one delta per book sequence.
+    """
+    deltas = None if since is None else feed.since(since)
+    while True:
+        if deltas is None:
+            with book_lock:
+                snapshot, since = book.snapshot(), book.sequence
+            yield server_sent_event("snapshot", since, {"sequence": since, "order_book": snapshot})
+            deltas = []
+        for delta in deltas:
+            yield server_sent_event("delta", delta["sequence"], delta)
+            since = delta["sequence"]
+        if not feed.wait(since, HEARTBEAT_SECONDS):
+            yield ": keepalive\n\n"
+        deltas = feed.since(since)
+
+
+@app.get("/api/order-book/stream")
+def stream_order_book():
+    """
+    Push order book changes as they happen.
+
+    Pass ?since=<sequence> (or the Last-Event-ID header on reconnect) to
+    resume from the last applied delta; without it, or when that position
+    has aged out of the feed's history, the stream starts with a snapshot.
+    """
+    since = request.args.get("since", type=int)
+    if since is None:
+        since = request.headers.get("Last-Event-ID", type=int)
+    return Response(depth_events(since), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def frame_records(frame, time_column):
+    """JSON-ready rows with the time column as Unix seconds and NaN as null."""
+    frame = frame.assign(**{time_column: frame[time_column].astype("int64") / 1e9})
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+
+@app.get("/api/trades")
+def get_trades():
+    limit = min(request.args.get("limit", 50, type=int), 1000)
+    return jsonify({"trades": frame_records(tape.recent(limit), "time"), "summary": tape.summary()})
+
+
+@app.get("/api/trades/bars")
+def get_trade_bars():
+    try:
+        bars = tape.bars(request.args.get("interval", "1m"),
+                         start=request.args.get("start", type=float),
+                         end=request.args.get("end", type=float),
+                         limit=min(request.args.get("limit", 500, type=int), 5000))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"bars": frame_records(bars, "start"), "trades": tape.count})
+
+
+@app.post("/api/market/buy")
+def market_buy():
+    return submit_order(BUY)
+
+
+@app.post("/api/market/sell")
+def market_sell():
+    return submit_order(SELL)
+
+
+@app.post("/api/market/batch")
+def market_batch():
+    """Submit many orders in one round trip; each gets its own result or error."""
+    payload = request.get_json(silent=True) or {}
+    orders = payload.get("orders") if isinstance(payload, dict) else None
+    if not isinstance(orders, list):
+        return jsonify({"error": "Expected a list of orders"}), 400
+
+    results = []
+    with book_lock:
+        for order in orders:
+            try:
+                results.append(execute_order(order.get("side"), order))
+            except (AttributeError, OverflowError, TypeError, ValueError) as e:
+                results.append({"error": str(e)})
+    return jsonify({"results": results})
+
+
+if __name__ == "__main__":
+    app.run(host="127.0.0.1", port=8000, threaded=True)
@@ -0,0 +1,150 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+# Average number of points per occupied grid cell the default cell size aims for
+POINTS_PER_CELL = 16
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance in km from one point to arrays of points."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class SpatialIndex:
+    """
+    Uniform lat/lon grid over point coordinates, in pure NumPy.
+
+    Points are sorted by cell key (row-major), so the cells of one grid row
+    inside a bounding box form a contiguous run that two binary searches
+    find. Queries return row positions into the arrays the index was built
+    from; rows with missing coordinates are never returned.
+    """
+
+    def __init__(self, latitudes, longitudes, cell_deg=None):
+        lat = np.asarray(latitudes, dtype=np.float64)
+        lon = np.asarray(longitudes, dtype=np.float64)
+        valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        self.size = len(lat)
+
+        if cell_deg is None:
+            if len(valid):
+                span = max(np.ptp(lat[valid]), 1e-3) * max(np.ptp(lon[valid]), 1e-3)
+                cell_deg = np.sqrt(span * POINTS_PER_CELL / len(valid))
+            else:
+                cell_deg = 1.0
+        self.cell_deg = float(np.clip(cell_deg, 1e-4, 10.0))
+        self.n_cols = int(np.ceil(360.0 / self.cell_deg)) + 1
+        self.n_rows = int(np.ceil(180.0 / self.cell_deg)) + 1
+
+        keys = self._keys(lat[valid], lon[valid])
+        order = np.argsort(keys, kind='stable')
+        self._keys_sorted = keys[order]
+        self._positions = valid[order]
+        self._lat = lat[self._positions]
+        self._lon = lon[self._positions]
+
+    def _row(self, lat):
+        return np.clip(np.floor((np.asarray(lat) + 90.0) / self.cell_deg), 0, self.n_rows - 1).astype(np.int64)
+
+    def _col(self, lon):
+        return np.clip(np.floor((np.asarray(lon) + 180.0) / self.cell_deg), 0, self.n_cols - 1).astype(np.int64)
+
+    def _keys(self, lat, lon):
+        return self._row(lat) * self.n_cols + self._col(lon)
+
+    def _bbox_slots(self, min_lat, min_lon, max_lat, max_lon):
+        """Slots (indices into the sorted arrays) of points inside a non-wrapping box."""
+        rows = np.arange(self._row(min_lat), self._row(max_lat) + 1)
+        lo = np.searchsorted(self._keys_sorted, rows * self.n_cols + self._col(min_lon), 'left')
+        hi = np.searchsorted(self._keys_sorted, rows * self.n_cols + self._col(max_lon), 'right')
+        lengths = hi - lo
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        # Expand the [lo, hi) runs into one index array without a Python loop
+        starts = np.repeat(lo - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        slots = starts + np.arange(total)
+        inside = ((self._lat[slots] >= min_lat) & (self._lat[slots] <= max_lat)
+                  & (self._lon[slots] >= min_lon) & (self._lon[slots] <= max_lon))
+        return slots[inside]
+
+    def _bbox_slots_wrapped(self, min_lat, min_lon, max_lat, max_lon):
+        if min_lon <= max_lon:
+            return self._bbox_slots(min_lat, min_lon, max_lat, max_lon)
+        # Box crosses the antimeridian
+        return np.concatenate([
+            self._bbox_slots(min_lat, min_lon, max_lat, 180.0),
+            self._bbox_slots(min_lat, -180.0, max_lat, max_lon),
+        ])
+
+    def bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """
+        Positions of points inside a bounding box.
+
+        A box with min_lon > max_lon is taken to cross the antimeridian.
+        """
+        return self._positions[self._bbox_slots_wrapped(min_lat, min_lon, max_lat, max_lon)]
+
+    def _radius_slots(self, lat, lon, radius_km):
+        """Slots within radius_km of (lat, lon) and their distances."""
+        angular = radius_km / EARTH_RADIUS_KM
+        dlat = np.degrees(angular)
+        min_lat, max_lat = lat - dlat, lat + dlat
+        # Widest longitude offset of the circle: sin(dlon) = sin(r / R) / cos(lat)
+        ratio = np.sin(min(angular, np.pi / 2)) / max(np.cos(np.radians(lat)), 1e-12)
+        if min_lat <= -90 or max_lat >= 90 or angular >= np.pi / 2 or ratio >= 1:
+            # Circle reaches a pole or spans every longitude
+            min_lon, max_lon = -180.0, 180.0
+        else:
+            dlon = np.degrees(np.arcsin(ratio))
+            min_lon = (lon - dlon + 180.0) % 360.0 - 180.0
+            max_lon = (lon + dlon + 180.0) % 360.0 - 180.0
+
+        slots = self._bbox_slots_wrapped(max(min_lat, -90.0), min_lon, min(max_lat, 90.0), max_lon)
+        distances = haversine_km(lat, lon, self._lat[slots], self._lon[slots])
+        inside = distances <= radius_km
+        return slots[inside], distances[inside]
+
+    def radius(self, lat, lon, radius_km):
+        """
+        Positions within radius_km of a point, nearest first.
+
+        Returns:
+            tuple: (positions, distances in km)
+        """
+        slots, distances = self._radius_slots(lat, lon, radius_km)
+        order = np.argsort(distances, kind='stable')
+        return self._positions[slots[order]], distances[order]
+
+    def nearest(self, lat, lon, k=1):
+        """
+        The k points closest to (lat, lon), nearest first.
+
+        The search radius starts at one grid cell and doubles until it holds
+        k points; every point inside the radius is examined, so the result
+        is exact.
+
+        Returns:
+            tuple: (positions, distances in km)
+        """
+        k = min(int(k), len(self._positions))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        radius_km = np.radians(self.cell_deg) * EARTH_RADIUS_KM
+        while True:
+            slots, distances = self._radius_slots(lat, lon, radius_km)
+            if len(slots) >= k or radius_km >= np.pi * EARTH_RADIUS_KM:
+                break
+            radius_km *= 2
+        if len(slots) < k:
+            slots = np.arange(len(self._positions))
+            distances = haversine_km(lat, lon, self._lat, self._lon)
+
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+        return self._positions[slots[nearest]], distances[nearest]
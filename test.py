@@ -1,32 +1,59 @@
-from datetime import datetime
-import httpx
-
-def calculate(latitude,longitude, fromdate, to):
-    host = "https://ei.palmetto.com/api/v0/"
-
-    with httpx.Client() as handler:
-        resp = handler.get(url=host+"health")
-        print(resp.text)
-    
-        payload = {
-            "location": {
-              "latitude": 37.7749,
-              "longitude": -122.4194
-            },
-              "parameters": {
-              "from_datetime": "2019-01-01T00:00:00",
-              "to_datetime": "2020-01-01T00:00:00",
-            }
-          }
-
-        headers = {
-            "accept" : "application/json",
-            "content-type": "application/json",
-            "X-API-Key": "WKGlTTo3KbjUZDmbatspnyMdnYTtunteJxbdY8c6ScE"
-        }
-
-        resp = handler.post(url=host+"bem/calculate", json=payload, headers=headers)
-
-        print(resp.status_code)
-
-calculate(10,120,"2024-11-15T23:43:30", "2024-11-16T23:43:30")
+import argparse
+import asyncio
+import math
+import os
+import sys
+import tempfile
+from palmetto_client import PalmettoClient, mock_transport
+
+FROM_DATETIME = "2019-01-01T00:00:00"
+TO_DATETIME = "2020-01-01T00:00:00"
+
+def calculate(api_key, latitude, longitude, fromdate, to):
+    async def run():
+        async with PalmettoClient(api_key) as client:
+            print(await client.health())
+            result = await client.calculate(latitude, longitude, fromdate, to)
+            print(result)
+            return result
+
+    return asyncio.run(run())
+
+def offline_check():
+    """Run the client against mock_transport: retries, duplicates, missing coordinates and the disk cache."""
+    locations = [(37.7749, -122.4194), (40.7128, -74.0060), (37.7749, -122.4194), (math.nan, 0.0)]
+
+    async def run(cache_dir, transport):
+        async with PalmettoClient("offline", cache_dir=cache_dir, transport=transport) as client:
+            assert await client.health() == "OK"
+            results = await client.calculate_many(locations, FROM_DATETIME, TO_DATETIME)
+            return results, client.stats
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Every second call fails with 503, so each location needs a retry
+        transport = mock_transport(fail_every=2)
+        results, stats = asyncio.run(run(cache_dir, transport))
+        assert len(results) == len(locations)
+        assert all("annual_consumption_kwh" in result for result in results[:3]), results
+        assert results[0] == results[2]
+        assert results[3] == {"error": "Missing coordinates"}
+        # Duplicates are requested once: two locations, each failing once before succeeding
+        assert transport.calls['calculate'] == 3 and stats['errors'] == 0, (transport.calls, stats)
+
+        transport = mock_transport()
+        cached, stats = asyncio.run(run(cache_dir, transport))
+        assert cached == results
+        assert transport.calls['calculate'] == 0 and stats['cache_hits'] == 2, (transport.calls, stats)
+    print("Offline check passed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Call the Palmetto EI API once, or check the client offline.")
+    parser.add_argument("--offline", action="store_true", help="Use the in-process mock instead of the API")
+    args = parser.parse_args()
+    if args.offline:
+        offline_check()
+    else:
+        api_key = os.environ.get("EI_API_KEY")
+        if not api_key:
+            sys.exit("Set EI_API_KEY to call the Palmetto EI API, or pass --offline to use the mock")
+        calculate(api_key, 37.7749, -122.4194, FROM_DATETIME, TO_DATETIME)
@@ -0,0 +1,394 @@
+import calendar
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+TIMESERIES_DIR = os.environ.get(
+    'TIMESERIES_STORE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'timeseries')
+)
+# Buildings per block file; one block-year is BLOCK_ROWS x 8,784 float32 (~36 MB)
+BLOCK_ROWS = 1024
+# Grid-average carbon intensity used to turn metered kWh into kg CO2e
+GRID_EMISSION_FACTOR = 0.4
+FREQUENCIES = ('daily', 'monthly', 'annual')
+
+
+def hours_in_year(year):
+    return 8784 if calendar.isleap(year) else 8760
+
+
+def _hour_of_year(timestamp):
+    timestamp = pd.Timestamp(timestamp).floor('h')
+    return timestamp.year, int((timestamp - pd.Timestamp(year=timestamp.year, month=1, day=1)) // pd.Timedelta(hours=1))
+
+
+def _month_starts(year):
+    """Day-of-year offset of each month start."""
+    days = [calendar.monthrange(year, month)[1] for month in range(1, 13)]
+    return np.concatenate([[0], np.cumsum(days)[:-1]])
+
+
+class TimeSeriesStore:
+    """
+    Hourly energy consumption per building in memory-mapped float32 files.
+
+    Rows are building store positions. They are split into blocks of
+    BLOCK_ROWS buildings, and each block keeps one file per calendar year
+    at block-<b>/<year>.npy with shape (BLOCK_ROWS, hours in year). Unwritten
+    hours are NaN. Appends touch only the block-years they cover. Growing
+    the portfolio or adding a year creates new files and never copies
+    existing ones.
+
+    resample() streams one block-year at a time, so daily, monthly and
+    annual totals are computed in bounded memory for any portfolio size.
+    """
+
+    def __init__(self, root=TIMESERIES_DIR):
+        self.root = root
+        self._lock = threading.RLock()
+        self._meta = self._read_meta()
+        self._maps = {}
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.root, 'meta.json')
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'version': 0, 'rows': 0, 'years': []}
+
+    def _write_meta(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self._meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def refresh(self):
+        """Pick up writes made by another process."""
+        with self._lock:
+            self._meta = self._read_meta()
+
+    @property
+    def version(self):
+        return self._meta['version']
+
+    @property
+    def years(self):
+        return list(self._meta['years'])
+
+    def __len__(self):
+        return self._meta['rows']
+
+    def _block_path(self, block, year):
+        return os.path.join(self.root, f'block-{block}', f'{year}.npy')
+
+    def _block(self, block, year, create=False):
+        """Mapping of one block-year, or None if it was never written."""
+        key = (block, year)
+        if key in self._maps:
+            return self._maps[key]
+        path = self._block_path(block, year)
+        if os.path.exists(path):
+            values = np.load(path, mmap_mode='r+')
+        elif create:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            values = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32,
+                                               shape=(BLOCK_ROWS, hours_in_year(year)))
+            values[:] = np.nan
+        else:
+            return None
+        self._maps[key] = values
+        return values
+
+    def append(self, positions, start, values):
+        """
+        Write hourly values for one or more buildings.
+
+        Args:
+            positions (int or array-like): Building store row position(s)
+            start: Timestamp of the first value (floored to the hour)
+            values (array-like): Shape (hours,) for one building or (buildings, hours)
+        """
+        positions = np.atleast_1d(np.asarray(positions, dtype=np.int64))
+        values = np.asarray(values, dtype=np.float32)
+        if values.ndim == 1:
+            values = values[None, :]
+        if values.shape[0] != len(positions):
+            raise ValueError("values must have one row per position")
+        if len(positions) == 0 or values.shape[1] == 0:
+            return
+        if positions.min() < 0:
+            raise IndexError("Row position out of range")
+
+        with self._lock:
+            self.refresh()
+            year, hour = _hour_of_year(start)
+            blocks = positions // BLOCK_ROWS
+            offset = 0
+            written_years = set(self._meta['years'])
+            while offset < values.shape[1]:
+                # Split the range at year boundaries, then by block
+                count = min(values.shape[1] - offset, hours_in_year(year) - hour)
+                for block in np.unique(blocks):
+                    in_block = blocks == block
+                    target = self._block(int(block), year, create=True)
+                    target[positions[in_block] % BLOCK_ROWS, hour:hour + count] = values[in_block, offset:offset + count]
+                    target.flush()
+                written_years.add(year)
+                offset += count
+                year, hour = year + 1, 0
+
+            self._meta['years'] = sorted(written_years)
+            self._meta['rows'] = max(self._meta['rows'], int(positions.max()) + 1)
+            self._meta['version'] += 1
+            self._write_meta()
+
+    def write_points(self, positions, timestamps, values):
+        """
+        Scatter long-format readings (one value per building and hour) into the store.
+
+        Args:
+            positions (array-like): Building store row position of each reading
+            timestamps (array-like): Reading times (floored to the hour)
+            values (array-like): Consumption in kWh
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        if len(positions) == 0:
+            return
+        if positions.min() < 0:
+            raise IndexError("Row position out of range")
+        timestamps = pd.DatetimeIndex(timestamps).floor('h')
+        values = np.asarray(values, dtype=np.float32)
+        years = timestamps.year.to_numpy()
+        year_starts = pd.to_datetime(pd.DataFrame({'year': years, 'month': 1, 'day': 1}))
+        hours = ((timestamps - pd.DatetimeIndex(year_starts)) // pd.Timedelta(hours=1)).to_numpy()
+        blocks = positions // BLOCK_ROWS
+
+        with self._lock:
+            self.refresh()
+            keys = blocks * 10_000 + years
+            order = np.argsort(keys, kind='stable')
+            bounds = np.flatnonzero(np.diff(keys[order])) + 1
+            for group in np.split(order, bounds):
+                block, year = int(blocks[group[0]]), int(years[group[0]])
+                target = self._block(block, year, create=True)
+                target[positions[group] % BLOCK_ROWS, hours[group]] = values[group]
+                target.flush()
+
+            self._meta['years'] = sorted(set(self._meta['years']) | set(np.unique(years).tolist()))
+            self._meta['rows'] = max(self._meta['rows'], int(positions.max()) + 1)
+            self._meta['version'] += 1
+            self._write_meta()
+
+    def slice(self, position, start, end):
+        """
+        Hourly values for one building in [start, end).
+
+        Returns:
+            pd.Series: float32 values on an hourly DatetimeIndex; NaN where nothing was written
+        """
+        index = pd.date_range(pd.Timestamp(start).floor('h'), pd.Timestamp(end).floor('h'),
+                              freq='h', inclusive='left')
+        result = np.full(len(index), np.nan, dtype=np.float32)
+        block, row = divmod(int(position), BLOCK_ROWS)
+        offset = 0
+        if len(index):
+            year, hour = _hour_of_year(index[0])
+            while offset < len(index):
+                count = min(len(index) - offset, hours_in_year(year) - hour)
+                values = self._block(block, year)
+                if values is not None:
+                    result[offset:offset + count] = values[row, hour:hour + count]
+                offset += count
+                year, hour = year + 1, 0
+        return pd.Series(result, index=index, name='energy_kwh')
+
+    def _totals(self, values, year, freq):
+        """Period totals for one block-year; NaN for periods with no data at all."""
+        days = values.shape[1] // 24
+        finite = np.isfinite(values)
+        daily = np.where(finite, values, 0).reshape(len(values), days, 24).sum(axis=2, dtype=np.float64)
+        counts = finite.reshape(len(values), days, 24).sum(axis=2)
+        if freq == 'monthly':
+            starts = _month_starts(year)
+            daily = np.add.reduceat(daily, starts, axis=1)
+            counts = np.add.reduceat(counts, starts, axis=1)
+        elif freq == 'annual':
+            daily = daily.sum(axis=1, keepdims=True)
+            counts = counts.sum(axis=1, keepdims=True)
+        return np.where(counts > 0, daily, np.nan)
+
+    def resample(self, freq, rows=None, years=None):
+        """
+        Total consumption per building and period.
+
+        Args:
+            freq (str): 'daily', 'monthly' or 'annual'
+            rows (int): Number of building positions to return (default: all written)
+            years (list): Calendar years to include (default: all written)
+
+        Returns:
+            tuple: (matrix of shape (rows, periods) in kWh, pd.DatetimeIndex of period starts)
+        """
+        if freq not in FREQUENCIES:
+            raise ValueError(f"freq must be one of {', '.join(FREQUENCIES)}")
+        with self._lock:
+            self.refresh()
+            rows = len(self) if rows is None else rows
+            years = self.years if years is None else sorted(years)
+
+            labels, parts = [], []
+            for year in years:
+                if freq == 'daily':
+                    periods = pd.date_range(f'{year}-01-01', periods=hours_in_year(year) // 24, freq='D')
+                elif freq == 'monthly':
+                    periods = pd.date_range(f'{year}-01-01', periods=12, freq='MS')
+                else:
+                    periods = pd.DatetimeIndex([pd.Timestamp(year=year, month=1, day=1)])
+                labels.append(periods)
+
+                totals = np.full((rows, len(periods)), np.nan)
+                for block in range(-(-rows // BLOCK_ROWS)):
+                    values = self._block(block, year)
+                    if values is None:
+                        continue
+                    start = block * BLOCK_ROWS
+                    stop = min(start + BLOCK_ROWS, rows)
+                    totals[start:stop] = self._totals(values[:stop - start], year, freq)
+                parts.append(totals)
+
+            if not parts:
+                return np.empty((rows, 0)), pd.DatetimeIndex([])
+            return np.hstack(parts), labels[0].append(labels[1:])
+
+    def annual_totals(self, rows=None, min_coverage=0.0):
+        """
+        Annual kWh per building.
+
+        Args:
+            rows (int): Number of building positions to return
+            min_coverage (float): Fraction of the year's hours that must be present,
+                otherwise the total is NaN
+
+        Returns:
+            tuple: (matrix of shape (rows, years), array of year labels)
+        """
+        matrix, periods = self.resample('annual', rows)
+        years = np.asarray(periods.year)
+        if min_coverage > 0 and len(years):
+            covered = self._coverage(matrix.shape[0], years)
+            hours = np.array([hours_in_year(year) for year in years])
+            matrix = np.where(covered >= min_coverage * hours, matrix, np.nan)
+        return matrix, years
+
+    def _coverage(self, rows, years):
+        covered = np.zeros((rows, len(years)), dtype=np.int64)
+        for column, year in enumerate(years):
+            for block in range(-(-rows // BLOCK_ROWS)):
+                values = self._block(block, int(year))
+                if values is None:
+                    continue
+                start = block * BLOCK_ROWS
+                stop = min(start + BLOCK_ROWS, rows)
+                covered[start:stop, column] = np.isfinite(values[:stop - start]).sum(axis=1)
+        return covered
+
+
+def update_building_totals(building_store, timeseries, year=None, emission_factor=GRID_EMISSION_FACTOR,
+                           min_coverage=0.95):
+    """
+    Set energy_usage and annual_emissions from metered consumption.
+
+    Uses the latest year (or the given one) with at least min_coverage of
+    its hours present; buildings without such a year keep their values.
+
+    Returns:
+        int: Number of buildings updated
+    """
+    matrix, years = timeseries.annual_totals(min(len(timeseries), len(building_store)), min_coverage)
+    if year is not None:
+        matrix, years = matrix[:, years == year], years[years == year]
+    if matrix.shape[1] == 0:
+        return 0
+
+    # Latest complete year per building
+    finite = np.isfinite(matrix)
+    last = matrix.shape[1] - 1 - np.argmax(finite[:, ::-1], axis=1)
+    positions = np.flatnonzero(finite.any(axis=1))
+    if len(positions) == 0:
+        return 0
+    energy = matrix[positions, last[positions]]
+    building_store.update_rows(positions, pd.DataFrame({
+        'energy_usage': np.round(energy, 2),
+        'annual_emissions': np.round(energy * emission_factor, 2),
+    }))
+    return len(positions)
+
+
+def emissions_history(timeseries, rows, emission_factor=GRID_EMISSION_FACTOR, min_coverage=0.95):
+    """
+    Annual emissions per building from metered consumption, for forecasting.
+
+    Returns:
+        tuple: (matrix of shape (rows, years) in kg CO2e with NaN for missing years, year labels)
+    """
+    matrix, years = timeseries.annual_totals(rows, min_coverage)
+    return matrix * emission_factor, years
+
+
+def import_hourly_csv(source, building_store, timeseries, chunksize=1_000_000):
+    """
+    Load long-format hourly readings (name, timestamp, energy_kwh) into the store.
+
+    Readings for names not in the building store are skipped.
+
+    Returns:
+        tuple: (readings written, readings skipped)
+    """
+    written = skipped = 0
+    index = building_store.index
+    for chunk in pd.read_csv(source, usecols=['name', 'timestamp', 'energy_kwh'], chunksize=chunksize):
+        positions = chunk['name'].map(index.position)
+        known = positions.notna().to_numpy()
+        timeseries.write_points(positions[known].astype(np.int64).to_numpy(),
+                                pd.to_datetime(chunk.loc[known, 'timestamp']),
+                                chunk.loc[known, 'energy_kwh'].to_numpy(dtype=float))
+        written += int(known.sum())
+        skipped += int((~known).sum())
+    return written, skipped
+
+
+@st.cache_resource(show_spinner=False)
+def get_timeseries_store():
+    """Return the process-wide time-series store shared by all sessions."""
+    return TimeSeriesStore()
+
+
+def main():
+    import argparse
+    from building_store import BuildingStore
+
+    parser = argparse.ArgumentParser(description="Import hourly consumption and refresh building totals")
+    parser.add_argument('csv', help='CSV with columns name, timestamp, energy_kwh')
+    parser.add_argument('--emission-factor', type=float, default=GRID_EMISSION_FACTOR,
+                        help='kg CO2e per kWh')
+    args = parser.parse_args()
+
+    store = BuildingStore()
+    timeseries = TimeSeriesStore()
+    written, skipped = import_hourly_csv(args.csv, store, timeseries)
+    print(f"Wrote {written:,} readings ({skipped:,} for unknown buildings skipped)")
+    updated = update_building_totals(store, timeseries, emission_factor=args.emission_factor)
+    print(f"Updated energy_usage and annual_emissions for {updated:,} buildings")
+
+
+if __name__ == "__main__":
+    main()
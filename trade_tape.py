@@ -0,0 +1,192 @@
+import math
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# Fills kept for the tape; older ones are overwritten but stay counted in the bars
+FILL_CAPACITY = 1_000_000
+INTERVALS = {'1m': 60, '1h': 3600, '1d': 86400}
+# Bars kept per interval: a week of minutes, a quarter of hours, five years of days
+BAR_CAPACITY = {'1m': 7 * 24 * 60, '1h': 92 * 24, '1d': 5 * 366}
+
+FILL_DTYPE = np.dtype([('time', 'f8'), ('price', 'f8'), ('quantity', 'i8')])
+BAR_DTYPE = np.dtype([('start', 'f8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'), ('close', 'f8'),
+                      ('volume', 'i8'), ('notional', 'f8'), ('trades', 'i8')])
+
+
+class RingBuffer:
+    """
+    Fixed-capacity structured array that overwrites its oldest row once full.
+
+    Rows are appended in key order, so range queries are a binary search
+    over at most two contiguous segments.
+    """
+
+    def __init__(self, capacity, dtype):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=dtype)
+        # Rows ever appended; the next one goes to total % capacity
+        self.total = 0
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, row):
+        self._data[self.total % self.capacity] = row
+        self.total += 1
+
+    def replace_last(self, row):
+        self._data[(self.total - 1) % self.capacity] = row
+
+    def last(self, field):
+        return self._data[field][(self.total - 1) % self.capacity]
+
+    def _segments(self):
+        """The held rows as one or two views, oldest first."""
+        if self.total <= self.capacity:
+            return [self._data[:self.total]]
+        head = self.total % self.capacity
+        return [self._data[head:], self._data[:head]]
+
+    def tail(self, n):
+        """Copy of the newest n rows, oldest first."""
+        n = min(n, len(self))
+        return self._data[np.arange(self.total - n, self.total) % self.capacity]
+
+    def between(self, field, start=None, end=None):
+        """Copy of the rows with start <= row[field] < end, oldest first."""
+        parts = []
+        for segment in self._segments():
+            keys = segment[field]
+            low = 0 if start is None else np.searchsorted(keys, start, side='left')
+            high = len(keys) if end is None else np.searchsorted(keys, end, side='left')
+            parts.append(segment[low:high])
+        return np.concatenate(parts)
+
+
+class BarSeries:
+    """OHLC/volume bars for one interval, updated in place as fills arrive."""
+
+    def __init__(self, seconds, capacity):
+        self.seconds = seconds
+        self.bars = RingBuffer(capacity, BAR_DTYPE)
+        # The open bar as Python values, written back as one row per fill
+        self._current = None
+
+    def add(self, timestamp, price, quantity):
+        start = math.floor(timestamp / self.seconds) * self.seconds
+        current = self._current
+        if current is not None and start <= current[0]:
+            current[2] = max(current[2], price)
+            current[3] = min(current[3], price)
+            current[4] = price
+            current[5] += quantity
+            current[6] += price * quantity
+            current[7] += 1
+            self.bars.replace_last(tuple(current))
+        else:
+            self._current = [start, price, price, price, price, quantity, price * quantity, 1]
+            self.bars.append(tuple(self._current))
+
+
+class TradeTape:
+    """
+    Every fill of the market, with rolling OHLC/volume bars.
+
+    Fills go into a preallocated ring buffer and each one updates the
+    current bar of every interval, so recording a fill costs the same
+    however many have come before, and bars are never recomputed from the
+    fills. Queries binary-search the ring buffers. Timestamps are clamped
+    to be non-decreasing, so a fill stamped earlier than its predecessor
+    lands in the current bar rather than reopening a closed one.
+    """
+
+    def __init__(self, capacity=FILL_CAPACITY, intervals=INTERVALS, bar_capacity=BAR_CAPACITY):
+        self.fills = RingBuffer(capacity, FILL_DTYPE)
+        self.series = {name: BarSeries(seconds, bar_capacity[name]) for name, seconds in intervals.items()}
+        self._last_time = float('-inf')
+        self._lock = threading.Lock()
+
+    @property
+    def count(self):
+        """Fills recorded since the tape was created, including overwritten ones."""
+        return self.fills.total
+
+    def record(self, price, quantity, timestamp=None):
+        """Append one fill and fold it into the current bar of every interval."""
+        price, quantity = float(price), int(quantity)
+        with self._lock:
+            timestamp = max(time.time() if timestamp is None else float(timestamp), self._last_time)
+            self._last_time = timestamp
+            self.fills.append((timestamp, price, quantity))
+            for series in self.series.values():
+                series.add(timestamp, price, quantity)
+
+    def record_transactions(self, transactions, timestamp=None):
+        """Record the fills returned by OrderBook.submit, all stamped with one time."""
+        timestamp = time.time() if timestamp is None else timestamp
+        for transaction in transactions:
+            self.record(transaction["price"], transaction["quantity"], timestamp)
+
+    def recent(self, limit=50):
+        """
+        The newest fills, newest first.
+
+        Returns:
+            pd.DataFrame: Columns time (UTC), price and quantity
+        """
+        with self._lock:
+            fills = self.fills.tail(limit)[::-1]
+        frame = pd.DataFrame(fills)
+        frame['time'] = pd.to_datetime(frame['time'], unit='s', utc=True)
+        return frame
+
+    def bars(self, interval, start=None, end=None, limit=None):
+        """
+        OHLC/volume bars for one interval, oldest first.
+
+        Args:
+            interval (str): One of INTERVALS, e.g. "1m"
+            start (float): Earliest bar start, as a Unix timestamp
+            end (float): Only bars starting before this Unix timestamp
+            limit (int): Keep only the newest this many bars of the range
+
+        Returns:
+            pd.DataFrame: Columns start (UTC), open, high, low, close, volume, trades and vwap
+        """
+        if interval not in self.series:
+            raise ValueError(f"Unknown interval: {interval}; expected one of {', '.join(self.series)}")
+        bars = self.series[interval].bars
+        with self._lock:
+            if start is None and end is None and limit is not None:
+                rows = bars.tail(limit)
+            else:
+                rows = bars.between('start', start, end)
+                if limit is not None:
+                    rows = rows[len(rows) - min(limit, len(rows)):]
+        frame = pd.DataFrame(rows)
+        frame['vwap'] = frame['notional'] / frame['volume'].where(frame['volume'] > 0)
+        frame['start'] = pd.to_datetime(frame['start'], unit='s', utc=True)
+        return frame.drop(columns='notional')
+
+    def summary(self, window=86400, interval='1h'):
+        """
+        Last price plus volume, VWAP and fill count over the trailing window
+        in seconds, read from the bars of `interval` so it is rounded out to
+        whole bars.
+        """
+        with self._lock:
+            if not self.fills.total:
+                return {"last_price": None, "volume": 0, "vwap": None, "trades": 0}
+            last_price = float(self.fills.last('price'))
+            series = self.series[interval]
+            since = math.floor((time.time() - window) / series.seconds) * series.seconds
+            rows = series.bars.between('start', since)
+        volume = int(rows['volume'].sum())
+        return {
+            "last_price": last_price,
+            "volume": volume,
+            "vwap": float(rows['notional'].sum() / volume) if volume else None,
+            "trades": int(rows['trades'].sum()),
+        }
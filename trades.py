@@ -1,48 +1,150 @@
 import streamlit as st
-import requests
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from api_client import get_client, get_order_book_replica
 
-API_BASE_URL = "http://127.0.0.1:8000/api"
+ORDER_BOOK_LEVELS = 15
+# Price bucket widths offered for the depth view; None shows every price
+PRICE_TICKS = [None, 0.1, 0.5, 1.0, 5.0]
+REFRESH_SECONDS = 1
+# How long a first render waits for the live feed before falling back to a fetch
+SYNC_TIMEOUT_SECONDS = 0.5
+# After a wait times out, fetch without waiting for this long, so reruns don't stall while the feed is down
+SYNC_RETRY_SECONDS = 5
+BAR_INTERVALS = ["1m", "1h", "1d"]
+BAR_LIMIT = 120
+HISTORY_REFRESH_SECONDS = 5
+BATCH_COLUMNS = ["side", "quantity", "price"]
 
 # Utility Functions
-def get_order_book():
-    """Fetch the order book from the API."""
-    response = requests.get(f"{API_BASE_URL}/order-book")
-    return response.json()
+def get_order_book(levels=None, tick=None):
+    """
+    Return the order book from the live replica, aggregated to `levels`
+    price buckets of width `tick`. Until the replica has synced, fall back
+    to fetching a snapshot from the API.
+    """
+    replica = get_order_book_replica()
+    if replica.wait_until_synced(SYNC_TIMEOUT_SECONDS, retry_after=SYNC_RETRY_SECONDS):
+        return {"order_book": replica.snapshot(levels, tick), "sequence": replica.sequence,
+                "live": replica.connected}
+    return get_client().get_order_book(levels)
+
+def get_trades(limit=20):
+    """Fetch the newest fills and a 24-hour summary from the API."""
+    return get_client().get_trades(limit)
+
+def get_bars(interval, limit=BAR_LIMIT):
+    """Fetch the newest OHLC/volume bars of one interval from the API."""
+    return get_client().get_bars(interval, limit)
 
 def place_buy_order(quantity, price):
     """Place a buy order via the API."""
-    response = requests.post(f"{API_BASE_URL}/market/buy", json={"quantity": quantity, "price": price})
-    return response.json()
+    return get_client().place_buy_order(quantity, price)
 
 def place_sell_order(quantity, price):
     """Place a sell order via the API."""
-    response = requests.post(f"{API_BASE_URL}/market/sell", json={"quantity": quantity, "price": price})
-    return response.json()
+    return get_client().place_sell_order(quantity, price)
+
+def place_orders(orders):
+    """Place a batch of buy/sell orders in one request."""
+    return get_client().place_orders(orders)
+
+def depth_table(levels):
+    """Render aggregated price levels; the frame is built from at most ORDER_BOOK_LEVELS rows."""
+    st.dataframe(
+        pd.DataFrame(levels, columns=["price", "quantity", "orders"]),
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "price": st.column_config.NumberColumn("Price", format="%.2f"),
+            "quantity": st.column_config.NumberColumn("Quantity", format="%d"),
+            "orders": st.column_config.NumberColumn("Orders", format="%d"),
+        },
+    )
+
+@st.experimental_fragment(run_every=REFRESH_SECONDS)
+def display_order_book():
+    """Redraw only the order book every REFRESH_SECONDS from the locally held replica."""
+    tick = st.selectbox("Price grouping", PRICE_TICKS, key="order_book_tick",
+                        format_func=lambda tick: "None" if tick is None else f"{tick:.2f}")
+    order_book = get_order_book(ORDER_BOOK_LEVELS, tick)
+    if "order_book" in order_book:
+        sell_col, buy_col = st.columns(2)
+        with sell_col:
+            st.write("### Sell Orders")
+            depth_table(order_book["order_book"]["sell"])
+        with buy_col:
+            st.write("### Buy Orders")
+            depth_table(order_book["order_book"]["buy"])
+        if order_book.get("live") is False:
+            st.warning("Live order book feed disconnected; reconnecting. Showing the last known book.")
+        elif order_book.get("live"):
+            st.caption(f"Live · book sequence {order_book['sequence']:,}")
+    else:
+        st.error(order_book.get("error", "Failed to fetch order book."))
+
+def price_figure(bars, interval):
+    """Candlesticks with a VWAP line over a volume panel."""
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.75, 0.25], vertical_spacing=0.03)
+    fig.add_trace(go.Candlestick(x=bars["start"], open=bars["open"], high=bars["high"],
+                                 low=bars["low"], close=bars["close"], name="Price"), row=1, col=1)
+    fig.add_trace(go.Scatter(x=bars["start"], y=bars["vwap"], mode="lines", name="VWAP",
+                             line=dict(width=1)), row=1, col=1)
+    fig.add_trace(go.Bar(x=bars["start"], y=bars["volume"], name="Volume", marker_color="gray"), row=2, col=1)
+    fig.update_layout(title=f"Credit Price ({interval} bars)", xaxis_rangeslider_visible=False,
+                      showlegend=False, margin=dict(t=40, b=10))
+    fig.update_yaxes(title_text="Price per Credit", row=1, col=1)
+    fig.update_yaxes(title_text="Credits", row=2, col=1)
+    return fig
+
+@st.experimental_fragment(run_every=HISTORY_REFRESH_SECONDS)
+def display_price_history():
+    """Price chart and recent fills; bars are kept by the server, so each refresh fetches at most BAR_LIMIT rows."""
+    interval = st.radio("Bar interval", BAR_INTERVALS, horizontal=True, key="bar_interval")
+    response = get_bars(interval)
+    if "error" in response:
+        st.error(response["error"])
+        return
+    bars = pd.DataFrame(response["bars"], columns=["start", "open", "high", "low", "close",
+                                                   "volume", "trades", "vwap"])
+    if bars.empty:
+        st.info("No trades yet.")
+        return
+    bars["start"] = pd.to_datetime(bars["start"], unit="s", utc=True)
+    st.plotly_chart(price_figure(bars, interval), use_container_width=True)
+
+    trades = get_trades()
+    if "error" not in trades:
+        summary = trades["summary"]
+        last_col, vwap_col, volume_col = st.columns(3)
+        last_col.metric("Last Price", f"{summary['last_price']:.2f}")
+        vwap_col.metric("24h VWAP", f"{summary['vwap']:.2f}" if summary["vwap"] is not None else "-")
+        volume_col.metric("24h Volume", f"{summary['volume']:,} credits")
+        recent = pd.DataFrame(trades["trades"], columns=["time", "price", "quantity"])
+        recent["time"] = pd.to_datetime(recent["time"], unit="s", utc=True)
+        with st.expander("Recent Trades"):
+            st.dataframe(recent, hide_index=True, use_container_width=True)
 
 def display_emissions_trading():
     st.header("Carbon Credits Trading Marketplace")
 
     # Order Book
     st.subheader("Order Book")
-    order_book = get_order_book()
-    if "order_book" in order_book:
-        sell_orders = order_book["order_book"]["sell"]
-        buy_orders = order_book["order_book"]["buy"]
+    display_order_book()
 
-        st.write("### Sell Orders")
-        st.table(sell_orders)
-
-        st.write("### Buy Orders")
-        st.table(buy_orders)
-    else:
-        st.error("Failed to fetch order book.")
+    # Price History
+    st.subheader("Price History")
+    display_price_history()
 
     # Buy Order Form
     st.subheader("Place a Buy Order")
     buy_quantity = st.number_input("Quantity to Buy", min_value=1, value=10, step=1, key="buy_quantity")
-    buy_price = st.number_input("Price per Credit", min_value=0.1, value=1.0, step=0.1, key="buy_price")
+    buy_price = st.number_input("Price per Credit", min_value=0.01, value=1.0, step=0.1, format="%.2f",
+                                key="buy_price")
     if st.button("Submit Buy Order"):
-        buy_response = place_buy_order(buy_quantity, buy_price)
+        # The server rejects sub-cent prices; drop float noise from the stepper
+        buy_response = place_buy_order(buy_quantity, round(buy_price, 2))
         if "error" in buy_response:
             st.error(buy_response["error"])
         else:
@@ -51,14 +153,37 @@ def display_emissions_trading():
     # Sell Order Form
     st.subheader("Place a Sell Order")
     sell_quantity = st.number_input("Quantity to Sell", min_value=1, value=10, step=1, key="sell_quantity")
-    sell_price = st.number_input("Price per Credit", min_value=0.1, value=1.0, step=0.1, key="sell_price")
+    sell_price = st.number_input("Price per Credit", min_value=0.01, value=1.0, step=0.1, format="%.2f",
+                                key="sell_price")
     if st.button("Submit Sell Order"):
-        sell_response = place_sell_order(sell_quantity, sell_price)
+        # The server rejects sub-cent prices; drop float noise from the stepper
+        sell_response = place_sell_order(sell_quantity, round(sell_price, 2))
         if "error" in sell_response:
             st.error(sell_response["error"])
         else:
             st.success(f"Sell order placed successfully. Transactions: {sell_response.get('transactions', 'None')}")
 
+    # Batch Orders
+    st.subheader("Submit a Batch of Orders")
+    batch_file = st.file_uploader("CSV with side, quantity and price columns", type="csv", key="batch_orders")
+    if batch_file is not None and st.button("Submit Batch"):
+        try:
+            batch = pd.read_csv(batch_file, usecols=BATCH_COLUMNS)
+        except ValueError as e:
+            # Missing columns, an empty file or text that isn't CSV
+            st.error(f"Could not read the batch file ({e}). Expected columns: {', '.join(BATCH_COLUMNS)}.")
+            return
+        batch_response = place_orders(batch.to_dict("records"))
+        if "error" in batch_response:
+            st.error(batch_response["error"])
+        else:
+            results = batch_response["results"]
+            failed = [r for r in results if "error" in r]
+            fills = sum(len(r.get("transactions", [])) for r in results)
+            st.success(f"Submitted {len(results) - len(failed)} orders with {fills} fills.")
+            if failed:
+                st.warning(f"{len(failed)} orders were rejected: {failed[0]['error']}")
+
 # Call the function to render the page
 if __name__ == "__main__":
     display_emissions_trading()
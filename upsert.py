@@ -0,0 +1,151 @@
+"""
+Upsert an uploaded building table into the store.
+
+Rows are matched on a key column (name or address) through the store's
+hash indexes. Each row is fingerprinted with a 64-bit hash of all its
+columns, and the store keeps the fingerprints of its own rows, so finding
+what changed costs one pass over the upload. Rows that match and hash the
+same are skipped. Rows that match but hash differently are rewritten, and
+only the columns that changed are written. Everything else is appended.
+Writes are proportional to the changed columns and new rows, not to the
+upload.
+"""
+import numpy as np
+import pandas as pd
+from ingest import BUILDING_COLUMNS, TEXT_COLUMNS
+
+KEY_COLUMNS = ('name', 'address')
+# Changed rows shown field by field in the preview
+PREVIEW_ROWS = 200
+
+
+def normalize(data):
+    """Building columns in one canonical form, so equal rows hash and compare equal wherever they came from."""
+    return pd.DataFrame({
+        col: (data[col].fillna('').astype(str).astype(object) if col in TEXT_COLUMNS
+              else pd.to_numeric(data[col], errors='coerce').astype(np.float64))
+        for col in BUILDING_COLUMNS
+    })
+
+
+def row_hashes(data, normalized=False):
+    """64-bit fingerprint of every row over BUILDING_COLUMNS; pass normalized=True for output of normalize()."""
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    data = data if normalized else normalize(data)
+    # Keys are mostly unique, so factorizing text before hashing only adds work
+    return pd.util.hash_pandas_object(data, index=False, categorize=False).to_numpy()
+
+
+def _differs(old, new):
+    """Elementwise inequality that treats two NaNs as equal."""
+    old, new = np.asarray(old), np.asarray(new)
+    if old.dtype.kind == 'f':
+        return ~((old == new) | (np.isnan(old) & np.isnan(new)))
+    return old != new
+
+
+class UpsertPlan:
+    """What applying an upload would change, computed against one store version."""
+
+    def __init__(self, key, version, new_rows, changed_rows, positions, columns, unchanged, duplicates, preview):
+        self.key = key
+        self.version = version
+        self.new_rows = new_rows
+        self.changed_rows = changed_rows
+        self.positions = positions
+        self.columns = columns
+        self.unchanged = unchanged
+        self.duplicates = duplicates
+        self.preview = preview
+
+    @property
+    def empty(self):
+        return self.new_rows.empty and self.changed_rows.empty
+
+
+def plan_upsert(store, data, key='name'):
+    """
+    Compare an upload with the store.
+
+    Rows with a missing key are always new. When the upload repeats a key
+    its last row wins, as in a later correction. When the store holds a key
+    more than once, the first of those rows is updated, as building_row
+    would return.
+
+    Args:
+        store (BuildingStore): The shared store
+        data (pd.DataFrame): Uploaded rows with the ingest.BUILDING_COLUMNS schema
+        key (str): One of KEY_COLUMNS
+
+    Returns:
+        UpsertPlan
+    """
+    if key not in KEY_COLUMNS:
+        raise ValueError(f"Unknown key: {key}; expected one of {', '.join(KEY_COLUMNS)}")
+    version = store.version
+    index = store.index if key == 'name' else store.address_index
+    frame = store.frame()
+    stored_hashes = store.row_hashes
+
+    upload = normalize(data.reset_index(drop=True))
+    keys = upload[key].to_numpy()
+    has_key = keys != ''
+    last = ~upload[key].duplicated(keep='last').to_numpy() | ~has_key
+    duplicates = int((~last).sum())
+
+    positions = np.where(has_key, index.positions(keys), -1)
+    positions[positions >= len(frame)] = -1
+    matched = last & (positions >= 0)
+    hashes = row_hashes(upload, normalized=True)
+    changed = matched.copy()
+    changed[matched] = hashes[matched] != stored_hashes[positions[matched]]
+    new = last & (positions < 0)
+
+    changed_positions = positions[changed]
+    old = normalize(frame.iloc[changed_positions])
+    after = upload[changed]
+    differs = {col: _differs(old[col].to_numpy(), after[col].to_numpy()) for col in BUILDING_COLUMNS}
+    columns = [col for col in BUILDING_COLUMNS if differs[col].any()]
+
+    preview = []
+    shown = slice(0, PREVIEW_ROWS)
+    for col in columns:
+        rows = np.flatnonzero(differs[col][shown])
+        preview.append(pd.DataFrame({
+            key: after[key].to_numpy()[rows],
+            'field': col,
+            # As text, so text and numeric fields share the two columns
+            'before': old[col].to_numpy()[rows].astype(str),
+            'after': after[col].to_numpy()[rows].astype(str),
+        }))
+    preview = (pd.concat(preview, ignore_index=True).sort_values(key, kind='stable', ignore_index=True)
+               if preview else pd.DataFrame(columns=[key, 'field', 'before', 'after']))
+
+    source = data.reset_index(drop=True)
+    return UpsertPlan(
+        key=key,
+        version=version,
+        new_rows=source[new].reset_index(drop=True),
+        changed_rows=source.loc[changed, columns].reset_index(drop=True),
+        positions=changed_positions,
+        columns=columns,
+        unchanged=int((matched & ~changed).sum()),
+        duplicates=duplicates,
+        preview=preview,
+    )
+
+
+def apply_upsert(store, plan):
+    """
+    Write a plan: changed columns of changed rows, then the new rows.
+
+    Raises:
+        ValueError: If the store changed since the plan was made
+    """
+    if store.version != plan.version:
+        raise ValueError("The building data changed since this upload was checked; please review it again")
+    if len(plan.positions):
+        store.update_rows(plan.positions, plan.changed_rows)
+    if len(plan.new_rows):
+        store.append(plan.new_rows)
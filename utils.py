@@ -1,4 +1,8 @@
-def get_energy_recommendations(building_name, buildings_data, usage_description):
+from building_index import building_row
+
+
+def get_energy_recommendations(building_name, buildings_data, usage_description, index=None):
+    building = building_row(buildings_data, building_name, index)
     sages = [
         {
             'role': 'system',
@@ -7,10 +11,10 @@ def get_energy_recommendations(building_name, buildings_data, usage_description)
         {
             'role': 'user',
             'content': f"""Building: {building_name}
-Energy Usage: {buildings_data.loc[buildings_data['name'] == building_name, 'energy_usage'].values[0]} kWh
-Area: {buildings_data.loc[buildings_data['name'] == building_name, 'area_sqft'].values[0]} sq ft
-Energy Intensity: {buildings_data.loc[buildings_data['name'] == building_name, 'energy_usage'].values[0] / buildings_data.loc[buildings_data['name'] == building_name, 'area_sqft'].values[0]:.2f} kWh/sq ft
-Annual CO2 Emissions: {buildings_data.loc[buildings_data['name'] == building_name, 'annual_emissions'].values[0]} kg CO2e
+Energy Usage: {building['energy_usage']} kWh
+Area: {building['area_sqft']} sq ft
+Energy Intensity: {building['energy_usage'] / building['area_sqft']:.2f} kWh/sq ft
+Annual CO2 Emissions: {building['annual_emissions']} kg CO2e
 
 Usage Context: {usage_description}
 